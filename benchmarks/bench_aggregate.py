@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from generate_language_data import add_user_languages, load_user_data, time_to_minutes  # noqa: E402
+from synthetic import iter_synthetic_users, write_user_tree  # noqa: E402
+from user_store import UserStore, open_user_store  # noqa: E402
+
+
+def add_user_languages_scan(language_data: defaultdict, username: str, user_data: dict) -> None:
+    """
+    Previous implementation, checking duplicates with a linear scan of the language list.
+    """
+    for entry in user_data.get("languages", []):
+        language = entry["language"]
+        time = entry["time"]
+
+        if language == "Other" or time_to_minutes(time) < 150:
+            continue
+
+        if not any(user["username"] == username for user in language_data[language]):
+            language_data[language].append({"username": username, "time": time})
+
+
+def measure(add_languages, records: list, factory) -> float:
+    """
+    Args:
+        add_languages: Function adding the languages of one user.
+        records (list): Username and user data of every user.
+        factory: Type of the per-language container.
+
+    Returns:
+        float: Elapsed time in seconds to aggregate every user.
+    """
+    language_data = defaultdict(factory)
+    start = time.perf_counter()
+    for username, user_data in records:
+        add_languages(language_data, username, user_data)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """
+    Measure how the language aggregation scales with the number of users.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--scan-max", type=int, default=10000, help="largest size to run the linear scan on")
+    parser.add_argument("--on-disk", action="store_true", help="also time load_user_data on a synthetic user store")
+    args = parser.parse_args()
+
+    print(f"{'users':>9} {'scan (s)':>10} {'index (s)':>10} {'disk (s)':>10}")
+    for count in args.users:
+        records = list(iter_synthetic_users(count))
+        index = measure(add_user_languages, records, dict)
+        scan = measure(add_user_languages_scan, records, list) if count <= args.scan_max else None
+        del records
+
+        disk = None
+        if args.on_disk:
+            scratch = tempfile.mkdtemp(prefix="bench_aggregate_")
+            try:
+                user_data_dir = os.path.join(scratch, "users")
+                db_path = os.path.join(scratch, "users.sqlite")
+                write_user_tree(user_data_dir, count)
+                open_user_store(db_path, user_data_dir).close()
+                start = time.perf_counter()
+                load_user_data(UserStore(db_path))
+                disk = time.perf_counter() - start
+            finally:
+                shutil.rmtree(scratch)
+
+        columns = [f"{value:.2f}" if value is not None else "-" for value in (scan, index, disk)]
+        print(f"{count:>9} {columns[0]:>10} {columns[1]:>10} {columns[2]:>10}")
+
+
+if __name__ == "__main__":
+    main()
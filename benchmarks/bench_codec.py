@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from time_codec import time_to_minutes, times_to_minutes  # noqa: E402
+from svg_fixtures import load_fixture_languages  # noqa: E402
+
+
+def time_to_minutes_loop(time_str: str) -> int:
+    """
+    Previous per-call parser, copied in every stage before the shared codec.
+    """
+    parts = time_str.split()
+    total_minutes = 0
+    for i in range(0, len(parts), 2):
+        value = int(parts[i].replace(",", ""))
+        unit = parts[i + 1]
+        if "hr" in unit:
+            total_minutes += value * 60
+        elif "min" in unit:
+            total_minutes += value
+    return total_minutes
+
+
+def measure(function, time_strs: list) -> tuple:
+    """
+    Args:
+        function: Function converting the whole list.
+        time_strs (list): Time strings to convert.
+
+    Returns:
+        tuple: Elapsed time in seconds and the converted minutes.
+    """
+    start = time.perf_counter()
+    minutes = function(time_strs)
+    return time.perf_counter() - start, list(minutes)
+
+
+def main() -> None:
+    """
+    Compare the batched, memoized codec with the per-call parsing loops it replaced.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--strings", type=int, default=1000000, help="number of time strings to convert")
+    args = parser.parse_args()
+
+    corpus = sorted({entry["time"] for languages in load_fixture_languages().values() for entry in languages})
+    rng = random.Random(0)
+    time_strs = [rng.choice(corpus) for _ in range(args.strings)]
+
+    runs = {
+        "per-call loop": lambda strs: [time_to_minutes_loop(time_str) for time_str in strs],
+        "memoized per call": lambda strs: [time_to_minutes(time_str) for time_str in strs],
+        "batch": times_to_minutes,
+    }
+
+    expected = None
+    baseline = None
+    print(f"{len(time_strs)} strings, {len(corpus)} distinct")
+    print(f"{'codec':>18} {'seconds':>9} {'M strings/s':>12} {'speedup':>8}")
+    for name, function in runs.items():
+        time_to_minutes.cache_clear()
+        elapsed, minutes = measure(function, time_strs)
+        expected = expected or minutes
+        assert minutes == expected, f"{name} disagrees with the per-call loop"
+        baseline = baseline or elapsed
+        print(f"{name:>18} {elapsed:>9.3f} {len(time_strs) / elapsed / 1e6:>12.2f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
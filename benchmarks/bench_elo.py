@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import math
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from elo_engine import SNAPSHOT_COLUMNS, RunInputs, load_snapshots, replay, save_snapshot  # noqa: E402
+
+
+def synthetic_runs(users: int, runs: int, seed: int = 0) -> RunInputs:
+    """
+    Build weekly runs where most users are fetched, about half of them with new activity.
+
+    Args:
+        users (int): Number of users.
+        runs (int): Number of runs.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        RunInputs: Inputs of the runs, consistent from one run to the next.
+    """
+    rng = np.random.default_rng(seed)
+    inputs = RunInputs([f"user{index:07d}" for index in range(users)], runs)
+    minutes = rng.integers(0, 600000, users)
+    changed = np.ones(users, dtype=bool)
+    inputs.previous_elo[0] = np.ceil(minutes / 60).astype(np.int64)
+
+    for run in range(runs):
+        present = rng.random(users) < 0.95
+        activity = np.where(rng.random(users) < 0.5, rng.integers(1, 3000, users), 0)
+        inputs.present[run] = present
+        inputs.previous_minutes[run] = minutes
+        inputs.updated[run] = changed
+        inputs.changed[run] = activity > 0
+        inputs.new_minutes[run] = minutes + activity
+
+        # Users that were not fetched keep their time and flag for the next run.
+        minutes = np.where(present, minutes + activity, minutes)
+        changed = np.where(present, activity > 0, changed)
+    return inputs
+
+
+def replay_per_user(inputs: RunInputs, users: int, decay: int = 2) -> list:
+    """
+    Previous rules, applied one user and one run at a time like the per-user update of generate_user_data did.
+    """
+    final = []
+    for column in range(users):
+        elo = None
+        for run in range(inputs.present.shape[0]):
+            if not inputs.present[run, column]:
+                continue
+            if elo is None:
+                elo = int(inputs.previous_elo[run, column])
+            updated = inputs.updated[run, column]
+            changed = inputs.changed[run, column]
+            if not updated and not changed:
+                elo = max(0, elo - decay)
+            elif changed:
+                previous_hours = math.ceil(inputs.previous_minutes[run, column] / 60)
+                new_hours = math.ceil(inputs.new_minutes[run, column] / 60)
+                elo += max(0, new_hours - previous_hours)
+        final.append(elo or 0)
+    return final
+
+
+def main() -> None:
+    """
+    Measure the batch elo replay against the per-user rules.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=52)
+    parser.add_argument("--per-user", type=int, default=10000, help="users replayed one at a time for comparison")
+    parser.add_argument("--from-files", action="store_true", help="also time loading the runs from snapshot files")
+    args = parser.parse_args()
+
+    inputs = synthetic_runs(args.users, args.runs)
+
+    start = time.perf_counter()
+    history = replay(inputs)
+    batch = time.perf_counter() - start
+    print(f"batch replay: {args.users} users x {args.runs} runs in {batch:.3f} s")
+
+    count = min(args.per_user, args.users)
+    start = time.perf_counter()
+    expected = replay_per_user(inputs, count)
+    per_user = time.perf_counter() - start
+    assert history[-1, :count].tolist() == expected, "batch replay disagrees with the per-user rules"
+    print(f"per-user replay: {count} users x {args.runs} runs in {per_user:.3f} s "
+          f"(~{per_user * args.users / count:.1f} s for {args.users} users)")
+
+    if args.from_files:
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            for run in range(args.runs):
+                present = np.flatnonzero(inputs.present[run])
+                rows = np.stack([getattr(inputs, column)[run, present] for column in SNAPSHOT_COLUMNS], axis=1)
+                snapshot = {inputs.usernames[column]: row for column, row in zip(present.tolist(), rows.tolist())}
+                save_snapshot(snapshot_dir, snapshot, f"{run:03d}")
+
+            start = time.perf_counter()
+            loaded = load_snapshots(snapshot_dir)
+            elapsed = time.perf_counter() - start
+            assert replay(loaded)[-1].tolist() == [
+                elo for elo, seen in zip(history[-1].tolist(), inputs.present.any(axis=0).tolist()) if seen
+            ]
+            print(f"snapshot files loaded in {elapsed:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
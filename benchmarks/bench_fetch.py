@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from generate_user_data import process_users  # noqa: E402
+from stub_server import start_stub_server, stub_base_url  # noqa: E402
+from svg_fixtures import load_fixture_languages  # noqa: E402
+
+
+def run(usernames: list, base_url: str, workers: int, rate: float) -> float:
+    """
+    Process every user against the stub server into a scratch directory.
+
+    Args:
+        usernames (list): Users to process.
+        base_url (str): Base URL of the stub server.
+        workers (int): Number of concurrent requests.
+        rate (float): Maximum number of requests per second.
+
+    Returns:
+        float: Elapsed wall-clock time in seconds.
+    """
+    output_dir = tempfile.mkdtemp(prefix="bench_fetch_")
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            process_users(usernames, base_url, output_dir, workers=workers, rate=rate)
+        elapsed = time.perf_counter() - start
+        assert len(os.listdir(output_dir)) == len(usernames), "some users were not written"
+        return elapsed
+    finally:
+        shutil.rmtree(output_dir)
+
+
+def main() -> None:
+    """
+    Measure users/second of `process_users` at several concurrency levels.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--users", type=int, default=200, help="number of users to process")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response latency in seconds")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--rate", type=float, default=10000.0, help="rate limit in requests per second")
+    args = parser.parse_args()
+
+    languages = load_fixture_languages(limit=args.users)
+    server = start_stub_server(languages, args.latency)
+    usernames = list(languages)
+
+    print(f"{len(usernames)} users, {args.latency * 1000:.0f} ms latency")
+    print(f"{'workers':>8} {'seconds':>9} {'users/s':>9}")
+    for workers in args.workers:
+        elapsed = run(usernames, stub_base_url(server), workers, args.rate)
+        print(f"{workers:>8} {elapsed:>9.2f} {len(usernames) / elapsed:>9.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from history_store import KEYFRAME_INTERVAL, HistoryStore  # noqa: E402
+from synthetic import load_language_weights  # noqa: E402
+
+
+def directory_sizes(directory: str) -> tuple:
+    """
+    Args:
+        directory (str): Directory of JSON files.
+
+    Returns:
+        tuple: Total raw and gzip-compressed bytes of the files.
+    """
+    raw = compressed = 0
+    for filename in os.listdir(directory):
+        with open(os.path.join(directory, filename), "rb") as history_file:
+            content = history_file.read()
+        raw += len(content)
+        compressed += len(gzip.compress(content))
+    return raw, compressed
+
+
+def evolve(state: dict, languages: list, weights: list, active: float, rng: random.Random) -> None:
+    """
+    Advance the synthetic users by one week: a fraction of them code, some in a new language.
+    """
+    for username in rng.sample(sorted(state), int(len(state) * active)):
+        user_languages = state[username]
+        for language in rng.sample(sorted(user_languages), min(len(user_languages), rng.randint(1, 3))):
+            user_languages[language] += rng.randint(1, 1200)
+        if rng.random() < 0.05:
+            user_languages.setdefault(rng.choices(languages, weights)[0], rng.randint(1, 120))
+
+
+def main() -> None:
+    """
+    Measure the size and query times of the weekly history against storing every week in full.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--active", type=float, default=0.3, help="fraction of the users coding each week")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    languages, weights = load_language_weights()
+    state = {}
+    for index in range(args.users):
+        picked = set(rng.choices(languages, weights, k=rng.randint(1, 8)))
+        state[f"user{index:07d}"] = {language: rng.randint(1, 60000) for language in sorted(picked)}
+
+    full_bytes = full_gzip = 0
+    appends = 0.0
+    with tempfile.TemporaryDirectory() as history_dir:
+        history = HistoryStore(history_dir)
+        for _ in range(args.weeks):
+            evolve(state, languages, weights, args.active, rng)
+            # What the same week costs when every state is kept in full.
+            content = json.dumps(state, separators=(",", ":")).encode()
+            full_bytes += len(content)
+            full_gzip += len(gzip.compress(content))
+            start = time.perf_counter()
+            history.append(state)
+            appends += time.perf_counter() - start
+
+        raw, compressed = directory_sizes(history_dir)
+        print(f"{args.users} users, {args.weeks} weeks, {args.active:.0%} of the users active each week")
+        print(f"full weekly states: {full_bytes:>14,} bytes ({full_gzip:,} gzip)")
+        print(f"history segments:   {raw:>14,} bytes ({compressed:,} gzip), {full_bytes / raw:.1f}x smaller")
+        print(f"append: {appends / args.weeks * 1000:.1f} ms per week")
+
+        # A fresh store reads the segments from disk, as a query would.
+        history = HistoryStore(history_dir)
+        weeks = history.weeks()
+        # The week before a keyframe needs the most deltas.
+        slowest = max(weeks, key=lambda week: (week - 1) % KEYFRAME_INTERVAL)
+        start = time.perf_counter()
+        assert history.state_as_of(slowest)
+        print(f"state as of week {slowest} (cold): {(time.perf_counter() - start) * 1000:.1f} ms")
+        start = time.perf_counter()
+        history.state_as_of(slowest)
+        print(f"state as of week {slowest} (segments loaded): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        usernames = rng.sample(sorted(state), 1000)
+        start = time.perf_counter()
+        for username in usernames:
+            history.series(username)
+        print(f"time series of one user: {(time.perf_counter() - start) * 1000 / len(usernames):.3f} ms")
+
+        start = time.perf_counter()
+        gains = history.growth(-4)
+        print(f"fastest growing over 4 weeks: {(time.perf_counter() - start) * 1000:.1f} ms ({len(gains)} users)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from bs4 import BeautifulSoup  # noqa: E402
+from svg_parser import iter_language_data_html, parse_language_data  # noqa: E402
+from svg_fixtures import load_fixture_languages, render_compact_svg  # noqa: E402
+
+
+def parse_language_data_soup(svg_content: bytes) -> list:
+    """
+    Previous BeautifulSoup implementation of `parse_language_data`, kept as the reference.
+
+    Args:
+        svg_content (bytes): SVG content to parse.
+
+    Returns:
+        list: List of languages and time spent.
+    """
+    soup = BeautifulSoup(svg_content, "html.parser")
+    lang_data = []
+
+    for g in soup.find_all("g", {"transform": True}):
+        text = g.find("text", {"data-testid": "lang-name"})
+        if text:
+            lang_info = text.get_text(strip=True)
+            lang_name, time = lang_info.split(" - ")
+            lang_data.append({"language": lang_name, "time": time})
+
+    return lang_data
+
+
+def measure(parser, cards: list) -> float:
+    """
+    Args:
+        parser: Function parsing one card.
+        cards (list): SVG cards to parse.
+
+    Returns:
+        float: Elapsed time in seconds to parse every card once.
+    """
+    start = time.perf_counter()
+    for card in cards:
+        parser(card)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """
+    Compare the streaming parser with the BeautifulSoup one on cards rendered from the user files.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--cards", type=int, default=3000, help="number of cards to parse")
+    args = parser.parse_args()
+
+    fixtures = list(load_fixture_languages().values())
+    cards = [render_compact_svg(fixtures[i % len(fixtures)]).encode() for i in range(args.cards)]
+
+    for card in cards[:len(fixtures)]:
+        assert parse_language_data(card) == parse_language_data_soup(card), "parsers disagree"
+
+    parsers = {
+        "beautifulsoup": parse_language_data_soup,
+        "html.parser stream": lambda card: list(iter_language_data_html(card)),
+        "expat stream": parse_language_data,
+    }
+    baseline = None
+    print(f"{len(cards)} cards, {sum(map(len, cards)) / len(cards) / 1024:.1f} KiB on average")
+    print(f"{'parser':>20} {'seconds':>9} {'cards/s':>9} {'speedup':>8}")
+    for name, function in parsers.items():
+        elapsed = measure(function, cards)
+        baseline = baseline or elapsed
+        print(f"{name:>20} {elapsed:>9.3f} {len(cards) / elapsed:>9.0f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
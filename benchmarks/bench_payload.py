@@ -0,0 +1,119 @@
+import os
+import sys
+import gzip
+import json
+import argparse
+import tempfile
+import statistics
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from board_pages import export_board_pages  # noqa: E402
+
+
+def sizes(paths: list) -> tuple:
+    """
+    Args:
+        paths (list): Files downloaded by the page.
+
+    Returns:
+        tuple: Total raw and gzip-compressed bytes of the files.
+    """
+    raw = compressed = 0
+    for path in paths:
+        with open(path, "rb") as payload_file:
+            content = payload_file.read()
+        raw += len(content)
+        compressed += len(gzip.compress(content))
+    return raw, compressed
+
+
+def page_paths(pages_dir: str, board: str, entry: dict, first_only: bool) -> list:
+    """
+    Args:
+        pages_dir (str): Path to the directory of the pages.
+        board (str): Board name.
+        entry (dict): Manifest entry of the board.
+        first_only (bool): Only the first page, shown before the others are loaded.
+
+    Returns:
+        list: Paths to the pages of the board.
+    """
+    count = 1 if first_only else entry["pages"]
+    return [os.path.join(pages_dir, board, f"{index}.json") for index in range(count)]
+
+
+def print_row(name: str, before: tuple, after: tuple) -> None:
+    """
+    Print the raw and gzip sizes of a payload before and after pagination.
+    """
+    ratio = before[1] / after[1] if after[1] else float("inf")
+    print(f"{name:>36} {before[0]:>10,} {before[1]:>10,} {after[0]:>10,} {after[1]:>10,} {ratio:>7.1f}x")
+
+
+def main() -> None:
+    """
+    Compare the bytes index.html downloads with the complete leaderboard files and with the pages.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--data-dir", default="data", help="directory of the generated leaderboards")
+    args = parser.parse_args()
+
+    language_data_dir = os.path.join(args.data_dir, "languages")
+    language_list_file = os.path.join(args.data_dir, "languages.json")
+    global_file = os.path.join(args.data_dir, "global_leaderboard.json")
+    with open(language_list_file, "r") as lang_list_file:
+        language_list = json.load(lang_list_file)
+    with open(global_file, "r") as global_json:
+        global_rows = json.load(global_json)
+
+    with tempfile.TemporaryDirectory() as pages_dir:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            manifest = export_board_pages({"global": global_rows}, pages_dir, language_list, language_data_dir)
+        manifest_file = os.path.join(pages_dir, "manifest.json")
+        global_entry = manifest["boards"]["global"]
+
+        print(f"{'':>36} {'before':>21} {'after':>21}")
+        print(f"{'payload':>36} {'raw':>10} {'gzip':>10} {'raw':>10} {'gzip':>10} {'gzip':>8}")
+        # The first rows only wait for the first page: the manifest is fetched alongside it.
+        print_row(
+            "first render",
+            sizes([language_list_file, global_file]),
+            sizes([language_list_file] + page_paths(pages_dir, "global", global_entry, True)),
+        )
+        # The global board used to be downloaded twice, by the table and by the chart,
+        # which now reads the precomputed distribution of stats.json.
+        stats_file = os.path.join(args.data_dir, "stats.json")
+        print_row(
+            "page fully loaded",
+            sizes([language_list_file, global_file, global_file]),
+            sizes(
+                [language_list_file, manifest_file, stats_file]
+                + page_paths(pages_dir, "global", global_entry, False)
+            ),
+        )
+
+        first = []
+        complete = []
+        for language in language_list:
+            board = f"languages/{language}"
+            if board not in manifest["boards"]:
+                continue
+            before = sizes([os.path.join(language_data_dir, f"{language}.json")])
+            first.append((before, sizes(page_paths(pages_dir, board, manifest["boards"][board], True))))
+            complete.append((before, sizes(page_paths(pages_dir, board, manifest["boards"][board], False))))
+
+        for name, runs in (("language switch, first render", first), ("language switch, fully loaded", complete)):
+            total_before = tuple(sum(before[i] for before, _ in runs) for i in range(2))
+            total_after = tuple(sum(after[i] for _, after in runs) for i in range(2))
+            print_row(f"{name} (all)", total_before, total_after)
+
+        largest = sorted(first, key=lambda run: run[0][0])[-1]
+        print_row("largest language, first render", *largest)
+        median = statistics.median(before[1] / after[1] for before, after in first)
+        print(f"{len(first)} languages, median gzip reduction of the first render: {median:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
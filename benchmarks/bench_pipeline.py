@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import generate_leaderboards  # noqa: E402
+from changeset import save_changeset  # noqa: E402
+from elo_engine import save_snapshot  # noqa: E402
+from generate_user_data import load_users, process_users  # noqa: E402
+from history_store import HistoryStore  # noqa: E402
+from run_metrics import instrumented_run, metrics  # noqa: E402
+from stub_server import start_stub_server, stub_base_url, stub_leaders_url  # noqa: E402
+from synthetic import iter_synthetic_users, next_week_languages, write_user_tree  # noqa: E402
+from user_store import open_user_store  # noqa: E402
+from user_registry import UserRegistry, load_registry, save_registry  # noqa: E402
+from wakalead import discover_leaders  # noqa: E402
+
+REPOSITORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Options passed on to the run of each size, and saved with the results.
+RUN_OPTIONS = ("active", "new", "latency", "workers", "rate", "seed")
+
+
+def run_week(users: int, args: argparse.Namespace, report_file: str) -> None:
+    """
+    Build a synthetic repository of `users` users, then time one weekly run of the pipeline on it.
+
+    The stub serves the leaders API, with a few new users, and the cards of every user, a
+    fraction of them changed since the user files were written. The stages are the ones of
+    the weekly workflow, with the same files, in a scratch directory.
+
+    Args:
+        users (int): Number of users already in the repository.
+        args (argparse.Namespace): Options of the benchmark.
+        report_file (str): Path to the JSON file the report of the run is written to.
+    """
+    new_users = max(1, int(users * args.new))
+    records = list(iter_synthetic_users(users + new_users, args.seed))
+    cards = next_week_languages(records, args.active, args.seed)
+    rng = random.Random(args.seed)
+    leaders = [username for username, _ in rng.sample(records[:users], min(users, 100))]
+    leaders += [username for username, _ in records[users:]]
+    server = start_stub_server(cards, args.latency, leaders=leaders)
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as repository_dir:
+        # The repository as the previous weekly run left it, outside of the report.
+        write_user_tree(os.path.join(repository_dir, "data", "users"), users, args.seed)
+        os.chdir(repository_dir)
+        save_registry("data/users.json", UserRegistry(username for username, _ in records[:users]))
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            store = open_user_store("state/users.sqlite", "data/users")
+            generate_leaderboards.run(full=True, store=store)
+        metrics.reset()
+
+        with instrumented_run("pipeline", "state/run_report.json"):
+            with metrics.stage("wakalead"):
+                registry = load_registry("data/users.json")
+                discover_leaders(
+                    stub_leaders_url(server), registry, "data/users.json", "state/leaders_cursor.json", args.workers
+                )
+
+            with metrics.stage("generate_user_data"):
+                user_records: dict = {}
+                changeset: dict = {}
+                snapshot: dict = {}
+                process_users(
+                    load_users("data/users.json"),
+                    stub_base_url(server),
+                    "data/users",
+                    args.workers,
+                    30.0,
+                    args.rate,
+                    "state/retry_queue.json",
+                    "state/http_cache.json",
+                    users + new_users,
+                    user_records,
+                    changeset,
+                    store,
+                    snapshot,
+                )
+                save_changeset("state/changeset.json", changeset)
+                save_snapshot("state/snapshots", snapshot)
+                HistoryStore("state/history").append(store.language_minutes())
+
+            with metrics.stage("aggregate"):
+                generate_leaderboards.run(user_records, False, store)
+            store.close()
+
+        with open("state/run_report.json", "r") as run_report:
+            report = json.load(run_report)["pipeline"]
+        os.chdir(REPOSITORY_DIR)
+
+    server.shutdown()
+    with open(report_file, "w") as report_output:
+        json.dump(report, report_output)
+
+
+def git_commit() -> Optional[str]:
+    """
+    Returns:
+        Optional[str]: Hash of the checked out commit, None outside of a git repository.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPOSITORY_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latest_results(results_dir: str) -> Optional[str]:
+    """
+    Args:
+        results_dir (str): Directory of the saved results.
+
+    Returns:
+        Optional[str]: Path to the most recent results file, None if there is none.
+    """
+    if not os.path.isdir(results_dir):
+        return None
+    files = sorted(filename for filename in os.listdir(results_dir) if filename.endswith(".json"))
+    return os.path.join(results_dir, files[-1]) if files else None
+
+
+def print_results(results: Dict[str, dict], baseline: Dict[str, dict] = None) -> None:
+    """
+    Print the time of every stage at every scale, with the ratio to the baseline when given.
+
+    Args:
+        results (Dict[str, dict]): Report of the run, by number of users.
+        baseline (Dict[str, dict]): Reports of a previous run to compare with, by number of users.
+    """
+    for users, report in results.items():
+        previous = {stage["name"]: stage for stage in (baseline or {}).get(users, {}).get("stages", [])}
+        print(f"\n{int(users):,} users")
+        print(f"{'stage':>46} {'wall s':>9} {'cpu s':>9} {'before':>9} {'ratio':>7}")
+        for stage in report["stages"]:
+            line = f"{stage['name']:>46} {stage['wall_seconds']:>9.3f} {stage['cpu_seconds']:>9.3f}"
+            if stage["name"] in previous:
+                before = previous[stage["name"]]["wall_seconds"]
+                line += f" {before:>9.3f} {stage['wall_seconds'] / before if before else float('inf'):>6.2f}x"
+            print(line)
+
+        fetch = report["histograms"].get("fetch_seconds", {})
+        parse = report["histograms"].get("parse_seconds", {})
+        counters = report["counters"]
+        print(
+            f"fetch p50/p99 {fetch.get('p50_seconds', 0) * 1000:.1f}/{fetch.get('p99_seconds', 0) * 1000:.1f} ms, "
+            f"parse p50 {parse.get('p50_seconds', 0) * 1000:.2f} ms, {counters.get('files_written', 0):,} files "
+            f"({counters.get('bytes_written', 0):,} bytes) written, {counters.get('failures', 0)} failure(s)"
+        )
+
+
+def main() -> None:
+    """
+    Time a weekly run of the whole pipeline on synthetic repositories of several sizes.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000], help="repository sizes to run")
+    parser.add_argument("--active", type=float, default=0.3, help="fraction of the users whose card changed")
+    parser.add_argument("--new", type=float, default=0.01, help="new users on the leaders API, as a fraction")
+    parser.add_argument("--latency", type=float, default=0.0, help="stub response latency in seconds")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent requests")
+    parser.add_argument("--rate", type=float, default=100000.0, help="rate limit in requests per second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results-dir", default="benchmarks/results", help="directory of the saved results")
+    parser.add_argument("--compare", help="results file to compare with (default is the latest one)")
+    parser.add_argument("--no-save", action="store_true", help="do not save the results")
+    parser.add_argument("--run-week", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--report", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_week is not None:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            run_week(args.run_week, args, args.report)
+        return
+
+    baseline_file = args.compare or latest_results(args.results_dir)
+    results = {}
+    for users in args.users:
+        # Each size runs in a process of its own, starting from cold caches.
+        with tempfile.NamedTemporaryFile(suffix=".json") as report_file:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-week", str(users), "--report", report_file.name]
+                + [f"--{name}={getattr(args, name)}" for name in RUN_OPTIONS],
+                check=True,
+            )
+            with open(report_file.name, "r") as report_json:
+                results[str(users)] = json.load(report_json)
+
+    baseline = None
+    if baseline_file:
+        with open(baseline_file, "r") as baseline_json:
+            baseline = json.load(baseline_json)["results"]
+        print(f"Compared with {baseline_file}")
+    print_results(results, baseline)
+
+    if not args.no_save:
+        os.makedirs(args.results_dir, exist_ok=True)
+        created_at = datetime.now(timezone.utc)
+        results_file = os.path.join(args.results_dir, f"{created_at.strftime('%Y%m%dT%H%M%S')}.json")
+        with open(results_file, "w") as results_json:
+            json.dump({
+                "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "options": {name: getattr(args, name) for name in RUN_OPTIONS},
+                "results": results,
+            }, results_json, indent=4)
+        print(f"\nResults saved to {results_file}")
+
+
+if __name__ == "__main__":
+    main()
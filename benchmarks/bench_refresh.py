@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from elo_engine import DEFAULT_RULES  # noqa: E402
+from refresh_schedule import TOP_USERS, RefreshSchedule  # noqa: E402
+
+
+def main() -> None:
+    """
+    Simulate weekly runs with the refresh schedule against fetching every user, comparing fetches and elo.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=52)
+    parser.add_argument("--active", type=float, default=0.15, help="fraction of the users coding most weeks")
+    parser.add_argument("--activity", type=float, default=0.6, help="chance an active user codes in a given week")
+    parser.add_argument("--returning", type=float, default=0.005, help="chance a dormant user codes in a given week")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    usernames = [f"user{index:07d}" for index in range(args.users)]
+    active = rng.random(args.users) < args.active
+    minutes = rng.integers(0, 600000, args.users)
+    elo = -(-minutes // 60)
+    updated = np.zeros(args.users, dtype=bool)
+
+    # The users as seen by the scheduled runs: time at the last fetch, elo and flag in the store.
+    seen_minutes = minutes.copy()
+    scheduled_elo = elo.copy()
+    scheduled_updated = updated.copy()
+    schedule = RefreshSchedule()
+    columns = {username: column for column, username in enumerate(usernames)}
+
+    fetches = []
+    plan_seconds = 0.0
+    for _ in range(args.runs):
+        chance = np.where(active, args.activity, args.returning)
+        activity = np.where(rng.random(args.users) < chance, rng.integers(1, 1200, args.users), 0)
+        new_minutes = minutes + activity
+
+        # Every user fetched.
+        changed = activity > 0
+        elo = DEFAULT_RULES.apply(elo, DEFAULT_RULES.hours(minutes), DEFAULT_RULES.hours(new_minutes), updated, changed)
+        updated = changed
+        minutes = new_minutes
+
+        # Only the users due, the others decayed from their elo and flag in the store.
+        start = time.perf_counter()
+        schedule.start_run()
+        order = np.argsort(-scheduled_elo, kind="stable")
+        ranks = {usernames[column]: rank for rank, column in enumerate(order[:TOP_USERS].tolist())}
+        due, skipped, _ = schedule.plan(usernames, ranks)
+        plan_seconds += time.perf_counter() - start
+        fetches.append(len(due))
+
+        due_columns = np.fromiter(map(columns.__getitem__, due), dtype=np.int64, count=len(due))
+        seen_changed = minutes[due_columns] != seen_minutes[due_columns]
+        scheduled_elo[due_columns] = DEFAULT_RULES.apply(
+            scheduled_elo[due_columns],
+            DEFAULT_RULES.hours(seen_minutes[due_columns]),
+            DEFAULT_RULES.hours(minutes[due_columns]),
+            scheduled_updated[due_columns],
+            seen_changed,
+        )
+        scheduled_updated[due_columns] = seen_changed
+        seen_minutes[due_columns] = minutes[due_columns]
+        for username, column in zip(due, due_columns.tolist()):
+            schedule.record(username, {"elo": int(scheduled_elo[column]), "updated": bool(scheduled_updated[column])})
+
+        if skipped:
+            skipped_columns = np.fromiter(map(columns.__getitem__, skipped), dtype=np.int64, count=len(skipped))
+            scheduled_elo[skipped_columns] = DEFAULT_RULES.decay_runs(
+                scheduled_elo[skipped_columns], scheduled_updated[skipped_columns], np.ones(len(skipped), dtype=int)
+            )
+            scheduled_updated[skipped_columns] = False
+
+    weekly = np.array([schedule.tier(username) == "weekly" for username in usernames])
+    different = scheduled_elo != elo
+    top = np.argsort(-elo, kind="stable")[:TOP_USERS]
+    scheduled_top = np.argsort(-scheduled_elo, kind="stable")[:TOP_USERS]
+    steady = fetches[-13:]
+
+    print(f"{args.users:,} users, {args.runs} runs, {active.mean():.0%} active")
+    print(f"fetches per run: first {fetches[0]:,}, last 13 runs {np.mean(steady):,.0f} "
+          f"({args.users / np.mean(steady):.1f}x fewer than fetching every user)")
+    print(f"total fetches: {sum(fetches):,} instead of {args.users * args.runs:,} "
+          f"({args.users * args.runs / sum(fetches):.1f}x fewer)")
+    print(f"users with a different elo: {different.sum():,} ({different[weekly].sum():,} in the weekly tier), "
+          f"largest difference {np.abs(scheduled_elo - elo).max()}")
+    print(f"top {TOP_USERS} identical: {np.array_equal(top, scheduled_top)}")
+    print(f"planning: {plan_seconds / args.runs * 1000:.1f} ms per run")
+
+
+if __name__ == "__main__":
+    main()
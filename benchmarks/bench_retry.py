@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import json
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from generate_user_data import process_users  # noqa: E402
+from stub_server import start_stub_server, stub_base_url  # noqa: E402
+from svg_fixtures import load_fixture_languages  # noqa: E402
+
+
+def build_script(usernames: list, seed: int) -> tuple:
+    """
+    Script 429 and 503 bursts for a part of the users.
+
+    Args:
+        usernames (list): Users served by the stub.
+        seed (int): Seed of the random generator choosing the failing users.
+
+    Returns:
+        tuple: The stub script and the users expected to end up in the retry queue.
+    """
+    rng = random.Random(seed)
+    script = {}
+    lost = set()
+    for username in usernames:
+        roll = rng.random()
+        if roll < 0.10:
+            script[username] = [(429, "1")]
+        elif roll < 0.20:
+            script[username] = [(503, None), (503, None)]
+        elif roll < 0.22:
+            script[username] = [(503, None)] * 20
+            lost.add(username)
+    return script, lost
+
+
+def main() -> None:
+    """
+    Run `process_users` against scripted 429/503 responses and check that no user is lost.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--users", type=int, default=200, help="number of users to process")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent requests")
+    parser.add_argument("--rate", type=float, default=50.0, help="maximum requests per second")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    languages = load_fixture_languages(limit=args.users)
+    usernames = list(languages)
+    script, lost = build_script(usernames, args.seed)
+    server = start_stub_server(languages, script=script)
+
+    scratch = tempfile.mkdtemp(prefix="bench_retry_")
+    output_dir = os.path.join(scratch, "users")
+    queue_file = os.path.join(scratch, "retry_queue.json")
+    os.makedirs(output_dir)
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            stats = process_users(usernames, stub_base_url(server), output_dir, args.workers, 5.0, args.rate, queue_file)
+        elapsed = time.perf_counter() - start
+
+        with open(queue_file, "r") as file:
+            queued = {entry["username"] for entry in json.load(file)}
+        written = {filename[:-len(".json")] for filename in os.listdir(output_dir)}
+
+        print(f"{len(usernames)} users, {len(script)} scripted, {elapsed:.1f} s")
+        print(f"succeeded={stats['succeeded']} retried={stats['retried']} given_up={stats['given_up']}")
+        print(f"written={len(written)} queued={len(queued)}")
+        assert queued == lost, "retry queue does not match the users failing every attempt"
+        assert written | queued == set(usernames), "some users were neither written nor queued"
+    finally:
+        shutil.rmtree(scratch)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+from urllib.parse import quote
+from typing import List
+
+REPOSITORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def free_port() -> int:
+    """
+    Returns:
+        int: A local port no one listens on.
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_for_server(port: int, timeout: float = 30.0) -> dict:
+    """
+    Args:
+        port (int): Port of the server.
+        timeout (float): Seconds to wait for the server to answer.
+
+    Returns:
+        dict: Boards served, by name, with their number of rows.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/api/boards")
+            return json.loads(connection.getresponse().read())["boards"]
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def build_queries(count: int, seed: int = 0) -> List[str]:
+    """
+    Mix of top-K, rank, range and percentile queries on the global leaderboard and the
+    language leaderboards of the committed data.
+
+    Args:
+        count (int): Number of distinct queries.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        List[str]: Request paths.
+    """
+    rng = random.Random(seed)
+    with open(os.path.join(REPOSITORY_DIR, "data", "global_leaderboard.json"), "r") as global_file:
+        usernames = [user["username"] for user in json.load(global_file)]
+    with open(os.path.join(REPOSITORY_DIR, "data", "languages.json"), "r") as languages_file:
+        languages = json.load(languages_file)
+
+    queries = []
+    for _ in range(count):
+        board = "global" if rng.random() < 0.5 else f"languages/{quote(rng.choice(languages))}"
+        kind = rng.choices(["top", "rank", "range", "percentile"], [2, 5, 2, 1])[0]
+        if kind == "top":
+            queries.append(f"/api/{board}/top?k={rng.choice([10, 100])}")
+        elif kind == "rank":
+            queries.append(f"/api/global/rank?user={quote(rng.choice(usernames))}")
+        elif kind == "range":
+            start = rng.randint(1, 2000)
+            queries.append(f"/api/{board}/range?from={start}&to={start + 49}")
+        else:
+            queries.append(f"/api/{board}/percentile?p={rng.choice([50, 90, 99])}")
+    return queries
+
+
+def run_clients(port: int, queries: List[str], clients: int, duration: float) -> List[float]:
+    """
+    Send random queries from several clients with keep-alive connections for a fixed time.
+
+    Args:
+        port (int): Port of the server.
+        queries (List[str]): Request paths to pick from.
+        clients (int): Number of concurrent clients.
+        duration (float): Seconds to send requests for.
+
+    Returns:
+        List[float]: Latency of every request, in seconds.
+    """
+    latencies: List[float] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(seed: int) -> None:
+        rng = random.Random(seed)
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        measured = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            connection.request("GET", rng.choice(queries))
+            connection.getresponse().read()
+            measured.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            latencies.extend(measured)
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main() -> None:
+    """
+    Measure the requests per second and latencies of the local leaderboard server on the committed data.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16], help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of load per measure")
+    parser.add_argument("--queries", type=int, default=2000, help="distinct queries the clients pick from")
+    parser.add_argument("--cache-size", type=int, nargs="+", default=[10000, 0], help="server cache sizes to run")
+    args = parser.parse_args()
+
+    queries = build_queries(args.queries)
+    print(f"{'cache':>6} {'clients':>8} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for cache_size in args.cache_size:
+        port = free_port()
+        # The server runs in a process of its own, so that the clients do not share its interpreter.
+        server = subprocess.Popen(
+            [sys.executable, os.path.join("src", "serve.py"), "--port", str(port), "--cache-size", str(cache_size)],
+            cwd=REPOSITORY_DIR,
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_server(port)
+            for clients in args.clients:
+                latencies = sorted(run_clients(port, queries, clients, args.duration))
+                p50 = latencies[max(1, -(-len(latencies) * 50 // 100)) - 1]
+                p99 = latencies[max(1, -(-len(latencies) * 99 // 100)) - 1]
+                print(
+                    f"{cache_size:>6} {clients:>8} {len(latencies):>9,} {len(latencies) / args.duration:>9,.0f} "
+                    f"{p50 * 1000:>8.2f} {p99 * 1000:>8.2f} {latencies[-1] * 1000:>8.2f}"
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import filecmp
+import tempfile
+import contextlib
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import generate_leaderboards  # noqa: E402
+from changeset import save_changeset  # noqa: E402
+from elo_engine import save_snapshot  # noqa: E402
+from generate_user_data import load_users, merge_shards, process_users, remove_shards, run_shards  # noqa: E402
+from history_store import HistoryStore  # noqa: E402
+from refresh_schedule import RefreshSchedule  # noqa: E402
+from stub_server import start_stub_server, stub_base_url  # noqa: E402
+from synthetic import iter_synthetic_users, next_week_languages, write_user_tree  # noqa: E402
+from user_registry import UserRegistry, save_registry  # noqa: E402
+from user_store import open_user_store  # noqa: E402
+
+
+def differing_files(left: str, right: str) -> List[str]:
+    """
+    Args:
+        left (str): Path to a directory.
+        right (str): Path to another directory.
+
+    Returns:
+        List[str]: Paths, relative to the directories, of the files that differ or are in only one of them.
+    """
+    def walk(comparison: filecmp.dircmp, prefix: str) -> List[str]:
+        files = [prefix + name for name in comparison.diff_files + comparison.left_only + comparison.right_only]
+        for name, subdirectory in comparison.subdirs.items():
+            files += walk(subdirectory, prefix + name + "/")
+        return files
+
+    return walk(filecmp.dircmp(left, right), "")
+
+
+def run_single(base_url: str, args: argparse.Namespace) -> None:
+    """
+    One weekly run of generate_user_data.py --aggregate, in a single process, in the current directory.
+
+    Args:
+        base_url (str): Base URL of the stub API.
+        args (argparse.Namespace): Options of the benchmark.
+    """
+    store = open_user_store("state/users.sqlite", "data/users")
+    records: dict = {}
+    changeset: dict = {}
+    snapshot: dict = {}
+    process_users(
+        load_users("data/users.json"),
+        base_url,
+        "data/users",
+        args.workers,
+        30.0,
+        args.rate,
+        "state/retry_queue.json",
+        "state/http_cache.json",
+        args.users,
+        records,
+        changeset,
+        store,
+        snapshot,
+        RefreshSchedule("state/refresh_schedule.json"),
+    )
+    save_changeset("state/changeset.json", changeset)
+    save_snapshot("state/snapshots", snapshot, "run")
+    HistoryStore("state/history").append(store.language_minutes(), "run")
+    generate_leaderboards.run(records, False, store)
+    store.close()
+
+
+def run_sharded(base_url: str, shards: int, args: argparse.Namespace) -> None:
+    """
+    The same run as `run_single`, in `shards` processes merged afterwards.
+
+    Args:
+        base_url (str): Base URL of the stub API.
+        shards (int): Number of shards.
+        args (argparse.Namespace): Options of the benchmark.
+    """
+    shard_args = (
+        load_users("data/users.json"),
+        base_url,
+        "data/users",
+        "state/shards",
+        "state/users.sqlite",
+        "state/retry_queue.json",
+        "state/http_cache.json",
+        args.users,
+        "state/refresh_schedule.json",
+    )
+    run_shards(shards, shard_args, args.workers, 30.0, args.rate)
+    store, aggregates = merge_shards(
+        shards,
+        "state/shards",
+        "data/users",
+        "state/users.sqlite",
+        "state/retry_queue.json",
+        "state/http_cache.json",
+        args.users,
+        "state/refresh_schedule.json",
+        "state/changeset.json",
+        "state/snapshots",
+        "state/history",
+    )
+    generate_leaderboards.run(full=False, aggregates=aggregates)
+    store.close()
+    remove_shards("state/shards", shards)
+
+
+def main() -> None:
+    """
+    Time a weekly run of generate_user_data.py --aggregate in one process and in N shards merged
+    afterwards, on the same synthetic repository, and check the outputs are identical.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--active", type=float, default=0.3, help="fraction of the users whose card changed")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every stub response")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent requests over all the shards")
+    parser.add_argument("--rate", type=float, default=100000.0, help="requests per second over all the shards")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    records = list(iter_synthetic_users(args.users, args.seed))
+    server = start_stub_server(next_week_languages(records, args.active, args.seed), args.latency)
+    base_url = stub_base_url(server)
+    working_dir = os.getcwd()
+
+    with tempfile.TemporaryDirectory(prefix="bench_shards_") as scratch_dir:
+        # The repository as the previous weekly run left it.
+        base_dir = os.path.join(scratch_dir, "base")
+        write_user_tree(os.path.join(base_dir, "data", "users"), args.users, args.seed)
+        save_registry(os.path.join(base_dir, "data", "users.json"), UserRegistry(username for username, _ in records))
+        os.chdir(base_dir)
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            generate_leaderboards.run(full=True, store=open_user_store("state/users.sqlite", "data/users"))
+
+        print(f"{args.users:,} users, {os.cpu_count()} CPU(s)")
+        print(f"{'processes':>9} {'seconds':>8} {'speedup':>8} {'identical':>9}")
+        timings = {}
+        for shards in [1] + args.shards:
+            repository_dir = os.path.join(scratch_dir, str(shards))
+            shutil.copytree(base_dir, repository_dir)
+            os.chdir(repository_dir)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(open(os.devnull, "w")):
+                if shards == 1:
+                    run_single(base_url, args)
+                else:
+                    run_sharded(base_url, shards, args)
+            timings[shards] = time.perf_counter() - start
+
+            differences = differing_files(os.path.join(scratch_dir, "1", "data"), os.path.join(repository_dir, "data"))
+            print(f"{shards:>9} {timings[shards]:>8.2f} {timings[1] / timings[shards]:>7.2f}x {not differences!s:>9}")
+        os.chdir(working_dir)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from generate_leaderboards import generate_leaderboards  # noqa: E402
+from streaming_boards import stream_leaderboards, stream_top_boards  # noqa: E402
+from synthetic import iter_synthetic_users  # noqa: E402
+from user_records import iter_user_records  # noqa: E402
+from user_store import UserStore  # noqa: E402
+
+
+def build_board(mode: str, store_file: str, output_dir: str, args: argparse.Namespace) -> None:
+    """
+    Build the language and global leaderboards and their pages from the store, in the current process.
+
+    Args:
+        mode (str): "memory" for the leaderboards built in memory, "streaming" or "top" for the streaming ones.
+        store_file (str): Path to the SQLite database of the user store.
+        output_dir (str): Path to the directory the leaderboards are written to.
+        args (argparse.Namespace): Options of the benchmark.
+    """
+    store = UserStore(store_file)
+    paths = (
+        os.path.join(output_dir, "languages"),
+        os.path.join(output_dir, "languages.json"),
+        os.path.join(output_dir, "global_leaderboard.json"),
+    )
+    pages_dir = os.path.join(output_dir, "pages")
+    if mode == "memory":
+        generate_leaderboards(iter_user_records(store), *paths, None, pages_dir)
+    elif mode == "streaming":
+        stream_leaderboards(store.stream_records(), *paths, pages_dir, args.run_size, output_dir)
+    else:
+        top_dir = os.path.join(output_dir, "top")
+        stream_top_boards(store.stream_records(), paths[0], args.top, top_dir, args.run_size, output_dir)
+
+
+def measure(
+    mode: str,
+    store_file: str,
+    output_dir: str,
+    args: argparse.Namespace,
+    results: multiprocessing.Queue
+) -> None:
+    """
+    Time `build_board` and report the peak resident memory of the process, which only ran it.
+
+    Args:
+        mode (str): Mode of `build_board`.
+        store_file (str): Path to the SQLite database of the user store.
+        output_dir (str): Path to the directory the leaderboards are written to.
+        args (argparse.Namespace): Options of the benchmark.
+        results (multiprocessing.Queue): Queue the seconds and the peak memory in MiB are put in.
+    """
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        build_board(mode, store_file, output_dir, args)
+    seconds = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((seconds, peak_rss / 1024, (peak_rss - start_rss) / 1024))
+
+
+def main() -> None:
+    """
+    Compare the time and peak memory of the leaderboards built in memory and streamed with external sort or top-K.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--run-size", type=int, default=200000, help="entries held in memory before a spill")
+    parser.add_argument("--top", type=int, default=100, help="rows written of every board in top mode")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Forked processes start with the memory of this one, which stays small.
+    context = multiprocessing.get_context("fork")
+    print(f"{'users':>9} {'mode':>10} {'seconds':>8} {'peak MiB':>9} {'growth MiB':>11}")
+    for users in args.users:
+        with tempfile.TemporaryDirectory(prefix="bench_streaming_") as scratch_dir:
+            store_file = os.path.join(scratch_dir, "users.sqlite")
+            store = UserStore(store_file)
+            for username, user_data in iter_synthetic_users(users, args.seed):
+                store.put(username, user_data)
+            store.close()
+
+            for mode in ["memory", "streaming", "top"]:
+                output_dir = os.path.join(scratch_dir, mode)
+                results = context.Queue()
+                process = context.Process(target=measure, args=(mode, store_file, output_dir, args, results))
+                process.start()
+                seconds, peak, growth = results.get()
+                process.join()
+                print(f"{users:>9,} {mode:>10} {seconds:>8.2f} {peak:>9.1f} {growth:>11.1f}")
+                shutil.rmtree(output_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, List, Optional, Tuple
+
+from svg_fixtures import render_compact_svg
+
+
+# Users per page of the stub leaders API, like the WakaTime one.
+LEADERS_PAGE_SIZE = 100
+
+
+class StubStatsHandler(BaseHTTPRequestHandler):
+    """
+    Serve canned compact WakaTime cards the way github-readme-stats does, and the
+    pages of the WakaTime leaders API.
+    """
+    protocol_version = "HTTP/1.1"
+    wbufsize = 64 * 1024
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path == "/api/v1/leaders":
+            self.send_leaders(parse_qs(url.query))
+            return
+        username = parse_qs(url.query).get("username", [""])[0]
+        languages = self.server.languages.get(username)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        with self.server.lock:
+            script = self.server.script.get(username)
+            scripted = script.pop(0) if script else None
+        if scripted:
+            status, retry_after = scripted
+            self.send_response(status)
+            if retry_after is not None:
+                self.send_header("Retry-After", retry_after)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if url.path != "/api/wakatime" or languages is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = render_compact_svg(languages).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "image/svg+xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_leaders(self, query: Dict[str, List[str]]) -> None:
+        """
+        Send a page of the leaders, shaped like https://wakatime.com/api/v1/leaders.
+
+        Args:
+            query (Dict[str, List[str]]): Query parameters of the request, "page" starting at 1.
+        """
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        leaders = self.server.leaders
+        total_pages = max(1, -(-len(leaders) // LEADERS_PAGE_SIZE))
+        page = int(query.get("page", ["1"])[0])
+        start = (page - 1) * LEADERS_PAGE_SIZE
+        body = json.dumps({
+            "data": [
+                {"rank": start + index + 1, "user": {"username": username}}
+                for index, username in enumerate(leaders[start:start + LEADERS_PAGE_SIZE])
+            ],
+            "page": page,
+            "total_pages": total_pages,
+        }).encode()
+
+        self.send_response(200 if 1 <= page <= total_pages else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_stub_server(
+    languages: Dict[str, List[Dict[str, str]]],
+    latency: float = 0.0,
+    script: Dict[str, List[Tuple[int, Optional[str]]]] = None,
+    leaders: List[str] = None
+) -> ThreadingHTTPServer:
+    """
+    Start the stub stats server on a free local port in a background thread.
+
+    Args:
+        languages (Dict[str, List[Dict[str, str]]]): Language entries served for each username.
+        latency (float): Delay in seconds added to every response.
+        script (Dict[str, List[Tuple[int, Optional[str]]]]): Error responses, as (status, Retry-After)
+            pairs, returned in order for a username before its card is served.
+        leaders (List[str]): Usernames served by the leaders API, in rank order (default is none).
+
+    Returns:
+        ThreadingHTTPServer: Running server, its API URL is `stub_base_url(server)`.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubStatsHandler)
+    server.daemon_threads = True
+    server.languages = languages
+    server.latency = latency
+    server.script = script or {}
+    server.leaders = leaders or []
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stub_base_url(server: ThreadingHTTPServer) -> str:
+    """
+    Build the base URL to pass to `fetch_user_response` for a running stub server.
+
+    Args:
+        server (ThreadingHTTPServer): Server returned by `start_stub_server`.
+
+    Returns:
+        str: Base URL of the stub WakaTime card endpoint.
+    """
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/api/wakatime"
+
+
+def stub_leaders_url(server: ThreadingHTTPServer) -> str:
+    """
+    Build the URL of the leaders API of a running stub server.
+
+    Args:
+        server (ThreadingHTTPServer): Server returned by `start_stub_server`.
+
+    Returns:
+        str: URL of the stub WakaTime leaders endpoint.
+    """
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/api/v1/leaders"
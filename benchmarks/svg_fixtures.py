@@ -0,0 +1,95 @@
+import os
+import json
+from typing import Dict, List
+
+
+LANG_ITEM = """
+        <g transform="translate({x}, {y})">
+          <circle cx="5" cy="6" r="5" fill="{color}" />
+          <text data-testid="lang-name" x="15" y="10" class='lang-name'>
+            {language} - {time}
+          </text>
+        </g>"""
+
+CARD = """<svg
+      width="495"
+      height="{height}"
+      viewBox="0 0 495 {height}"
+      fill="none"
+      xmlns="http://www.w3.org/2000/svg"
+      role="img"
+      aria-labelledby="descId"
+    >
+      <title id="titleId">Wakatime Stats</title>
+      <desc id="descId"></desc>
+      <style>
+        .header {{
+          font: 600 18px 'Segoe UI', Ubuntu, Sans-Serif;
+          fill: #2f80ed;
+        }}
+        .lang-name {{ font: 400 11px 'Segoe UI', Ubuntu, Sans-Serif; fill: #434d58 }}
+      </style>
+
+      <rect data-testid="card-bg" x="0.5" y="0.5" rx="4.5" height="99%" stroke="#e4e2e2" width="494" fill="#fffefe" stroke-opacity="1" />
+
+      <g data-testid="card-title" transform="translate(25, 35)">
+        <g transform="translate(0, 0)">
+          <text x="0" y="0" class="header" data-testid="header">Wakatime Stats</text>
+        </g>
+      </g>
+
+      <g data-testid="main-card-body" transform="translate(0, 55)">
+        <svg x="0" y="0" width="100%">
+          <mask id="rect-mask">
+            <rect x="25" y="0" width="440" height="8" fill="white" rx="5" />
+          </mask>
+          {progress}
+          {items}
+        </svg>
+      </g>
+    </svg>
+"""
+
+COLORS = ["#3178c6", "#f1e05a", "#3572A5", "#b07219", "#e34c26", "#563d7c", "#00ADD8", "#dea584"]
+
+
+def render_compact_svg(languages: List[Dict[str, str]]) -> str:
+    """
+    Render a github-readme-stats WakaTime card in the compact layout.
+
+    Args:
+        languages (List[Dict[str, str]]): Language entries with "language" and "time" keys.
+
+    Returns:
+        str: SVG document with one `lang-name` text node per language.
+    """
+    items = []
+    progress = []
+    for index, entry in enumerate(languages):
+        color = COLORS[index % len(COLORS)]
+        x = 25 if index % 2 == 0 else 230
+        y = 25 + (index // 2) * 25
+        items.append(LANG_ITEM.format(x=x, y=y, color=color, language=entry["language"], time=entry["time"]))
+        progress.append(f'<rect mask="url(#rect-mask)" data-testid="lang-progress" x="{25 + index * 10}" y="0" width="10" height="8" fill="{color}" />')
+
+    height = 90 + ((len(languages) + 1) // 2) * 25
+    return CARD.format(height=height, progress="\n          ".join(progress), items="".join(items))
+
+
+def load_fixture_languages(user_data_dir: str = "data/users", limit: int = None) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Load the languages of the committed user files to render realistic cards from.
+
+    Args:
+        user_data_dir (str): Path to the directory containing user JSON files.
+        limit (int): Maximum number of users to load (default is all of them).
+
+    Returns:
+        Dict[str, List[Dict[str, str]]]: Language entries by username.
+    """
+    fixtures = {}
+    for filename in sorted(os.listdir(user_data_dir))[:limit]:
+        if filename.endswith(".json"):
+            with open(os.path.join(user_data_dir, filename), "r") as user_file:
+                fixtures[filename[:-len(".json")]] = json.load(user_file).get("languages", [])
+    return fixtures
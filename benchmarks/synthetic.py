@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import random
+from typing import Dict, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from generate_user_data import minutes_to_time, time_to_minutes  # noqa: E402
+
+
+def load_language_weights(language_data_dir: str = "data/languages") -> Tuple[List[str], List[int]]:
+    """
+    Use the size of the committed language leaderboards as the popularity of each language.
+
+    Args:
+        language_data_dir (str): Path to the directory of the language JSON files.
+
+    Returns:
+        Tuple[List[str], List[int]]: Language names and their number of users.
+    """
+    languages, weights = [], []
+    for filename in sorted(os.listdir(language_data_dir)):
+        if filename.endswith(".json"):
+            with open(os.path.join(language_data_dir, filename), "r") as lang_file:
+                languages.append(filename[:-len(".json")].replace("_", " "))
+                weights.append(max(1, len(json.load(lang_file))))
+    return languages, weights
+
+
+def build_entry_pool(languages: List[str], rng: random.Random, times_per_language: int = 64) -> Dict[str, list]:
+    """
+    Pre-build language entries with log-normally distributed times, shared between users to save memory.
+
+    Args:
+        languages (List[str]): Language names.
+        rng (random.Random): Random generator.
+        times_per_language (int): Number of distinct times per language.
+
+    Returns:
+        Dict[str, list]: Language entries by language.
+    """
+    pool = {}
+    for language in languages:
+        pool[language] = [
+            {"language": language, "time": minutes_to_time(int(rng.lognormvariate(7.5, 1.4)))}
+            for _ in range(times_per_language)
+        ]
+    return pool
+
+
+def iter_synthetic_users(count: int, seed: int = 0, max_languages: int = 16) -> Iterator[Tuple[str, dict]]:
+    """
+    Generate user records shaped like the files of data/users.
+
+    Args:
+        count (int): Number of users.
+        seed (int): Seed of the random generator.
+        max_languages (int): Maximum number of languages per user.
+
+    Yields:
+        Tuple[str, dict]: Username and user data.
+    """
+    rng = random.Random(seed)
+    languages, weights = load_language_weights()
+    pool = build_entry_pool(languages, rng)
+
+    for index in range(count):
+        chosen = set(rng.choices(languages, weights, k=rng.randint(1, max_languages)))
+        entries = [rng.choice(pool[language]) for language in sorted(chosen)]
+        elo = rng.randint(0, 20000)
+        yield f"user{index:07d}", {
+            "total_time": minutes_to_time(elo * 60),
+            "updated": rng.random() < 0.5,
+            "elo": elo,
+            "languages": entries,
+        }
+
+
+def write_user_tree(user_data_dir: str, count: int, seed: int = 0) -> None:
+    """
+    Write synthetic users as a data/users-like directory.
+
+    Args:
+        user_data_dir (str): Directory to create the user JSON files in.
+        count (int): Number of users.
+        seed (int): Seed of the random generator.
+    """
+    os.makedirs(user_data_dir, exist_ok=True)
+    for username, user_data in iter_synthetic_users(count, seed):
+        with open(os.path.join(user_data_dir, f"{username}.json"), "w") as user_file:
+            json.dump(user_data, user_file, indent=4)
+
+
+def next_week_languages(
+    records: List[Tuple[str, dict]],
+    active: float = 0.3,
+    seed: int = 0
+) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Languages served on the cards of the users a week later: a fraction of them coded in
+    some of their languages, the others show the same card as before.
+
+    Args:
+        records (List[Tuple[str, dict]]): Username and user data of every user.
+        active (float): Fraction of the users whose card changed.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        Dict[str, List[Dict[str, str]]]: Language entries of the card of each user, by username.
+    """
+    rng = random.Random(seed)
+    cards = {}
+    for username, user_data in records:
+        entries = [dict(entry) for entry in user_data["languages"]]
+        if entries and rng.random() < active:
+            for entry in rng.sample(entries, min(len(entries), rng.randint(1, 3))):
+                entry["time"] = minutes_to_time(time_to_minutes(entry["time"]) + rng.randint(1, 1200))
+        cards[username] = entries
+    return cards
@@ -0,0 +1,345 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+# Files and bytes of every writer of the process, read by the run report.
+WRITE_TOTALS: Dict[str, int] = {"files_written": 0, "files_skipped": 0, "bytes_written": 0}
+# Files and bytes read from disk by the process: the JSON inputs, and the files compared before a write.
+READ_TOTALS: Dict[str, int] = {"files_read": 0, "bytes_read": 0}
+# Whitespace between the tokens of a JSON document.
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def current_umask() -> int:
+    """
+    Returns:
+        int: File mode creation mask of the process.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+class BatchWriter:
+    """
+    Crash-safe writer of the generated JSON files.
+
+    Documents are serialized into memory and written in batches: each batch goes to
+    temporary files next to their targets, which are synced to disk and then renamed
+    over the targets, so a killed run leaves every file either old or new, never
+    half-written. Files whose content would not change are not rewritten at all.
+    """
+
+    def __init__(self, batch_size: int = 1000) -> None:
+        """
+        Args:
+            batch_size (int): Number of pending files that triggers a write to disk.
+        """
+        self.batch_size = batch_size
+        self.pending: List[Tuple[str, bytes]] = []
+        self.mode = 0o666 & ~current_umask()
+        self.files_written = 0
+        self.files_skipped = 0
+        self.bytes_written = 0
+
+    def write(self, file_path: str, data: Any, compact: bool = False) -> None:
+        """
+        Serialize a document the way `json.dump(data, file, indent=4)` does and queue it for writing.
+
+        Args:
+            file_path (str): Path to the JSON file.
+            data (Any): Document to write.
+            compact (bool): Write minified JSON, without indentation or spaces, instead.
+        """
+        if compact:
+            content = json.dumps(data, separators=(",", ":"))
+        else:
+            content = json.dumps(data, indent=4)
+        self.write_bytes(file_path, content.encode("utf-8"))
+
+    def write_bytes(self, file_path: str, content: bytes) -> None:
+        """
+        Queue content for writing, unless the file already holds exactly this content.
+
+        Args:
+            file_path (str): Path to the file.
+            content (bytes): Full content of the file.
+        """
+        if same_content(file_path, content):
+            self.files_skipped += 1
+            WRITE_TOTALS["files_skipped"] += 1
+            return
+        self.pending.append((file_path, content))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def write_stream(self, file_path: str, chunks: Iterable[bytes]) -> None:
+        """
+        Write a file too large to hold in memory from its chunks, to a temporary file renamed
+        over the target unless the target already holds exactly this content. Unlike `write`,
+        the file is written at once rather than with the next batch.
+
+        Args:
+            file_path (str): Path to the file.
+            chunks (Iterable[bytes]): Content of the file, in order.
+        """
+        directory = os.path.dirname(file_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in chunks:
+                    temp_file.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                temp_file.flush()
+                os.fchmod(temp_file.fileno(), self.mode)
+                os.fsync(temp_file.fileno())
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        if same_digest(file_path, size, digest.digest()):
+            os.remove(temp_path)
+            self.files_skipped += 1
+            WRITE_TOTALS["files_skipped"] += 1
+            return
+        os.replace(temp_path, file_path)
+        sync_directory(directory)
+        self.files_written += 1
+        self.bytes_written += size
+        WRITE_TOTALS["files_written"] += 1
+        WRITE_TOTALS["bytes_written"] += size
+
+    def flush(self) -> None:
+        """
+        Write and sync a temporary file for every pending file, then rename them all over their targets.
+        """
+        pending, self.pending = self.pending, []
+        temp_files = []
+        try:
+            for file_path, content in pending:
+                directory = os.path.dirname(file_path) or "."
+                os.makedirs(directory, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(
+                    dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp"
+                )
+                temp_files.append((temp_path, file_path))
+                with os.fdopen(fd, "wb") as temp_file:
+                    temp_file.write(content)
+                    temp_file.flush()
+                    os.fchmod(temp_file.fileno(), self.mode)
+                    os.fsync(temp_file.fileno())
+        except BaseException:
+            for temp_path, _ in temp_files:
+                os.remove(temp_path)
+            raise
+
+        directories = set()
+        for (temp_path, file_path), (_, content) in zip(temp_files, pending):
+            os.replace(temp_path, file_path)
+            directories.add(os.path.dirname(file_path) or ".")
+            self.files_written += 1
+            self.bytes_written += len(content)
+            WRITE_TOTALS["files_written"] += 1
+            WRITE_TOTALS["bytes_written"] += len(content)
+        for directory in directories:
+            sync_directory(directory)
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: Human readable summary of the files written and skipped.
+        """
+        return (
+            f"Output: {self.files_written} file(s) written ({self.bytes_written:,} bytes), "
+            f"{self.files_skipped} unchanged file(s) skipped"
+        )
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+
+
+def same_content(file_path: str, content: bytes) -> bool:
+    """
+    Args:
+        file_path (str): Path to an existing or missing file.
+        content (bytes): Content about to be written.
+
+    Returns:
+        bool: True if the file exists with the same size and SHA-256 hash as the content.
+    """
+    return same_digest(file_path, len(content), hashlib.sha256(content).digest())
+
+
+def same_digest(file_path: str, size: int, digest: bytes) -> bool:
+    """
+    Args:
+        file_path (str): Path to an existing or missing file.
+        size (int): Size of the content about to be written.
+        digest (bytes): SHA-256 digest of the content.
+
+    Returns:
+        bool: True if the file exists with this size and SHA-256 digest, read a chunk at a time.
+    """
+    try:
+        if os.path.getsize(file_path) != size:
+            return False
+        existing_digest = hashlib.sha256()
+        with open(file_path, "rb") as existing_file:
+            for chunk in iter(lambda: existing_file.read(1 << 20), b""):
+                existing_digest.update(chunk)
+        READ_TOTALS["files_read"] += 1
+        READ_TOTALS["bytes_read"] += size
+        return existing_digest.digest() == digest
+    except FileNotFoundError:
+        return False
+
+
+def sync_directory(directory: str) -> None:
+    """
+    Sync a directory, so that the renames done in it survive a crash.
+
+    Args:
+        directory (str): Path to the directory.
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def iter_json_array(items: Iterable[Any], compact: bool = False, block_size: int = 1000) -> Iterator[bytes]:
+    """
+    Serialize a list a block of items at a time, the way `BatchWriter.write` serializes it whole.
+
+    Args:
+        items (Iterable[Any]): Items of the list.
+        compact (bool): Minified JSON instead of indented JSON.
+        block_size (int): Items serialized at once.
+
+    Yields:
+        bytes: Consecutive chunks of the JSON document.
+    """
+    items = iter(items)
+    # Each block is serialized as a list, whose brackets and surrounding newlines are cut off.
+    start, separator, end = ("[", ",", "]") if compact else ("[\n", ",\n", "\n]")
+    empty = True
+    while True:
+        block = list(islice(items, block_size))
+        if not block:
+            break
+        if compact:
+            content = json.dumps(block, separators=(",", ":"))
+        else:
+            content = json.dumps(block, indent=4)
+        yield ((start if empty else separator) + content[len(start):-len(end)]).encode("utf-8")
+        empty = False
+    yield b"[]" if empty else end.encode("utf-8")
+
+
+def write_json_file(file_path: str, data: Any, compact: bool = False) -> None:
+    """
+    Atomically write a single JSON file, indented like `json.dump(data, file, indent=4)`.
+
+    Args:
+        file_path (str): Path to the JSON file.
+        data (Any): Document to write.
+        compact (bool): Write minified JSON instead.
+    """
+    with BatchWriter() as writer:
+        writer.write(file_path, data, compact)
+
+
+def read_json_file(file_path: str) -> Any:
+    """
+    Load a JSON file, counting the bytes read in the run report.
+
+    Args:
+        file_path (str): Path to the JSON file.
+
+    Returns:
+        Any: Document of the file.
+    """
+    with open(file_path, "rb") as json_file:
+        content = json_file.read()
+    READ_TOTALS["files_read"] += 1
+    READ_TOTALS["bytes_read"] += len(content)
+    return json.loads(content)
+
+
+def read_json_array(file_path: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """
+    Load the items of a JSON array file one at a time, reading the file a chunk at a time,
+    so that memory does not grow with the length of the array.
+
+    Args:
+        file_path (str): Path to a JSON file holding an array.
+        chunk_size (int): Characters read from the file at once.
+
+    Yields:
+        Any: Items of the array, in order.
+
+    Raises:
+        ValueError: If the file does not hold a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    READ_TOTALS["files_read"] += 1
+    READ_TOTALS["bytes_read"] += os.path.getsize(file_path)
+    with open(file_path, "r", encoding="utf-8") as json_file:
+        buffer, position, eof = "", 0, False
+        # What comes next: "[", an item or "]" right after it, "," or "]" after an item, or an item after ",".
+        expected = "["
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position == len(buffer) and not eof:
+                buffer, position = json_file.read(chunk_size), 0
+                eof = not buffer
+                continue
+            character = buffer[position] if position < len(buffer) else ""
+
+            if expected == "[":
+                if character != "[":
+                    raise ValueError(f"{file_path} does not hold a JSON array")
+                position += 1
+                expected = "first"
+            elif character == "]" and expected in ("first", "next"):
+                return
+            elif expected == "next":
+                if character != ",":
+                    raise ValueError(f"{file_path} does not hold a JSON array")
+                position += 1
+                expected = "item"
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                    after = WHITESPACE.match(buffer, end).end()
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    after = len(buffer)
+                # An item not followed by "," or "]" may go on in the next chunk (e.g. the number
+                # "1." of "1.5"): it is decoded again once more of the file is read.
+                if not eof and (after == len(buffer) or buffer[after] not in ",]"):
+                    chunk = json_file.read(chunk_size)
+                    buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+                    continue
+                yield item
+                position = end
+                expected = "next"
@@ -0,0 +1,204 @@
+import os
+import json
+import hashlib
+from typing import Dict, Iterable, List
+from batch_writer import BatchWriter, read_json_file
+
+
+# Rows of the first page, rendered as soon as it arrives, and of each continuation page.
+FIRST_PAGE_SIZE = 100
+PAGE_SIZE = 1000
+
+
+def load_manifest(manifest_file: str) -> dict:
+    """
+    Load the manifest of the paginated leaderboards.
+
+    Args:
+        manifest_file (str): Path to the manifest JSON file.
+
+    Returns:
+        dict: Manifest, with no boards if the file does not exist.
+    """
+    manifest = {"first_page_size": FIRST_PAGE_SIZE, "page_size": PAGE_SIZE, "boards": {}}
+    if os.path.exists(manifest_file):
+        existing = read_json_file(manifest_file)
+        # Boards paginated with other sizes are forgotten, so that they are written again.
+        if (existing.get("first_page_size"), existing.get("page_size")) == (FIRST_PAGE_SIZE, PAGE_SIZE):
+            manifest["boards"] = existing["boards"]
+    return manifest
+
+
+class BoardPageWriter:
+    """
+    Writer of the pages of one leaderboard from its rows in rank order, one row at a time,
+    so that a board never needs to be held in memory whole.
+
+    The first page holds `FIRST_PAGE_SIZE` rows and the continuation pages `PAGE_SIZE`
+    rows; a board has at least one page, possibly empty.
+    """
+
+    def __init__(self, name: str, pages_dir: str, writer: BatchWriter) -> None:
+        """
+        Args:
+            name (str): Name of the board, also its directory in `pages_dir` (e.g. "global" or "languages/Python").
+            pages_dir (str): Path to the directory of the pages.
+            writer (BatchWriter): Writer of the files.
+        """
+        self.board_dir = os.path.join(pages_dir, name)
+        self.writer = writer
+        self.page: List[dict] = []
+        self.pages = 0
+        self.rows = 0
+        # Digest of the minified board, used by the site as a cache key.
+        self.digest = hashlib.sha256(b"[")
+
+    def add(self, row: dict) -> None:
+        """
+        Args:
+            row (dict): Next row of the leaderboard.
+        """
+        self.rows += 1
+        self.page.append(row)
+        if len(self.page) == (PAGE_SIZE if self.pages else FIRST_PAGE_SIZE):
+            self.write_page()
+
+    def write_page(self) -> None:
+        """
+        Write the rows of the current page as a minified JSON file.
+        """
+        content = json.dumps(self.page, separators=(",", ":")).encode("utf-8")
+        # The rows of the page, without the brackets, are the next part of the minified board.
+        if self.page:
+            self.digest.update(content[1:-1] if self.pages == 0 else b"," + content[1:-1])
+        self.writer.write_bytes(os.path.join(self.board_dir, f"{self.pages}.json"), content)
+        self.pages += 1
+        self.page = []
+
+    def close(self) -> dict:
+        """
+        Write the last page.
+
+        Returns:
+            dict: Manifest entry of the board: number of pages, number of rows and short
+                SHA-256 digest of the minified board.
+        """
+        if self.page or not self.pages:
+            self.write_page()
+        digest = self.digest.copy()
+        digest.update(b"]")
+        return {"pages": self.pages, "rows": self.rows, "hash": digest.hexdigest()[:16]}
+
+
+def write_board_pages(name: str, rows: Iterable[dict], pages_dir: str, writer: BatchWriter) -> dict:
+    """
+    Write the pages of one leaderboard as minified JSON files.
+
+    Args:
+        name (str): Name of the board, also its directory in `pages_dir` (e.g. "global" or "languages/Python").
+        rows (Iterable[dict]): Rows of the leaderboard, in rank order.
+        pages_dir (str): Path to the directory of the pages.
+        writer (BatchWriter): Writer of the files.
+
+    Returns:
+        dict: Manifest entry of the board: number of pages, number of rows and content hash.
+    """
+    pages = BoardPageWriter(name, pages_dir, writer)
+    for row in rows:
+        pages.add(row)
+    return pages.close()
+
+
+def remove_stale_pages(board_dir: str, page_count: int) -> None:
+    """
+    Remove the pages left over from a longer version of a board.
+
+    Args:
+        board_dir (str): Path to the directory of the board pages.
+        page_count (int): Number of pages of the board.
+    """
+    if not os.path.isdir(board_dir):
+        return
+    for filename in os.listdir(board_dir):
+        index = filename[:-len(".json")]
+        if filename.endswith(".json") and index.isdigit() and int(index) >= page_count:
+            os.remove(os.path.join(board_dir, filename))
+
+
+def export_board_pages(
+    boards: Dict[str, List[dict]],
+    pages_dir: str,
+    language_names: Iterable[str] = None,
+    language_data_dir: str = None,
+    writer: BatchWriter = None
+) -> dict:
+    """
+    Write the pages of the given leaderboards and update the manifest of every board.
+
+    Boards missing from the manifest that are not given are read from their language
+    file, so that the pages stay complete when only the changed languages are given.
+
+    Args:
+        boards (Dict[str, List[dict]]): Rows of the leaderboards to write, by board name.
+        pages_dir (str): Path to the directory of the pages and of "manifest.json".
+        language_names (Iterable[str]): Sanitized names of every language, if known;
+            language boards not in it are dropped from the manifest.
+        language_data_dir (str): Path to the directory of the language JSON files.
+        writer (BatchWriter): Writer of the files (default is a new one).
+
+    Returns:
+        dict: Updated manifest.
+    """
+    writer = writer or BatchWriter()
+    manifest_file = os.path.join(pages_dir, "manifest.json")
+    manifest = load_manifest(manifest_file)
+    boards = dict(boards)
+
+    if language_names is not None:
+        language_boards = {f"languages/{language}" for language in language_names}
+        for name in list(manifest["boards"]):
+            if name.startswith("languages/") and name not in language_boards:
+                del manifest["boards"][name]
+        for name in sorted(language_boards - set(manifest["boards"]) - set(boards)):
+            language_file = os.path.join(language_data_dir, f"{name[len('languages/'):]}.json")
+            if os.path.exists(language_file):
+                boards[name] = read_json_file(language_file)
+
+    for name, rows in boards.items():
+        manifest["boards"][name] = write_board_pages(name, rows, pages_dir, writer)
+    manifest["boards"] = dict(sorted(manifest["boards"].items()))
+
+    writer.write(manifest_file, manifest, compact=True)
+    writer.flush()
+    for name in boards:
+        remove_stale_pages(os.path.join(pages_dir, name), manifest["boards"][name]["pages"])
+    print(f"Pages of {len(boards)} board(s) written to {pages_dir}")
+    return manifest
+
+
+def write_streamed_manifest(entries: Dict[str, dict], pages_dir: str, writer: BatchWriter = None) -> dict:
+    """
+    Update the manifest once the pages of every language board have been written with a
+    `BoardPageWriter`: the language boards missing from `entries` are dropped.
+
+    Args:
+        entries (Dict[str, dict]): Manifest entries of the boards written, by board name.
+        pages_dir (str): Path to the directory of the pages and of "manifest.json".
+        writer (BatchWriter): Writer of the files (default is a new one).
+
+    Returns:
+        dict: Updated manifest.
+    """
+    writer = writer or BatchWriter()
+    manifest_file = os.path.join(pages_dir, "manifest.json")
+    manifest = load_manifest(manifest_file)
+    boards = {name: entry for name, entry in manifest["boards"].items() if not name.startswith("languages/")}
+    boards.update(entries)
+    manifest["boards"] = dict(sorted(boards.items()))
+
+    writer.write(manifest_file, manifest, compact=True)
+    writer.flush()
+    for name, entry in entries.items():
+        remove_stale_pages(os.path.join(pages_dir, name), entry["pages"])
+    print(f"Pages of {len(entries)} board(s) written to {pages_dir}")
+    return manifest
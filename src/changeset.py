@@ -0,0 +1,71 @@
+import os
+from typing import Dict, List
+from batch_writer import read_json_file, write_json_file
+
+
+def record_change(changeset: Dict[str, dict], username: str, before: List[dict], after: List[dict]) -> None:
+    """
+    Record the languages of a user before and after an update, if they changed.
+
+    When the user already has a pending change, its original "before" languages are kept,
+    so that several runs between two leaderboard updates add up to a single change.
+
+    Args:
+        changeset (Dict[str, dict]): Pending changes, by username.
+        username (str): Username of the updated user.
+        before (List[dict]): Language entries previously in the user file.
+        after (List[dict]): Language entries written to the user file.
+    """
+    if username in changeset:
+        before = changeset[username]["before"]
+    if before == after:
+        changeset.pop(username, None)
+    else:
+        changeset[username] = {"before": before, "after": after}
+
+
+def merge_changesets(pending: Dict[str, dict], changeset: Dict[str, dict]) -> Dict[str, dict]:
+    """
+    Add the changes of a run on top of the changes still pending from previous runs.
+
+    Args:
+        pending (Dict[str, dict]): Changes not yet applied to the leaderboards, by username.
+        changeset (Dict[str, dict]): Changes of the current run, by username.
+
+    Returns:
+        Dict[str, dict]: Combined changes, by username.
+    """
+    merged = dict(pending)
+    for username, change in changeset.items():
+        record_change(merged, username, change["before"], change["after"])
+    return merged
+
+
+def load_changeset(file_path: str) -> Dict[str, dict]:
+    """
+    Load the pending changes.
+
+    Args:
+        file_path (str): Path to the changeset JSON file.
+
+    Returns:
+        Dict[str, dict]: Pending changes by username, empty if the file does not exist.
+    """
+    if not os.path.exists(file_path):
+        return {}
+    return read_json_file(file_path)
+
+
+def save_changeset(file_path: str, changeset: Dict[str, dict]) -> None:
+    """
+    Save the pending changes, or remove the file once there are none left.
+
+    Args:
+        file_path (str): Path to the changeset JSON file.
+        changeset (Dict[str, dict]): Pending changes, by username.
+    """
+    if not changeset:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return
+    write_json_file(file_path, dict(sorted(changeset.items())))
@@ -0,0 +1,261 @@
+import os
+import argparse
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, List
+from batch_writer import BatchWriter, read_json_file, write_json_file
+from user_store import open_user_store
+
+
+class EloRules:
+    """
+    Rules turning one run of a user into its new elo, applied to every user at once.
+
+    A user whose languages changed gains the hours its total time grew by; a user
+    unchanged for a second run in a row (not "updated" by the previous one) loses
+    `decay` elo, without going below 0; otherwise the elo stays the same.
+    """
+
+    def __init__(self, decay: int = 2) -> None:
+        """
+        Args:
+            decay (int): Elo lost by an inactive user at each run (2 hours of code by default).
+        """
+        self.decay = decay
+
+    def hours(self, minutes: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            minutes (np.ndarray): Total times in minutes.
+
+        Returns:
+            np.ndarray: Total times in started hours.
+        """
+        return -(-np.asarray(minutes) // 60)
+
+    def gain(self, previous_hours: np.ndarray, new_hours: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            previous_hours (np.ndarray): Total times in hours before the runs.
+            new_hours (np.ndarray): Total times in hours after the runs.
+
+        Returns:
+            np.ndarray: Elo gained by the users whose languages changed.
+        """
+        return np.maximum(0, new_hours - previous_hours)
+
+    def apply(
+        self,
+        previous_elo: np.ndarray,
+        previous_hours: np.ndarray,
+        new_hours: np.ndarray,
+        updated: np.ndarray,
+        changed: np.ndarray
+    ) -> np.ndarray:
+        """
+        Compute the new elo of a batch of users.
+
+        Args:
+            previous_elo (np.ndarray): Elo before the run.
+            previous_hours (np.ndarray): Total time in hours before the run.
+            new_hours (np.ndarray): Total time in hours after the run.
+            updated (np.ndarray): Whether the previous run changed the languages of the user.
+            changed (np.ndarray): Whether this run changed the languages of the user.
+
+        Returns:
+            np.ndarray: New elo of each user.
+        """
+        decayed = np.where(updated, previous_elo, np.maximum(0, previous_elo - self.decay))
+        return np.where(changed, previous_elo + self.gain(previous_hours, new_hours), decayed)
+
+    def decay_runs(self, elo: np.ndarray, updated: np.ndarray, runs: np.ndarray) -> np.ndarray:
+        """
+        Compute the elo of a batch of users after several runs that did not change them, at once.
+
+        This is `apply` repeated `runs` times with `changed` false: the first run only
+        decays the users that were not "updated", and every following run decays all of them.
+
+        Args:
+            elo (np.ndarray): Elo before the runs.
+            updated (np.ndarray): Whether the run before them changed the languages of the user.
+            runs (np.ndarray): Number of unchanged runs of each user.
+
+        Returns:
+            np.ndarray: Elo of each user after the runs.
+        """
+        decayed_runs = np.maximum(0, np.asarray(runs) - np.asarray(updated, dtype=np.int64))
+        return np.maximum(0, np.asarray(elo) - self.decay * decayed_runs)
+
+
+DEFAULT_RULES = EloRules()
+
+# Inputs of the rules recorded for each user of a run, in the order of `record_snapshot`.
+SNAPSHOT_COLUMNS = ("previous_elo", "previous_minutes", "new_minutes", "updated", "changed")
+
+
+def record_snapshot(
+    snapshot: Dict[str, list],
+    username: str,
+    previous_elo: int,
+    previous_minutes: int,
+    new_minutes: int,
+    updated: bool,
+    changed: bool
+) -> None:
+    """
+    Record the inputs of the elo rules for one user of a run, so that the run can be replayed.
+
+    Args:
+        snapshot (Dict[str, list]): Inputs of the run, by username.
+        username (str): Username of the user.
+        previous_elo (int): Elo before the run.
+        previous_minutes (int): Total time in minutes before the run.
+        new_minutes (int): Total time in minutes after the run.
+        updated (bool): Whether the previous run changed the languages of the user.
+        changed (bool): Whether this run changed the languages of the user.
+    """
+    snapshot[username] = [previous_elo, previous_minutes, new_minutes, int(updated), int(changed)]
+
+
+def save_snapshot(snapshot_dir: str, snapshot: Dict[str, list], name: str = None) -> None:
+    """
+    Save the inputs of a run in a file of its own, named after the time of the run.
+
+    The file holds one list per column rather than one list per user, which is several
+    times faster to parse back.
+
+    Args:
+        snapshot_dir (str): Path to the directory of the snapshots.
+        snapshot (Dict[str, list]): Inputs of the run, by username.
+        name (str): Name of the run, ordering the snapshots (default is the current UTC time).
+    """
+    if not snapshot:
+        return
+    usernames = sorted(snapshot)
+    columns = {"usernames": usernames}
+    for index, column in enumerate(SNAPSHOT_COLUMNS):
+        columns[column] = [snapshot[username][index] for username in usernames]
+
+    name = name or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H%M%S")
+    write_json_file(os.path.join(snapshot_dir, f"{name}.json"), columns, compact=True)
+
+
+class RunInputs:
+    """
+    Inputs of the elo rules for a sequence of runs, as (runs x users) arrays.
+    """
+
+    def __init__(self, usernames: List[str], runs: int) -> None:
+        """
+        Args:
+            usernames (List[str]): Usernames, in the column order of the arrays.
+            runs (int): Number of runs.
+        """
+        shape = (runs, len(usernames))
+        self.usernames = usernames
+        self.present = np.zeros(shape, dtype=bool)
+        self.previous_elo = np.zeros(shape, dtype=np.int64)
+        self.previous_minutes = np.zeros(shape, dtype=np.int64)
+        self.new_minutes = np.zeros(shape, dtype=np.int64)
+        self.updated = np.zeros(shape, dtype=bool)
+        self.changed = np.zeros(shape, dtype=bool)
+
+
+def load_snapshots(snapshot_dir: str) -> RunInputs:
+    """
+    Load the recorded runs, in the order they happened.
+
+    Args:
+        snapshot_dir (str): Path to the directory of the snapshots.
+
+    Returns:
+        RunInputs: Inputs of every run for every user seen in one of them.
+    """
+    snapshots = []
+    for filename in sorted(os.listdir(snapshot_dir)):
+        if filename.endswith(".json"):
+            snapshots.append(read_json_file(os.path.join(snapshot_dir, filename)))
+
+    usernames = sorted({username for snapshot in snapshots for username in snapshot["usernames"]})
+    columns = {username: column for column, username in enumerate(usernames)}
+    inputs = RunInputs(usernames, len(snapshots))
+    for run, snapshot in enumerate(snapshots):
+        indexes = np.fromiter(map(columns.__getitem__, snapshot["usernames"]), dtype=np.int64)
+        inputs.present[run, indexes] = True
+        for column in SNAPSHOT_COLUMNS:
+            getattr(inputs, column)[run, indexes] = np.array(snapshot[column])
+    return inputs
+
+
+def replay(inputs: RunInputs, rules: EloRules = DEFAULT_RULES) -> np.ndarray:
+    """
+    Apply the rules to the recorded runs again, one run at a time for all users at once.
+
+    A user starts from the elo recorded at its first run; from then on, its elo is the
+    one computed by the replay, so that a change of the rules carries over every run.
+
+    Args:
+        inputs (RunInputs): Inputs of the runs.
+        rules (EloRules): Rules to apply.
+
+    Returns:
+        np.ndarray: Elo of every user after each run, as a (runs x users) array.
+    """
+    runs, users = inputs.present.shape
+    history = np.zeros((runs, users), dtype=np.int64)
+    elo = np.zeros(users, dtype=np.int64)
+    seen = np.zeros(users, dtype=bool)
+
+    for run in range(runs):
+        present = inputs.present[run]
+        new_elo = rules.apply(
+            np.where(seen, elo, inputs.previous_elo[run]),
+            rules.hours(inputs.previous_minutes[run]),
+            rules.hours(inputs.new_minutes[run]),
+            inputs.updated[run],
+            inputs.changed[run],
+        )
+        elo = np.where(present, new_elo, elo)
+        seen |= present
+        history[run] = elo
+
+    return history
+
+
+def main() -> None:
+    """
+    Replay the recorded runs with the given rules, and optionally backfill the elo of the users.
+    """
+    parser = argparse.ArgumentParser(description="Recompute the elo of every user from the recorded runs.")
+    parser.add_argument("--decay", type=int, default=2, help="elo lost by an inactive user at each run (default: 2)")
+    parser.add_argument("--write", action="store_true", help="store the replayed elo and export the user files")
+    args = parser.parse_args()
+
+    user_data_dir: str = "data/users"
+    snapshot_dir: str = "state/snapshots"
+    user_store_file: str = "state/users.sqlite"
+
+    inputs = load_snapshots(snapshot_dir)
+    history = replay(inputs, EloRules(args.decay))
+    print(f"Replayed {history.shape[0]} run(s) for {history.shape[1]} user(s)")
+    if not args.write or not history.size:
+        return
+
+    store = open_user_store(user_store_file, user_data_dir)
+    changed = []
+    for username, elo in zip(inputs.usernames, history[-1].tolist()):
+        user_data = store.get(username)
+        if user_data is not None and user_data["elo"] != elo:
+            store.put(username, dict(user_data, elo=elo))
+            changed.append(username)
+    store.commit()
+
+    writer = BatchWriter()
+    store.export_json(user_data_dir, changed, writer)
+    store.close()
+    print(f"Backfilled the elo of {len(changed)} user(s)")
+    print(writer.report())
+
+
+if __name__ == "__main__":
+    main()
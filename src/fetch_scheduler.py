@@ -0,0 +1,286 @@
+import os
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional
+from batch_writer import read_json_file, write_json_file
+
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the request rate of every fetch worker.
+
+    The rate is adaptive: it is halved each time the server answers 429 and grows
+    back step by step on every successful request, up to the configured maximum.
+    """
+
+    def __init__(self, rate: float, capacity: int, min_rate: float = 0.5) -> None:
+        """
+        Args:
+            rate (float): Maximum number of requests per second.
+            capacity (int): Number of requests that may be sent in a burst.
+            min_rate (float): Lowest rate the bucket throttles down to.
+        """
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Block until a request may be sent.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    elapsed = max(0.0, now - self.updated)
+                    self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stop handing out tokens for the given duration, e.g. to honour Retry-After.
+
+        Args:
+            seconds (float): Duration of the pause in seconds.
+        """
+        with self.lock:
+            until = time.monotonic() + seconds
+            if until > self.paused_until:
+                self.paused_until = until
+                self.updated = until
+                self.tokens = 0.0
+
+    def throttle(self) -> None:
+        """
+        Halve the request rate after the server reported being overloaded.
+        """
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self) -> None:
+        """
+        Raise the request rate a little after a successful request.
+        """
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RetryQueue:
+    """
+    Users whose fetch failed with a transient error, persisted between runs.
+    """
+
+    def __init__(self, file_path: Optional[str] = None) -> None:
+        """
+        Args:
+            file_path (Optional[str]): JSON file the queue is loaded from and saved to (default is in memory only).
+        """
+        self.file_path = file_path
+        self.entries: Dict[str, Dict] = {}
+
+        if file_path and os.path.exists(file_path):
+            self.entries = {entry["username"]: entry for entry in read_json_file(file_path)}
+
+    def usernames(self) -> List[str]:
+        """
+        Returns:
+            List[str]: Queued usernames, ordered by name.
+        """
+        return sorted(self.entries)
+
+    def add(self, username: str, error: str) -> None:
+        """
+        Queue a user for the next run, counting how many runs it has failed in a row.
+
+        Args:
+            username (str): Username whose fetch failed.
+            error (str): Last error encountered.
+        """
+        runs = self.entries.get(username, {}).get("runs", 0) + 1
+        self.entries[username] = {"username": username, "runs": runs, "error": error}
+
+    def discard(self, username: str) -> None:
+        """
+        Remove a user from the queue once it has been fetched.
+
+        Args:
+            username (str): Username to remove.
+        """
+        self.entries.pop(username, None)
+
+    def save(self) -> None:
+        """
+        Write the queue back to its file, if it has one.
+        """
+        if self.file_path:
+            write_json_file(self.file_path, [self.entries[username] for username in self.usernames()])
+
+
+class FetchError(Exception):
+    """
+    Raised when a fetch failed and should not be retried in this pass.
+    """
+
+    def __init__(self, message: str, retryable: bool) -> None:
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Convert a Retry-After header into a number of seconds.
+
+    Args:
+        value (Optional[str]): Header value, either delay-seconds or an HTTP date.
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class FetchScheduler:
+    """
+    Wrap a fetch function with rate limiting, retries and outcome counters.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], str],
+        bucket: TokenBucket,
+        max_attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ) -> None:
+        """
+        Args:
+            fetch (Callable[[str], str]): Function fetching the content for a username.
+            bucket (TokenBucket): Rate limiter shared by all workers.
+            max_attempts (int): Attempts per user and per pass before giving up.
+            base_delay (float): Backoff delay in seconds after the first failure.
+            max_delay (float): Upper bound of the backoff delay in seconds.
+        """
+        self.fetch_function = fetch
+        self.bucket = bucket
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"succeeded": 0, "retried": 0, "given_up": 0}
+        self.lock = threading.Lock()
+
+    def count(self, outcome: str) -> None:
+        """
+        Args:
+            outcome (str): Counter to increment ("succeeded", "retried" or "given_up").
+        """
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Args:
+            attempt (int): Number of attempts made so far.
+
+        Returns:
+            float: Randomized delay in seconds before the next attempt ("full jitter").
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def fetch(self, username: str) -> str:
+        """
+        Fetch a user, retrying 429, 5xx and network errors with backoff.
+
+        Args:
+            username (str): Username to fetch.
+
+        Returns:
+            str: Content returned by the fetch function.
+
+        Raises:
+            FetchError: If the request failed permanently or ran out of attempts.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            self.bucket.acquire()
+            try:
+                content = self.fetch_function(username)
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status not in RETRYABLE_STATUSES:
+                    raise FetchError(str(e), retryable=False)
+                delay = self.backoff(attempt)
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                if retry_after is not None:
+                    delay = max(delay, min(retry_after, self.max_delay))
+                if status == 429:
+                    self.bucket.throttle()
+                    self.bucket.pause(delay)
+                error = str(e)
+            except requests.RequestException as e:
+                # Network errors, timeouts and broken or undecodable response bodies.
+                delay = self.backoff(attempt)
+                error = str(e)
+            else:
+                self.bucket.recover()
+                self.count("succeeded")
+                return content
+
+            if attempt < self.max_attempts:
+                self.count("retried")
+                time.sleep(delay)
+
+        raise FetchError(error, retryable=True)
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: Human readable summary of the outcome counters.
+        """
+        return (
+            f"Fetches: {self.stats['succeeded']} succeeded, "
+            f"{self.stats['retried']} retried, {self.stats['given_up']} given up"
+        )
+
+
+def create_session(pool_size: int = 10) -> requests.Session:
+    """
+    Create an HTTP session with a connection pool large enough for every worker.
+
+    Args:
+        pool_size (int): Number of keep-alive connections to keep per host.
+
+    Returns:
+        requests.Session: Session to share between all fetch workers.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -1,101 +1,105 @@
-import os
-import json
 import math
+import argparse
 from typing import List, Dict
+from batch_writer import BatchWriter
+from board_pages import export_board_pages
+from run_metrics import instrumented_run, metrics
+from user_records import iter_user_records
+from user_store import UserStore, open_user_store
 
 
-def time_to_minutes(time_str: str) -> int:
+def add_user_elo(users: List[Dict[str, str]], username: str, user_data: dict) -> None:
     """
-    Convert a time string (e.g., '2 hrs 30 mins') to total minutes.
+    Add the elo of one user to the list of users.
 
     Args:
-        time_str (str): Time string to convert.
-
-    Returns:
-        int: Total time in minutes.
-    """
-    parts = time_str.split()
-    total_minutes = 0
-    for i in range(0, len(parts), 2):
-        value = int(parts[i].replace(",", ""))
-        unit = parts[i + 1]
-        if "hr" in unit:
-            total_minutes += value * 60
-        elif "min" in unit:
-            total_minutes += value
-    return total_minutes
-
-
-def minutes_to_time(minutes: int) -> str:
-    """
-    Convert total minutes into a formatted time string.
-
-    Args:
-        minutes (int): Total time in minutes.
-
-    Returns:
-        str: Formatted time string (e.g., '2 hrs 30 mins').
+        users (List[Dict[str, str]]): List of users with their elo.
+        username (str): Username of the user.
+        user_data (dict): Content of the user JSON file.
     """
-    hours, mins = divmod(minutes, 60)
-    if hours > 0 and mins > 0:
-        return f"{hours:,} hrs {mins} mins"
-    elif hours > 0:
-        return f"{hours:,} hrs"
-    else:
-        return f"{mins} mins"
+    elo = math.ceil(user_data.get("elo", 0))
+    users.append({"username": username, "elo": elo})
 
 
-def load_user_data(user_data_dir: str) -> List[Dict[str, str]]:
+def load_user_data(store: UserStore) -> List[Dict[str, str]]:
     """
-    Load user data from JSON files in the specified directory.
+    Load user data from the user store.
 
     Args:
-        user_data_dir (str): Path to the directory containing user JSON files.
+        store (UserStore): Store of the user records.
 
     Returns:
         List[Dict[str, str]]: List of users with their elo.
     """
     users = []
 
-    for filename in os.listdir(user_data_dir):
-        if filename.endswith(".json"):
-            user_file_path = os.path.join(user_data_dir, filename)
-            username = filename.replace(".json", "")
-
-            with open(user_file_path, "r") as user_file:
-                user_data = json.load(user_file)
-
-            elo = math.ceil(user_data.get("elo", 0))
-            users.append({"username": username, "elo": elo})
+    for username, user_data in iter_user_records(store):
+        add_user_elo(users, username, user_data)
 
     return users
 
 
-def generate_global_leaderboard(user_data_dir: str, output_file: str) -> None:
+def write_global_leaderboard(
+    users: List[Dict[str, str]],
+    output_file: str,
+    writer: BatchWriter = None
+) -> List[Dict[str, str]]:
     """
-    Generate a global leaderboard JSON file based on elo.
+    Write the users sorted by elo to the global leaderboard JSON file.
 
     Args:
-        user_data_dir (str): Path to the directory containing user JSON files.
+        users (List[Dict[str, str]]): List of users with their elo.
         output_file (str): Path to the output JSON file.
+        writer (BatchWriter): Writer of the file (default is a new one).
+
+    Returns:
+        List[Dict[str, str]]: Users sorted by elo.
     """
-    users = load_user_data(user_data_dir)
+    writer = writer or BatchWriter()
     sorted_users = sorted(users, key=lambda x: x["elo"], reverse=True)
 
-    with open(output_file, "w") as output_json:
-        json.dump(sorted_users, output_json, indent=4)
-
+    writer.write(output_file, sorted_users)
+    writer.flush()
     print(f"Global leaderboard written to {output_file}")
+    return sorted_users
+
+
+def generate_global_leaderboard(store: UserStore, output_file: str, pages_dir: str = None) -> None:
+    """
+    Generate a global leaderboard JSON file based on elo.
+
+    Args:
+        store (UserStore): Store of the user records.
+        output_file (str): Path to the output JSON file.
+        pages_dir (str): If given, path to the directory where the paginated leaderboard is also written.
+    """
+    with metrics.stage("read users"):
+        users = load_user_data(store)
+    writer = BatchWriter()
+    with metrics.stage("global leaderboard"):
+        sorted_users = write_global_leaderboard(users, output_file, writer)
+    if pages_dir:
+        with metrics.stage("pages"):
+            export_board_pages({"global": sorted_users}, pages_dir, writer=writer)
+    print(writer.report())
 
 
 def main() -> None:
     """
     Main function to generate the global leaderboard.
     """
+    parser = argparse.ArgumentParser(description="Generate the global leaderboard from the user data.")
+    parser.add_argument("--profile", metavar="FILE", help="save cProfile statistics of the run to FILE")
+    args = parser.parse_args()
+
     user_data_dir = "data/users"
     output_file = "data/global_leaderboard.json"
+    user_store_file = "state/users.sqlite"
+    pages_dir = "data/pages"
+    report_file = "state/run_report.json"
 
-    generate_global_leaderboard(user_data_dir, output_file)
+    with instrumented_run("generate_global_leaderboard", report_file, args.profile):
+        generate_global_leaderboard(open_user_store(user_store_file, user_data_dir), output_file, pages_dir)
 
 
 if __name__ == "__main__":
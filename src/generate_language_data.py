@@ -1,7 +1,15 @@
 import os
-import json
+import bisect
+import argparse
 from collections import defaultdict
-from typing import List, Dict, DefaultDict
+from typing import List, Dict, DefaultDict, Tuple
+from batch_writer import BatchWriter, read_json_file
+from board_pages import export_board_pages
+from changeset import load_changeset, save_changeset
+from run_metrics import instrumented_run, metrics
+from time_codec import time_to_minutes, times_to_minutes
+from user_records import iter_user_records
+from user_store import UserStore, open_user_store
 
 
 def create_directory(directory_path: str) -> None:
@@ -14,138 +22,311 @@ def create_directory(directory_path: str) -> None:
     os.makedirs(directory_path, exist_ok=True)
 
 
-def load_user_data(user_data_dir: str) -> DefaultDict[str, List[Dict[str, str]]]:
+def add_user_languages(
+    language_data: DefaultDict[str, Dict[str, Tuple[int, str]]],
+    username: str,
+    user_data: dict
+) -> None:
     """
-    Load user data from JSON files in the specified directory.
+    Add the languages of one user to the language data.
     Languages with "Other" or less than 150 minutes (2.5 hours) are ignored.
 
     Args:
-        user_data_dir (str): Path to the directory containing user JSON files.
+        language_data (DefaultDict[str, Dict[str, Tuple[int, str]]]): A dictionary mapping languages
+            to the minutes and time string of each user, by username.
+        username (str): Username of the user.
+        user_data (dict): Content of the user JSON file.
+    """
+    for entry in user_data.get("languages", []):
+        language = entry["language"]
+        time = entry["time"]
+        minutes = time_to_minutes(time)
+
+        if language == "Other" or minutes < 150:
+            continue
+
+        language_data[language].setdefault(username, (minutes, time))
+
+
+def load_user_data(store: UserStore) -> DefaultDict[str, Dict[str, Tuple[int, str]]]:
+    """
+    Load user data from the user store.
+    Languages with "Other" or less than 150 minutes (2.5 hours) are ignored.
+
+    Args:
+        store (UserStore): Store of the user records.
 
     Returns:
-        DefaultDict[str, List[Dict[str, str]]]: A dictionary mapping languages to user data.
+        DefaultDict[str, Dict[str, Tuple[int, str]]]: A dictionary mapping languages
+            to the minutes and time string of each user, by username.
     """
-    language_data: DefaultDict[str, List[Dict[str, str]]] = defaultdict(list)
+    language_data: DefaultDict[str, Dict[str, Tuple[int, str]]] = defaultdict(dict)
 
-    for filename in os.listdir(user_data_dir):
-        if filename.endswith(".json"):
-            user_file_path = os.path.join(user_data_dir, filename)
-            username = filename.replace(".json", "")
+    for username, user_data in iter_user_records(store):
+        add_user_languages(language_data, username, user_data)
 
-            with open(user_file_path, "r") as user_file:
-                user_data = json.load(user_file)
+    return language_data
 
-            for entry in user_data.get("languages", []):
-                language = entry["language"]
-                time = entry["time"]
 
-                if language == "Other" or time_to_minutes(time) < 150:
-                    continue
+def merge_and_sort_users(
+    existing_users: List[Dict[str, str]],
+    new_users: Dict[str, Tuple[int, str]]
+) -> List[Dict[str, str]]:
+    """
+    Merge existing user data with new user data and sort by time in descending order.
+    Each time string is parsed once, the sort only compares minutes.
 
-                if not any(user["username"] == username for user in language_data[language]):
-                    language_data[language].append({"username": username, "time": time})
+    Args:
+        existing_users (List[Dict[str, str]]): List of existing user data.
+        new_users (Dict[str, Tuple[int, str]]): Minutes and time string of the new user data, by username.
 
-    return language_data
+    Returns:
+        List[Dict[str, str]]: Merged and sorted list of user data.
+    """
+    existing_minutes = times_to_minutes(user["time"] for user in existing_users)
+    user_dict = {
+        user["username"]: (minutes, user["time"]) for user, minutes in zip(existing_users, existing_minutes)
+    }
+    user_dict.update(new_users)
+
+    ranked_users = sorted(user_dict.items(), key=lambda item: item[1][0], reverse=True)
+    return [{"username": username, "time": time} for username, (_, time) in ranked_users]
 
 
-def time_to_minutes(time_str: str) -> int:
+def write_language_data(
+    language_data: DefaultDict[str, Dict[str, Tuple[int, str]]],
+    output_dir: str,
+    writer: BatchWriter = None
+) -> Dict[str, List[Dict[str, str]]]:
     """
-    Convert a time string (e.g., '2 hrs 30 mins') to total minutes.
+    Write language-specific user data to JSON files in the specified directory.
 
     Args:
-        time_str (str): Time string to convert.
+        language_data (DefaultDict[str, Dict[str, Tuple[int, str]]]): Dictionary mapping languages to user data.
+        output_dir (str): Path to the directory where JSON files will be written.
+        writer (BatchWriter): Writer of the files (default is a new one).
 
     Returns:
-        int: Total time in minutes.
+        Dict[str, List[Dict[str, str]]]: Sorted users written for each language, by sanitized language name.
     """
-    parts = time_str.split()
-    total_minutes = 0
-    for i in range(0, len(parts), 2):
-        value = int(parts[i].replace(",", ""))
-        unit = parts[i + 1]
-        if "hr" in unit:
-            total_minutes += value * 60
-        elif "min" in unit:
-            total_minutes += value
-    return total_minutes
+    writer = writer or BatchWriter()
+    boards = {}
+    for language, users in language_data.items():
+        sanitized_language = language.replace(" ", "_").replace("/", "_")
+        output_path = os.path.join(output_dir, f"{sanitized_language}.json")
+
+        if os.path.exists(output_path):
+            existing_users = read_json_file(output_path)
+        else:
+            existing_users = []
+
+        boards[sanitized_language] = merge_and_sort_users(existing_users, users)
+        writer.write(output_path, boards[sanitized_language])
 
+    writer.flush()
+    print(f"Data for {len(language_data)} language(s) written to {output_dir}")
+    return boards
 
-def merge_and_sort_users(existing_users: List[Dict[str, str]], new_users: List[Dict[str, str]]) -> List[Dict[str, str]]:
+
+def language_changes(changeset: Dict[str, dict]) -> DefaultDict[str, Dict[str, Tuple[int, str]]]:
     """
-    Merge existing user data with new user data and sort by time in descending order.
+    Find the language entries that moved for the users of a changeset.
 
     Args:
-        existing_users (List[Dict[str, str]]): List of existing user data.
-        new_users (List[Dict[str, str]]): List of new user data.
+        changeset (Dict[str, dict]): Languages of the changed users before and after the update, by username.
 
     Returns:
-        List[Dict[str, str]]: Merged and sorted list of user data.
+        DefaultDict[str, Dict[str, Tuple[int, str]]]: A dictionary mapping the affected languages
+            to the new minutes and time string of their changed users, by username.
     """
-    user_dict = {user["username"]: user for user in existing_users}
+    changes: DefaultDict[str, Dict[str, Tuple[int, str]]] = defaultdict(dict)
 
-    for user in new_users:
-        user_dict[user["username"]] = user
+    for username in sorted(changeset):
+        before: DefaultDict[str, Dict[str, Tuple[int, str]]] = defaultdict(dict)
+        after: DefaultDict[str, Dict[str, Tuple[int, str]]] = defaultdict(dict)
+        add_user_languages(before, username, {"languages": changeset[username]["before"]})
+        add_user_languages(after, username, {"languages": changeset[username]["after"]})
 
-    return sorted(user_dict.values(), key=lambda x: time_to_minutes(x["time"]), reverse=True)
+        for language, users in after.items():
+            if before.get(language) != users:
+                changes[language][username] = users[username]
 
+    return changes
 
-def write_language_data(language_data: DefaultDict[str, List[Dict[str, str]]], output_dir: str) -> None:
+
+def insert_sorted_users(
+    existing_users: List[Dict[str, str]],
+    changed_users: Dict[str, Tuple[int, str]]
+) -> List[Dict[str, str]]:
     """
-    Write language-specific user data to JSON files in the specified directory.
+    Apply changed users to a leaderboard already sorted by time, with binary search inserts.
+
+    The result is the same as `merge_and_sort_users`: a changed user keeps its previous
+    position among the users with the same time, and new users come after them.
 
     Args:
-        language_data (DefaultDict[str, List[Dict[str, str]]]): Dictionary mapping languages to user data.
+        existing_users (List[Dict[str, str]]): Existing user data, sorted by time in descending order.
+        changed_users (Dict[str, Tuple[int, str]]): Minutes and time string of the changed users, by username.
+
+    Returns:
+        List[Dict[str, str]]: Updated and sorted list of user data.
+    """
+    positions = {user["username"]: index for index, user in enumerate(existing_users)}
+    new_usernames = [username for username in changed_users if username not in positions]
+    for offset, username in enumerate(new_usernames):
+        positions[username] = len(existing_users) + offset
+
+    def rank(user: Dict[str, str]) -> Tuple[int, int]:
+        return -time_to_minutes(user["time"]), positions[user["username"]]
+
+    sorted_users = [user for user in existing_users if user["username"] not in changed_users]
+    for username, (_, time) in changed_users.items():
+        bisect.insort(sorted_users, {"username": username, "time": time}, key=rank)
+
+    return sorted_users
+
+
+def update_language_data(
+    changes: DefaultDict[str, Dict[str, Tuple[int, str]]],
+    output_dir: str,
+    writer: BatchWriter = None
+) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Update only the language files affected by a changeset, instead of rebuilding every one.
+
+    Args:
+        changes (DefaultDict[str, Dict[str, Tuple[int, str]]]): Changed users by language, from `language_changes`.
         output_dir (str): Path to the directory where JSON files will be written.
+        writer (BatchWriter): Writer of the files (default is a new one).
+
+    Returns:
+        Dict[str, List[Dict[str, str]]]: Sorted users written for each updated language, by sanitized language name.
     """
-    for language, users in language_data.items():
+    writer = writer or BatchWriter()
+    boards = {}
+    for language, users in changes.items():
         sanitized_language = language.replace(" ", "_").replace("/", "_")
         output_path = os.path.join(output_dir, f"{sanitized_language}.json")
 
         if os.path.exists(output_path):
-            with open(output_path, "r") as lang_file:
-                existing_users = json.load(lang_file)
+            existing_users = read_json_file(output_path)
         else:
             existing_users = []
 
-        sorted_users = merge_and_sort_users(existing_users, users)
+        boards[sanitized_language] = insert_sorted_users(existing_users, users)
+        writer.write(output_path, boards[sanitized_language])
 
-        with open(output_path, "w") as lang_file:
-            json.dump(sorted_users, lang_file, indent=4)
+    writer.flush()
+    changed = sum(len(users) for users in changes.values())
+    print(f"Data for {len(changes)} language(s) updated in {output_dir} ({changed} user change(s))")
+    return boards
 
-        print(f"Data for language '{language}' written to {output_path}")
 
+def read_language_boards(
+    language_list: List[str],
+    output_dir: str,
+    boards: Dict[str, List[Dict[str, str]]] = None
+) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Read the language leaderboards from their JSON files, except those already in memory.
+
+    Args:
+        language_list (List[str]): Sanitized names of the languages.
+        output_dir (str): Path to the directory of the language JSON files.
+        boards (Dict[str, List[Dict[str, str]]]): Leaderboards already in memory, by sanitized language name.
 
-def write_language_list(language_data: DefaultDict[str, List[Dict[str, str]]], output_file: str) -> None:
+    Returns:
+        Dict[str, List[Dict[str, str]]]: Users of every language leaderboard, by sanitized language name.
+    """
+    boards = dict(boards or {})
+    for language in language_list:
+        output_path = os.path.join(output_dir, f"{language}.json")
+        if language not in boards and os.path.exists(output_path):
+            boards[language] = read_json_file(output_path)
+    return boards
+
+
+def write_language_list(
+    language_data: DefaultDict[str, Dict[str, Tuple[int, str]]],
+    output_file: str,
+    writer: BatchWriter = None
+) -> List[str]:
     """
     Write a JSON file containing the list of all languages ordered by their names.
     The language names are sanitized by replacing spaces and slashes with underscores.
 
     Args:
-        language_data (DefaultDict[str, List[Dict[str, str]]]): Dictionary mapping languages to user data.
+        language_data (DefaultDict[str, Dict[str, Tuple[int, str]]]): Dictionary mapping languages to user data.
         output_file (str): Path to the file where the JSON file will be written.
+        writer (BatchWriter): Writer of the file (default is a new one).
+
+    Returns:
+        List[str]: Sanitized names of the languages.
     """
+    writer = writer or BatchWriter()
     language_list = sorted(
         [language.replace(" ", "_").replace("/", "_") for language in language_data.keys()]
     )
 
-    with open(output_file, "w") as lang_list_file:
-        json.dump(language_list, lang_list_file, indent=4)
-
+    writer.write(output_file, language_list)
+    writer.flush()
     print(f"Language list written to {output_file}")
+    return language_list
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Generate the language leaderboards from the user data.")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="rebuild every language file instead of applying the pending changeset",
+    )
+    parser.add_argument("--profile", metavar="FILE", help="save cProfile statistics of the run to FILE")
+    return parser.parse_args()
 
 
 def main() -> None:
     """
     Main function to process user data and generate language-specific data files.
+    Only the languages touched by the pending changeset are rewritten, unless --full is given.
     """
+    args = parse_args()
     user_data_dir: str = "data/users"
     language_data_dir: str = "data/languages"
     language_data_list: str = "data/languages.json"
-
-    create_directory(language_data_dir)
-    language_data = load_user_data(user_data_dir)
-    write_language_data(language_data, language_data_dir)
-    write_language_list(language_data, language_data_list)
+    changeset_file: str = "state/changeset.json"
+    user_store_file: str = "state/users.sqlite"
+    pages_dir: str = "data/pages"
+    report_file: str = "state/run_report.json"
+
+    with instrumented_run("generate_language_data", report_file, args.profile):
+        create_directory(language_data_dir)
+        with metrics.stage("read users"):
+            language_data = load_user_data(open_user_store(user_store_file, user_data_dir))
+        writer = BatchWriter()
+        with metrics.stage("language leaderboards"):
+            if args.full:
+                boards = write_language_data(language_data, language_data_dir, writer)
+            else:
+                changes = language_changes(load_changeset(changeset_file))
+                boards = update_language_data(changes, language_data_dir, writer)
+            language_list = write_language_list(language_data, language_data_list, writer)
+        with metrics.stage("pages"):
+            export_board_pages(
+                {f"languages/{language}": users for language, users in boards.items()},
+                pages_dir,
+                language_list,
+                language_data_dir,
+                writer,
+            )
+        print(writer.report())
+        save_changeset(changeset_file, {})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,262 @@
+import argparse
+from collections import defaultdict
+from typing import Dict, Iterable, List, DefaultDict, Tuple
+
+from batch_writer import BatchWriter
+from board_pages import export_board_pages
+from changeset import load_changeset, save_changeset
+from generate_language_data import (
+    add_user_languages,
+    create_directory,
+    language_changes,
+    read_language_boards,
+    update_language_data,
+    write_language_data,
+    write_language_list,
+)
+from generate_global_leaderboard import add_user_elo, write_global_leaderboard
+from language_matrix import LanguageMatrix, load_language_groups, write_matrix_boards
+from leaderboard_stats import write_stats
+from run_metrics import instrumented_run, metrics
+from streaming_boards import stream_leaderboards, stream_top_boards
+from streaming_sort import RUN_SIZE
+from user_index import write_user_index
+from user_records import iter_user_records
+from user_store import UserStore, open_user_store
+
+
+def aggregate_user_data(
+    records: Iterable[Tuple[str, dict]]
+) -> Tuple[DefaultDict[str, Dict[str, Tuple[int, str]]], List[Dict[str, str]]]:
+    """
+    Build the language data and the global leaderboard users in a single pass over the users.
+
+    Args:
+        records (Iterable[Tuple[str, dict]]): Username and user data of every user.
+
+    Returns:
+        Tuple[DefaultDict[str, Dict[str, Tuple[int, str]]], List[Dict[str, str]]]:
+            Minutes and time string of the users by language, and the list of users with their elo.
+    """
+    language_data: DefaultDict[str, Dict[str, Tuple[int, str]]] = defaultdict(dict)
+    users: List[Dict[str, str]] = []
+
+    for username, user_data in records:
+        add_user_languages(language_data, username, user_data)
+        add_user_elo(users, username, user_data)
+
+    return language_data, users
+
+
+def generate_leaderboards(
+    records: Iterable[Tuple[str, dict]],
+    language_data_dir: str,
+    language_data_list: str,
+    global_leaderboard_file: str,
+    changeset: Dict[str, dict] = None,
+    pages_dir: str = None,
+    stats_file: str = None,
+    language_stats_file: str = None,
+    search_dir: str = None,
+    matrix_file: str = None,
+    language_groups_file: str = None,
+    rollup_dir: str = None,
+    polyglot_dir: str = None,
+    aggregates: Tuple[Dict[str, Dict[str, Tuple[int, str]]], List[Dict[str, str]]] = None
+) -> None:
+    """
+    Generate the language leaderboards, the language list and the global leaderboard.
+
+    Args:
+        records (Iterable[Tuple[str, dict]]): Username and user data of every user.
+        language_data_dir (str): Path to the directory of the language JSON files.
+        language_data_list (str): Path to the JSON file listing the languages.
+        global_leaderboard_file (str): Path to the global leaderboard JSON file.
+        changeset (Dict[str, dict]): If given, only the language files affected by these changes
+            are updated, otherwise every language file is rebuilt.
+        pages_dir (str): If given, path to the directory where the paginated leaderboards are also written.
+        stats_file (str): If given, path to the JSON file where the Elo distribution is written.
+        language_stats_file (str): Path to the JSON file where the language summaries are written with the stats.
+        search_dir (str): If given, path to the directory where the username search index is written.
+        matrix_file (str): If given, path to the JSON file where the user x language matrix is written.
+        language_groups_file (str): Path to the JSON file of the language groups, with the group leaderboards.
+        rollup_dir (str): If given, path to the directory where the leaderboard of every language group is written.
+        polyglot_dir (str): Path to the directory where the language count and diversity rankings are written,
+            with the group leaderboards.
+        aggregates (Tuple[Dict[str, Dict[str, Tuple[int, str]]], List[Dict[str, str]]]): If given, the language
+            data and users already aggregated, e.g. merged from the shards of a run, and `records` is not read.
+    """
+    if aggregates is None:
+        with metrics.stage("read users"):
+            aggregates = aggregate_user_data(records)
+    language_data, users = aggregates
+
+    create_directory(language_data_dir)
+    writer = BatchWriter()
+    with metrics.stage("language leaderboards"):
+        if changeset is None:
+            language_boards = write_language_data(language_data, language_data_dir, writer)
+        else:
+            language_boards = update_language_data(language_changes(changeset), language_data_dir, writer)
+        language_list = write_language_list(language_data, language_data_list, writer)
+    with metrics.stage("global leaderboard"):
+        sorted_users = write_global_leaderboard(users, global_leaderboard_file, writer)
+    if stats_file:
+        with metrics.stage("statistics"):
+            write_stats(users, language_data, stats_file, language_stats_file, writer)
+    if matrix_file or rollup_dir:
+        with metrics.stage("language matrix"):
+            matrix = LanguageMatrix.from_language_data(language_data)
+            if matrix_file:
+                writer.write(matrix_file, matrix.to_json(), compact=True)
+            if rollup_dir:
+                groups = load_language_groups(language_groups_file)
+                write_matrix_boards(matrix, groups, rollup_dir, polyglot_dir, writer)
+    if search_dir:
+        with metrics.stage("search index"):
+            all_language_boards = read_language_boards(language_list, language_data_dir, language_boards)
+            write_user_index(language_data, users, search_dir, all_language_boards, writer)
+
+    if pages_dir:
+        with metrics.stage("pages"):
+            boards = {f"languages/{language}": rows for language, rows in language_boards.items()}
+            boards["global"] = sorted_users
+            export_board_pages(boards, pages_dir, language_list, language_data_dir, writer)
+    print(writer.report())
+
+
+def run(
+    records: Dict[str, dict] = None,
+    full: bool = False,
+    store: UserStore = None,
+    aggregates: Tuple[Dict[str, Dict[str, Tuple[int, str]]], List[Dict[str, str]]] = None
+) -> None:
+    """
+    Generate every leaderboard from the user data, applying the pending changeset.
+
+    Args:
+        records (Dict[str, dict]): User data already in memory, by username; the other users are read from the store.
+        full (bool): Rebuild every language file instead of applying the pending changeset.
+        store (UserStore): Store of the user records (default is the one of the repository).
+        aggregates (Tuple[Dict[str, Dict[str, Tuple[int, str]]], List[Dict[str, str]]]): If given, the language
+            data and users already aggregated, instead of reading the users.
+    """
+    user_data_dir: str = "data/users"
+    language_data_dir: str = "data/languages"
+    language_data_list: str = "data/languages.json"
+    global_leaderboard_file: str = "data/global_leaderboard.json"
+    pages_dir: str = "data/pages"
+    stats_file: str = "data/stats.json"
+    language_stats_file: str = "data/language_stats.json"
+    search_dir: str = "data/search"
+    matrix_file: str = "state/language_matrix.json"
+    language_groups_file: str = "data/language_groups.json"
+    rollup_dir: str = "data/rollups"
+    polyglot_dir: str = "data/polyglots"
+    changeset_file: str = "state/changeset.json"
+    user_store_file: str = "state/users.sqlite"
+
+    user_records = None
+    if aggregates is None:
+        store = store or open_user_store(user_store_file, user_data_dir)
+        user_records = iter_user_records(store, records)
+    generate_leaderboards(
+        user_records,
+        language_data_dir,
+        language_data_list,
+        global_leaderboard_file,
+        None if full else load_changeset(changeset_file),
+        pages_dir,
+        stats_file,
+        language_stats_file,
+        search_dir,
+        matrix_file,
+        language_groups_file,
+        rollup_dir,
+        polyglot_dir,
+        aggregates,
+    )
+    save_changeset(changeset_file, {})
+
+
+def run_streaming(top: int = None, run_size: int = RUN_SIZE, spill_dir: str = None, store: UserStore = None) -> None:
+    """
+    Rebuild the language and global leaderboards and their pages from the user store in
+    memory that does not grow with the number of users (see `stream_leaderboards`).
+
+    The statistics, the search index and the language matrix need every user in memory
+    and are not written.
+
+    Args:
+        top (int): If given, only the top rows of every board are written, to "data/top", and the
+            complete boards, their pages and the pending changeset are left as they are.
+        run_size (int): Entries held in memory by each sort before they are spilled to disk.
+        spill_dir (str): Directory of the spilled runs (default is the system temporary directory).
+        store (UserStore): Store of the user records (default is the one of the repository).
+    """
+    user_data_dir: str = "data/users"
+    language_data_dir: str = "data/languages"
+    language_data_list: str = "data/languages.json"
+    global_leaderboard_file: str = "data/global_leaderboard.json"
+    pages_dir: str = "data/pages"
+    top_dir: str = "data/top"
+    changeset_file: str = "state/changeset.json"
+    user_store_file: str = "state/users.sqlite"
+
+    store = store or open_user_store(user_store_file, user_data_dir)
+    if top:
+        stream_top_boards(store.stream_records(), language_data_dir, top, top_dir, run_size, spill_dir)
+        return
+    stream_leaderboards(
+        store.stream_records(),
+        language_data_dir,
+        language_data_list,
+        global_leaderboard_file,
+        pages_dir,
+        run_size,
+        spill_dir,
+    )
+    save_changeset(changeset_file, {})
+
+
+def main() -> None:
+    """
+    Main function to generate every leaderboard from the user files.
+    """
+    parser = argparse.ArgumentParser(description="Generate the language and global leaderboards.")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="rebuild every language file instead of applying the pending changeset",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="rebuild the language and global leaderboards in bounded memory, spilling sorted runs to disk",
+    )
+    parser.add_argument(
+        "--top",
+        metavar="K",
+        type=int,
+        help="with --streaming, write only the top K rows of every board to data/top, with a heap per board",
+    )
+    parser.add_argument(
+        "--run-size",
+        type=int,
+        default=RUN_SIZE,
+        help=f"with --streaming, entries held in memory by each sort before a spill to disk (default: {RUN_SIZE})",
+    )
+    parser.add_argument("--spill-dir", help="with --streaming, directory of the spilled runs (default: system temp)")
+    parser.add_argument("--profile", metavar="FILE", help="save cProfile statistics of the run to FILE")
+    args = parser.parse_args()
+    report_file: str = "state/run_report.json"
+
+    with instrumented_run("generate_leaderboards", report_file, args.profile):
+        if args.streaming:
+            run_streaming(args.top, args.run_size, args.spill_dir)
+        else:
+            run(full=args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,42 @@
 import os
-import json
 import requests
-from bs4 import BeautifulSoup
-import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import shutil
 import math
+import time
+from elo_engine import DEFAULT_RULES, record_snapshot, save_snapshot
+from history_store import HistoryStore
+from fetch_scheduler import FetchError, FetchScheduler, RetryQueue, TokenBucket, create_session
+from batch_writer import BatchWriter, read_json_file
+from http_cache import ResponseCache
+from refresh_schedule import RefreshSchedule
+from sharding import (
+    CACHE_FILE,
+    PARTIAL_FILE,
+    RETRY_QUEUE_FILE,
+    SCHEDULE_FILE,
+    STORE_FILE,
+    load_partials,
+    merge_aggregates,
+    merge_shard_state,
+    parse_shard,
+    prepare_shard,
+    shard_dir,
+    shard_of,
+    write_partial,
+)
+from run_journal import RunJournal, result_hash
+from time_codec import minutes_to_time, time_to_minutes, times_to_minutes
+from user_store import UserStore, open_user_store
+from changeset import load_changeset, merge_changesets, record_change, save_changeset
+import generate_leaderboards
+from svg_parser import parse_language_data
+from run_metrics import instrumented_run, metrics
+
+
+# Users processed between two commits of the store and of the run journal.
+CHECKPOINT_USERS = 100
 
 
 def load_users(file_path: str) -> list:
@@ -16,8 +49,7 @@ def load_users(file_path: str) -> list:
     Returns:
         list: List of usernames.
     """
-    with open(file_path, "r") as json_file:
-        return json.load(json_file)
+    return read_json_file(file_path)
 
 
 def create_output_directory(directory: str) -> None:
@@ -30,85 +62,36 @@ def create_output_directory(directory: str) -> None:
     os.makedirs(directory, exist_ok=True)
 
 
-def fetch_user_data(username: str, base_url: str) -> str:
+def fetch_user_response(
+    username: str,
+    base_url: str,
+    session: requests.Session = None,
+    timeout: float = 30.0,
+    headers: dict = None
+) -> requests.Response:
     """
-    Fetch WakaTime data for a given user.
+    Send the WakaTime card request for a given user.
 
     Args:
         username (str): GitHub username.
         base_url (str): Base URL for the API requests.
+        session (requests.Session): Session to reuse connections from (default is a one-off request).
+        timeout (float): Connect and read timeout in seconds.
+        headers (dict): Extra request headers, e.g. the conditional ones of the response cache.
 
     Returns:
-        str: SVG content of the response.
+        requests.Response: Successful (2xx) or 304 Not Modified response.
     """
     url = f"{base_url}?username={username}&layout=compact"
-    response = requests.get(url)
+    start = time.perf_counter()
+    try:
+        response = (session or requests).get(url, headers=headers, timeout=timeout)
+    finally:
+        metrics.observe("fetch_seconds", time.perf_counter() - start)
+    metrics.count(f"responses_{response.status_code}")
+    metrics.count("response_bytes", len(response.content))
     response.raise_for_status()
-    return response.content
-
-
-def parse_language_data(svg_content: str) -> list:
-    """
-    Parse SVG content to extract language information.
-
-    Args:
-        svg_content (str): SVG content to parse.
-
-    Returns:
-        list: List of languages and time spent.
-    """
-    soup = BeautifulSoup(svg_content, "html.parser")
-    lang_data = []
-
-    for g in soup.find_all("g", {"transform": True}):
-        text = g.find("text", {"data-testid": "lang-name"})
-        if text:
-            lang_info = text.get_text(strip=True)
-            lang_name, time = lang_info.split(" - ")
-            lang_data.append({"language": lang_name, "time": time})
-
-    return lang_data
-
-
-def time_to_minutes(time_str: str) -> int:
-    """
-    Convert a time string into minutes.
-
-    Args:
-        time_str (str): Time string (e.g., "2 hrs 30 mins").
-
-    Returns:
-        int: Time in minutes.
-    """
-    parts = time_str.split()
-    total_minutes = 0
-    for i in range(0, len(parts), 2):
-        value = int(parts[i].replace(",", ""))
-        unit = parts[i + 1]
-        if "hr" in unit:
-            total_minutes += value * 60
-        elif "min" in unit:
-            total_minutes += value
-    return total_minutes
-
-
-def minutes_to_time(minutes: int) -> str:
-    """
-    Convert total minutes into a formatted time string.
-
-    Args:
-        minutes (int): Total time in minutes.
-
-    Returns:
-        str: Formatted time string (e.g., "2 hrs 30 mins").
-    """
-    hours, mins = divmod(minutes, 60)
-    if hours > 0 and mins > 0:
-        return f"{hours:,} hrs {mins} mins"
-    elif hours > 0:
-        return f"{hours:,} hrs"
-    else:
-        return f"{mins} mins"
+    return response
 
 
 def calculate_total_time(lang_data: list) -> str:
@@ -121,7 +104,7 @@ def calculate_total_time(lang_data: list) -> str:
     Returns:
         str: Total time as a formatted string.
     """
-    total_minutes = sum(time_to_minutes(entry["time"]) for entry in lang_data)
+    total_minutes = sum(times_to_minutes(entry["time"] for entry in lang_data))
     return minutes_to_time(total_minutes)
 
 
@@ -160,32 +143,6 @@ def merge_language_data(existing_data: list, new_data: list) -> list:
     return sorted(lang_dict.values(), key=lambda x: x["language"])
 
 
-def save_user_data(output_path: str, data: dict) -> None:
-    """
-    Save user data to a JSON file.
-
-    Args:
-        output_path (str): Path to the output file.
-        data (dict): Data to save.
-    """
-    with open(output_path, "w") as output_file:
-        json.dump(data, output_file, indent=4)
-
-
-def reduce_elo(previous_elo: int, reduction: int = 2) -> int:
-    """
-    Reduce the elo by a specified amount, ensuring it does not go below 0.
-
-    Args:
-        previous_elo (int): The previous elo value in minutes.
-        reduction (int): The amount to reduce the elo by (default is 2 hours).
-
-    Returns:
-        int: The reduced elo value, with a minimum of 0.
-    """
-    return max(0, previous_elo - reduction)
-
-
 def calculate_new_elo(
     previous_elo: int,
     previous_total_time: int,
@@ -195,7 +152,7 @@ def calculate_new_elo(
     existing_languages: list
 ) -> int:
     """
-    Calculate the new ELO score for a user.
+    Calculate the new ELO score for a user, with the rules of the batch elo engine.
 
     Args:
         previous_elo (int): The previous ELO score.
@@ -208,110 +165,780 @@ def calculate_new_elo(
     Returns:
         int: The new ELO score.
     """
-    final_elo = previous_elo
+    new_total_time = math.ceil(time_to_minutes(total_time) / 60)
+    changed = filtered_data != existing_languages
+    return int(DEFAULT_RULES.apply(previous_elo, previous_total_time, new_total_time, updated, changed))
+
+
+def update_user(
+    username: str,
+    svg_content: str,
+    store: UserStore,
+    changeset: dict = None,
+    snapshot: dict = None
+) -> dict:
+    """
+    Merge freshly fetched WakaTime data into the user's record and update the ELO score.
 
-    if not updated and filtered_data == existing_languages:
-        final_elo = reduce_elo(previous_elo)
-    elif filtered_data != existing_languages:
-        new_total_time = math.ceil(time_to_minutes(total_time) / 60)
-        diff = max(0, new_total_time - previous_total_time)
-        final_elo = previous_elo + diff
+    This function compares the fetched data with the existing data, calculates the
+    total time spent, and updates the ELO score. If the data has not changed, the
+    ELO is reduced by a fixed amount.
 
-    return final_elo
+    Args:
+        username (str): GitHub username.
+        svg_content (str): SVG content returned by the API.
+        store (UserStore): Store the user record is read from and written to.
+        changeset (dict): If given, the languages before and after the update are recorded in it.
+        snapshot (dict): If given, the inputs of the elo rules are recorded in it.
+
+    Returns:
+        dict: User data written to the store.
+    """
+    lang_data = parse_language_data(svg_content)
+
+    existing_data = store.get(username)
+    if existing_data is not None:
+        existing_languages = existing_data.get("languages", [])
+        str_previous_total_time = existing_data.get("total_time", "0 mins")
+        previous_elo = existing_data.get("elo", 0)
+        updated = existing_data.get("updated", True)
+    else:
+        existing_languages = []
+        str_previous_total_time = "0 mins"
+        previous_elo = 0
+        updated = True
+
+    previous_total_time = math.ceil(time_to_minutes(str_previous_total_time) / 60)
+
+    merged_data = merge_language_data(existing_languages, lang_data)
+    filtered_data = filter_languages(merged_data)
+    total_time = calculate_total_time(filtered_data)
+
+    final_elo = calculate_new_elo(
+        previous_elo,
+        previous_total_time,
+        total_time,
+        updated,
+        filtered_data,
+        existing_languages,
+    )
+
+    user_data = {
+        "total_time": total_time,
+        "updated": (filtered_data != existing_languages),
+        "elo": final_elo,
+        "languages": filtered_data,
+    }
+
+    store.put(username, user_data)
+    if changeset is not None:
+        record_change(changeset, username, existing_languages, filtered_data)
+    if snapshot is not None:
+        record_snapshot(
+            snapshot,
+            username,
+            previous_elo,
+            time_to_minutes(str_previous_total_time),
+            time_to_minutes(total_time),
+            updated,
+            user_data["updated"],
+        )
+    print(f"Data for {username} updated")
+    return user_data
 
 
-def process_user(username: str, base_url: str, output_dir: str) -> None:
+def update_unchanged_user(username: str, store: UserStore, snapshot: dict = None) -> dict:
     """
-    Process a single user to fetch and save their WakaTime data.
+    Update a user whose card is identical to the one already merged, without parsing it.
 
-    This function fetches the user's WakaTime data, compares it with existing data,
-    calculates the total time spent, and updates the ELO score. If the data has not
-    changed, the ELO is reduced by a fixed amount.
+    This is the result `update_user` gives for unchanged data: the languages stay the
+    same, and the ELO is reduced if the previous run did not see any change either.
 
     Args:
         username (str): GitHub username.
-        base_url (str): Base URL for the API requests.
-        output_dir (str): Output directory for JSON files.
+        store (UserStore): Store holding the user record.
+        snapshot (dict): If given, the inputs of the elo rules are recorded in it.
+
+    Returns:
+        dict: User data written to the store.
     """
-    try:
-        svg_content = fetch_user_data(username, base_url)
-        lang_data = parse_language_data(svg_content)
-
-        output_path = os.path.join(output_dir, f"{username}.json")
-        if os.path.exists(output_path):
-            with open(output_path, "r") as existing_file:
-                existing_data = json.load(existing_file)
-                existing_languages = existing_data.get("languages", [])
-                str_previous_total_time = existing_data.get("total_time", "0 mins")
-                previous_elo = existing_data.get("elo", 0)
-                updated = existing_data.get("updated", True)
-        else:
-            existing_languages = []
-            str_previous_total_time = "0 mins"
-            previous_elo = 0
-            updated = True
+    existing_data = store.get(username)
+    existing_languages = existing_data.get("languages", [])
+    final_elo = calculate_new_elo(
+        existing_data.get("elo", 0),
+        0,
+        "0 mins",
+        existing_data.get("updated", True),
+        existing_languages,
+        existing_languages,
+    )
+
+    user_data = {
+        "total_time": calculate_total_time(existing_languages),
+        "updated": False,
+        "elo": final_elo,
+        "languages": existing_languages,
+    }
+
+    store.put(username, user_data)
+    if snapshot is not None:
+        total_minutes = time_to_minutes(user_data["total_time"])
+        record_snapshot(
+            snapshot,
+            username,
+            existing_data.get("elo", 0),
+            time_to_minutes(existing_data.get("total_time", "0 mins")),
+            total_minutes,
+            existing_data.get("updated", True),
+            False,
+        )
+    print(f"Data for {username} unchanged")
+    return user_data
 
-        previous_total_time = math.ceil(time_to_minutes(str_previous_total_time) / 60)
 
-        merged_data = merge_language_data(existing_languages, lang_data)
-        filtered_data = filter_languages(merged_data)
-        total_time = calculate_total_time(filtered_data)
+def update_skipped_users(
+    usernames: list,
+    store: UserStore,
+    snapshot: dict = None,
+    journal: RunJournal = None
+) -> list:
+    """
+    Update the users not fetched at this run as if their card had not changed.
 
-        final_elo = calculate_new_elo(
-            previous_elo,
-            previous_total_time,
-            total_time,
-            updated,
-            filtered_data,
-            existing_languages,
-        )
+    The elo of each user decays from its current elo and "updated" flag in the store, with
+    the rules of the batch elo engine, so that elos written by `elo_engine.py --write` and
+    flags set by `reset_updated.py` are kept. The store holds the state of every user after
+    the previous run, and a resumed run does not update its journaled users again, so each
+    user is decayed once per run, as if it had been fetched unchanged at every run.
+
+    Args:
+        usernames (list): Usernames of the users skipped.
+        store (UserStore): Store of the user records.
+        snapshot (dict): If given, the inputs of the elo rules are recorded in it.
+        journal (RunJournal): If given, the users are journaled as done with.
 
-        user_data = {
-            "total_time": total_time,
-            "updated": (filtered_data != existing_languages),
-            "elo": final_elo,
-            "languages": filtered_data,
-        }
+    Returns:
+        list: Usernames whose elo or "updated" flag changed.
+    """
+    states = store.elo_states()
+    usernames = [username for username in usernames if username in states]
+    if not usernames:
+        return []
+    previous_elo, _, previous_updated = zip(*map(states.__getitem__, usernames))
+    elos = DEFAULT_RULES.decay_runs(previous_elo, previous_updated, [1] * len(usernames)).tolist()
+
+    changed = {}
+    journaled = []
+    for username, elo in zip(usernames, elos):
+        previous_elo, total_minutes, updated = states[username]
+        if snapshot is not None:
+            record_snapshot(snapshot, username, previous_elo, total_minutes, total_minutes, updated, False)
+        if elo != previous_elo or updated:
+            changed[username] = elo
+        if journal is not None:
+            result = {"skipped": True, "snapshot": snapshot.get(username) if snapshot is not None else None}
+            journaled.append((username, {"elo": elo, "updated": False}, result))
+    store.set_unchanged(changed)
+    if journal is not None:
+        journal.record_many(journaled)
+    return sorted(changed)
+
+
+def restore_finished_users(
+    finished: dict,
+    store: UserStore,
+    records: dict = None,
+    changeset: dict = None,
+    snapshot: dict = None,
+    schedule: RefreshSchedule = None
+) -> list:
+    """
+    Take back the results of the users a resumed run was done with before it stopped.
 
-        save_user_data(output_path, user_data)
-        print(f"Data for {username} written to {output_path}")
-    except Exception as e:
-        print(f"Failed to process {username}: {e}")
+    Their records are already in the store; the run only gets back what it keeps in
+    memory until its end, from the journal, and checks the records against the hashes
+    journaled with them.
 
+    Args:
+        finished (dict): Hash and result of each user the run was done with, by username.
+        store (UserStore): Store of the user records.
+        records (dict): If given, filled with the user data of the users.
+        changeset (dict): If given, filled with the journaled changes of the users.
+        snapshot (dict): If given, filled with the journaled inputs of the elo rules.
+        schedule (RefreshSchedule): If given, the users that were fetched are recorded in it.
 
-def process_users(usernames: list, base_url: str, output_dir: str) -> None:
+    Returns:
+        list: Usernames of the users, ordered by username.
+    """
+    mismatches = 0
+    for username, result in sorted(finished.items()):
+        user_data = store.get(username)
+        if result.get("skipped"):
+            written = {"elo": user_data["elo"], "updated": user_data["updated"]}
+        else:
+            written = user_data
+            if schedule is not None:
+                schedule.record(username, user_data)
+        if result_hash(written) != result["hash"]:
+            mismatches += 1
+            print(f"Record of {username} changed since it was journaled")
+        if records is not None:
+            records[username] = user_data
+        if changeset is not None and result.get("change"):
+            changeset[username] = result["change"]
+        if snapshot is not None and result.get("snapshot"):
+            snapshot[username] = result["snapshot"]
+    metrics.count("resumed_users", len(finished))
+    metrics.count("journal_mismatches", mismatches)
+    return sorted(finished)
+
+
+def process_users(
+    usernames: list,
+    base_url: str,
+    output_dir: str,
+    workers: int = 8,
+    timeout: float = 30.0,
+    rate: float = 10.0,
+    retry_queue_file: str = None,
+    cache_file: str = None,
+    cache_size: int = 10000,
+    records: dict = None,
+    changeset: dict = None,
+    store: UserStore = None,
+    snapshot: dict = None,
+    schedule: RefreshSchedule = None,
+    refresh_all: bool = False,
+    journal: RunJournal = None
+) -> dict:
     """
     Process multiple users to fetch and save their WakaTime data.
 
-    This function iterates over a list of usernames, fetching and processing
-    their WakaTime data individually.
+    Up to `workers` requests are in flight at once over a single pooled session,
+    while the responses are parsed and written back in the order of `usernames`,
+    so the output does not depend on which request finishes first.
+
+    Requests go through a rate limited scheduler that retries 429, 5xx and network
+    errors with backoff. Users still failing after that get a second pass at the end
+    of the run, and those failing again are saved in the retry queue, to be fetched
+    first by the next run.
+
+    Records are read from and written to the store, then the written users are
+    exported to their JSON files in `output_dir`.
+
+    Users already stored are fetched with conditional requests: when the card is
+    identical to the last one merged, it is not parsed and the user takes the
+    unchanged path of `update_unchanged_user`.
+
+    With a refresh schedule, only the users due at this run are fetched, the others
+    being updated by `update_skipped_users`; users in the retry queue are always fetched.
+
+    With a run journal, the store is committed every `CHECKPOINT_USERS` users along with
+    the journal of the users done with. When the journal holds a run that did not
+    complete, that run is resumed: its users already done with are not processed again.
+    A run older than a day (`run_journal.RUN_MAX_AGE`) is finished instead, and a new run started.
 
     Args:
         usernames (list): List of Wakatime usernames.
         base_url (str): Base URL for the API requests.
         output_dir (str): Output directory for JSON files.
+        workers (int): Maximum number of concurrent requests.
+        timeout (float): Connect and read timeout in seconds for each request.
+        rate (float): Maximum number of requests per second.
+        retry_queue_file (str): JSON file of the retry queue carried between runs (default is no queue).
+        cache_file (str): JSON file of the response cache (default is an empty in-memory cache).
+        cache_size (int): Maximum number of users kept in the response cache.
+        records (dict): If given, filled with the user data written for each user, by username.
+        changeset (dict): If given, filled with the languages of the changed users before and after the update.
+        store (UserStore): Store of the user records (default is a temporary store loaded from `output_dir`).
+        snapshot (dict): If given, filled with the inputs of the elo rules of each user, to replay the run.
+        schedule (RefreshSchedule): If given, the fetches are recorded in it, and it picks the users to fetch.
+        refresh_all (bool): With a schedule, fetch every user anyway.
+        journal (RunJournal): If given, the users done with are journaled, and an interrupted run is resumed.
+
+    Returns:
+        dict: Number of fetches that succeeded, were retried and were given up on.
+    """
+    store = store or open_user_store(":memory:", output_dir)
+    known_usernames = store.usernames()
+    written = []
+    retry_queue = RetryQueue(retry_queue_file)
+    cache = ResponseCache(cache_file, cache_size)
+    finished = {}
+    if journal is not None:
+        stale_run = journal.run_id
+        stale = journal.end_stale_run()
+        if stale:
+            # Their records are already in the store: keep their changes for the leaderboards
+            # and export them, but process them again as part of the new run.
+            print(f"Run {stale_run} is too old to be resumed: {len(stale)} user(s) it was done with are exported")
+            for username, result in sorted(stale.items()):
+                if changeset is not None and result.get("change"):
+                    changeset[username] = result["change"]
+            written += sorted(stale)
+            metrics.count("stale_users", len(stale))
+        finished = journal.begin(schedule.run + 1 if schedule is not None else None)
+    if schedule is not None:
+        run = schedule.start_run(journal.sequence if journal is not None else None)
+    if finished:
+        print(f"Resuming run {journal.run_id}: {len(finished)} user(s) already done with")
+        written += restore_finished_users(finished, store, records, changeset, snapshot, schedule)
+
+    queued = [username for username in retry_queue.usernames() if username not in finished]
+    usernames = [username for username in usernames if username not in retry_queue.entries and username not in finished]
+    skipped = []
+    if schedule is not None:
+        if not refresh_all:
+            elos = {username: state[0] for username, state in store.elo_states().items()}
+            ranks = {username: rank for rank, username in enumerate(sorted(elos, key=elos.get, reverse=True))}
+            usernames, skipped, tiers = schedule.plan(usernames, ranks)
+            for tier, count in tiers.items():
+                metrics.count(f"tier_{tier}", count)
+            print(
+                f"Run {run}: fetching {len(queued) + len(usernames)} user(s), skipping {len(skipped)} "
+                f"({', '.join(f'{count} {tier}' for tier, count in tiers.items())})"
+            )
+    usernames = queued + usernames
+
+    with metrics.stage("fetch and update"), create_session(workers) as session:
+        def fetch_response(username: str) -> requests.Response:
+            headers = cache.conditional_headers(username) if username in known_usernames else None
+            return fetch_user_response(username, base_url, session, timeout, headers)
+
+        scheduler = FetchScheduler(fetch_response, TokenBucket(rate, workers))
+
+        def fetch(username: str) -> tuple:
+            try:
+                return scheduler.fetch(username), None
+            except Exception as e:
+                return None, e
+
+        def run_pass(pass_usernames: list) -> list:
+            failed = []
+            done = 0
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for username, (response, error) in zip(pass_usernames, executor.map(fetch, pass_usernames)):
+                    if error is not None:
+                        if isinstance(error, FetchError) and error.retryable:
+                            failed.append((username, error))
+                        else:
+                            scheduler.count("given_up")
+                            metrics.failure(username, error)
+                            print(f"Failed to process {username}: {error}")
+                        continue
+                    retry_queue.discard(username)
+                    try:
+                        if cache.is_unchanged(username, response):
+                            user_data = update_unchanged_user(username, store, snapshot)
+                        else:
+                            user_data = update_user(username, response.content, store, changeset, snapshot)
+                        cache.store(username, response)
+                        written.append(username)
+                        if schedule is not None:
+                            schedule.record(username, user_data)
+                        if journal is not None:
+                            journal.record(username, user_data, {
+                                "change": changeset.get(username) if changeset is not None else None,
+                                "snapshot": snapshot.get(username) if snapshot is not None else None,
+                            })
+                            done += 1
+                            if done % CHECKPOINT_USERS == 0:
+                                store.commit()
+                        if records is not None:
+                            records[username] = user_data
+                    except Exception as e:
+                        metrics.failure(username, e)
+                        print(f"Failed to process {username}: {e}")
+            store.commit()
+            return failed
+
+        failed = run_pass(usernames)
+        if failed:
+            print(f"Retrying {len(failed)} user(s) that failed with a transient error")
+            for _ in failed:
+                scheduler.count("retried")
+            failed = run_pass([username for username, _ in failed])
+
+        for username, error in failed:
+            scheduler.count("given_up")
+            retry_queue.add(username, str(error))
+            metrics.failure(username, error)
+            print(f"Failed to process {username}: {error}")
+
+    if skipped:
+        with metrics.stage("update skipped"):
+            decayed = update_skipped_users(skipped, store, snapshot, journal)
+            store.commit()
+            written += decayed
+            metrics.count("skipped_users", len(skipped))
+            print(f"Skipped {len(skipped)} user(s), {len(decayed)} of them decayed")
+
+    with metrics.stage("export"):
+        written = list(dict.fromkeys(written))
+        writer = BatchWriter()
+        store.export_json(output_dir, written, writer)
+        print(f"Exported {len(written)} users to {output_dir}")
+        print(writer.report())
+        retry_queue.save()
+        cache.save()
+        if schedule is not None:
+            schedule.save()
+    print(scheduler.report())
+    print(cache.report())
+    for outcome, count in scheduler.stats.items():
+        metrics.count(f"fetches_{outcome}", count)
+    metrics.count("cache_hits", cache.hits)
+    metrics.count("cache_misses", cache.misses)
+    return dict(scheduler.stats)
+
+
+def run_shard(
+    index: int,
+    count: int,
+    usernames: list,
+    base_url: str,
+    output_dir: str,
+    shards_dir: str,
+    user_store_file: str,
+    retry_queue_file: str,
+    cache_file: str,
+    cache_size: int,
+    schedule_file: str,
+    workers: int = 8,
+    timeout: float = 30.0,
+    rate: float = 10.0,
+    refresh_all: bool = False
+) -> None:
+    """
+    Process the users of one shard of the run, in a working directory of its own (see `prepare_shard`).
+
+    The shard is a regular run over its users, journaled in its copy of the store so that it
+    resumes when interrupted. Once done, it writes its partial output for `merge_shards`;
+    a shard already done is not run again.
+
+    Args:
+        index (int): Index of the shard, from 1.
+        count (int): Number of shards.
+        usernames (list): List of Wakatime usernames of every shard.
+        base_url (str): Base URL for the API requests.
+        output_dir (str): Output directory for JSON files.
+        shards_dir (str): Path to the directory of the shards.
+        user_store_file (str): Path to the SQLite database of the user store.
+        retry_queue_file (str): JSON file of the retry queue.
+        cache_file (str): JSON file of the response cache.
+        cache_size (int): Maximum number of users kept in the response cache.
+        schedule_file (str): JSON file of the refresh schedule.
+        workers (int): Maximum number of concurrent requests of the shard.
+        timeout (float): Connect and read timeout in seconds for each request.
+        rate (float): Maximum number of requests per second of the shard.
+        refresh_all (bool): Fetch every user of the shard, instead of the ones due in the refresh schedule.
+    """
+    directory = shard_dir(shards_dir, index, count)
+    if os.path.exists(os.path.join(directory, PARTIAL_FILE)):
+        print(f"Shard {index}/{count} is already done, waiting for the merge")
+        return
+    prepare_shard(directory, index, count, user_store_file, retry_queue_file, cache_file, cache_size, schedule_file)
+
+    store = open_user_store(os.path.join(directory, STORE_FILE), output_dir)
+    schedule = RefreshSchedule(os.path.join(directory, SCHEDULE_FILE))
+    journal = RunJournal(store)
+    changeset: dict = {}
+    snapshot: dict = {}
+    process_users(
+        [username for username in usernames if shard_of(username, count) == index],
+        base_url,
+        output_dir,
+        workers,
+        timeout,
+        rate,
+        os.path.join(directory, RETRY_QUEUE_FILE),
+        os.path.join(directory, CACHE_FILE),
+        cache_size,
+        None,
+        changeset,
+        store,
+        snapshot,
+        schedule,
+        refresh_all,
+        journal,
+    )
+    with metrics.stage("save shard"):
+        records = ((username, user_data) for username, user_data in store.iter_records()
+                   if shard_of(username, count) == index)
+        write_partial(directory, journal.run_id, journal.started_at, records, changeset, snapshot)
+        print(f"Shard {index}/{count} written to {directory}")
+    journal.finish()
+    store.close()
+
+
+def merge_shards(
+    count: int,
+    shards_dir: str,
+    output_dir: str,
+    user_store_file: str,
+    retry_queue_file: str,
+    cache_file: str,
+    cache_size: int,
+    schedule_file: str,
+    changeset_file: str,
+    snapshot_dir: str,
+    history_dir: str
+) -> tuple:
+    """
+    Merge the shards of a run into the shared state, as if a single process had run them all.
+
+    The records of the users of every shard replace theirs in the store, and the changesets,
+    elo inputs, retry queues, caches and schedules of the shards are combined; the run is
+    named after the earliest shard. The working directories are left in place until
+    `remove_shards`, so a merge that dies partway is run again.
+
+    Args:
+        count (int): Number of shards.
+        shards_dir (str): Path to the directory of the shards.
+        output_dir (str): Output directory for JSON files.
+        user_store_file (str): Path to the SQLite database of the user store.
+        retry_queue_file (str): JSON file of the retry queue.
+        cache_file (str): JSON file of the response cache.
+        cache_size (int): Maximum number of users kept in the response cache.
+        schedule_file (str): JSON file of the refresh schedule.
+        changeset_file (str): JSON file of the pending changeset.
+        snapshot_dir (str): Path to the directory of the elo snapshots.
+        history_dir (str): Path to the directory of the weekly history.
+
+    Returns:
+        tuple: Store of the user records, left open, and the merged language data and users
+            (see `merge_aggregates`).
+
+    Raises:
+        ValueError: If some shards are not done.
+    """
+    partials = load_partials(shards_dir, count)
+    store = open_user_store(user_store_file, output_dir)
+    with metrics.stage("merge shards"):
+        usernames = []
+        changeset = {}
+        snapshot = {}
+        for partial in partials:
+            for username, user_data in partial["records"].items():
+                store.put(username, user_data)
+            usernames += partial["records"]
+            changeset.update(partial["changeset"])
+            snapshot.update(partial["snapshot"])
+        store.commit()
+
+        directories = [shard_dir(shards_dir, index, count) for index in range(1, count + 1)]
+        merge_shard_state(directories, retry_queue_file, cache_file, cache_size, schedule_file)
+        save_changeset(changeset_file, merge_changesets(load_changeset(changeset_file), changeset))
+        save_snapshot(snapshot_dir, snapshot, min(partial["run_id"] for partial in partials))
+        started_at = min(partial["started_at"] for partial in partials)
+        week = HistoryStore(history_dir).append(store.language_minutes(), started_at)
+        print(f"Recorded week {week} of the user languages in {history_dir}")
+
+        writer = BatchWriter()
+        store.export_json(output_dir, usernames, writer)
+        print(f"Merged {count} shard(s): exported {len(usernames)} users to {output_dir}")
+        print(writer.report())
+    with metrics.stage("merge aggregates"):
+        aggregates = merge_aggregates(partials)
+    return store, aggregates
+
+
+def remove_shards(shards_dir: str, count: int) -> None:
+    """
+    Remove the working directories of the shards of a merged run.
+
+    Args:
+        shards_dir (str): Path to the directory of the shards.
+        count (int): Number of shards.
     """
-    for username in usernames:
-        process_user(username, base_url, output_dir)
+    for index in range(1, count + 1):
+        shutil.rmtree(shard_dir(shards_dir, index, count), ignore_errors=True)
+    if os.path.isdir(shards_dir) and not os.listdir(shards_dir):
+        os.rmdir(shards_dir)
+
+
+def run_shards(
+    count: int,
+    shard_args: tuple,
+    workers: int = 8,
+    timeout: float = 30.0,
+    rate: float = 10.0,
+    refresh_all: bool = False
+) -> None:
+    """
+    Run every shard of a run on this machine, one process per shard.
+
+    The shards share the request rate and split the concurrent requests, so that the
+    API sees the same load as from a single process.
+
+    Args:
+        count (int): Number of shards.
+        shard_args (tuple): Arguments of `run_shard` from `usernames` to `schedule_file`.
+        workers (int): Maximum number of concurrent requests over all the shards.
+        timeout (float): Connect and read timeout in seconds for each request.
+        rate (float): Maximum number of requests per second over all the shards.
+        refresh_all (bool): Fetch every user, instead of the ones due in the refresh schedule.
+    """
+    with ProcessPoolExecutor(max_workers=count) as executor:
+        futures = [
+            executor.submit(
+                run_shard, index, count, *shard_args, max(1, workers // count), timeout, rate / count, refresh_all
+            )
+            for index in range(1, count + 1)
+        ]
+        for future in futures:
+            future.result()
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Fetch and update the WakaTime data of every user.")
+    parser.add_argument("command", nargs="?", choices=["add"], help="add a single user interactively")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent requests (default: 8)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds (default: 30)")
+    parser.add_argument("--rate", type=float, default=10.0, help="maximum requests per second (default: 10)")
+    parser.add_argument(
+        "--aggregate",
+        action="store_true",
+        help="generate the language and global leaderboards from the data in memory afterwards",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="with --aggregate, rebuild every language file instead of applying the changeset",
+    )
+    parser.add_argument("--cache-size", type=int, default=10000, help="users kept in the response cache (default: 10000)")
+    parser.add_argument(
+        "--refresh-all",
+        action="store_true",
+        help="fetch every user, instead of the ones due in the refresh schedule",
+    )
+    sharding = parser.add_mutually_exclusive_group()
+    sharding.add_argument(
+        "--shard",
+        metavar="I/N",
+        type=parse_shard,
+        help="process only the I-th of N shards of the users, for a later --merge N",
+    )
+    sharding.add_argument("--merge", metavar="N", type=int, help="merge the N shards of a run into the shared state")
+    sharding.add_argument("--shards", metavar="N", type=int, help="run N shards in parallel processes, then merge them")
+    parser.add_argument("--profile", metavar="FILE", help="save cProfile statistics of the run to FILE")
+    return parser.parse_args()
 
 
 def main() -> None:
     """
     Main function to process user data. If "add" argument is provided, add a single user.
-    Otherwise, process all users.
+    Otherwise, process all users, in a single process or in shards.
     """
+    args = parse_args()
     users_file: str = "data/users.json"
     output_directory: str = "data/users"
     base_api_url: str = "https://github-readme-stats.vercel.app/api/wakatime"
-
-    create_output_directory(output_directory)
-
-    if len(sys.argv) > 1 and sys.argv[1] == "add":
-        username = input("Enter username: ")
-        process_user(username, base_api_url, output_directory)
-    else:
-        usernames: list = load_users(users_file)
-        process_users(usernames, base_api_url, output_directory)
+    retry_queue_file: str = "state/retry_queue.json"
+    cache_file: str = "state/http_cache.json"
+    changeset_file: str = "state/changeset.json"
+    user_store_file: str = "state/users.sqlite"
+    snapshot_dir: str = "state/snapshots"
+    history_dir: str = "state/history"
+    schedule_file: str = "state/refresh_schedule.json"
+    report_file: str = "state/run_report.json"
+    shards_dir: str = "state/shards"
+
+    with instrumented_run("generate_user_data", report_file, args.profile):
+        create_output_directory(output_directory)
+        if args.shard or args.shards:
+            shard_args = (
+                load_users(users_file),
+                base_api_url,
+                output_directory,
+                shards_dir,
+                user_store_file,
+                retry_queue_file,
+                cache_file,
+                args.cache_size,
+                schedule_file,
+            )
+            if args.shard:
+                run_shard(*args.shard, *shard_args, args.workers, args.timeout, args.rate, args.refresh_all)
+                return
+            run_shards(args.shards, shard_args, args.workers, args.timeout, args.rate, args.refresh_all)
+        if args.shards or args.merge:
+            count = args.shards or args.merge
+            store, aggregates = merge_shards(
+                count,
+                shards_dir,
+                output_directory,
+                user_store_file,
+                retry_queue_file,
+                cache_file,
+                args.cache_size,
+                schedule_file,
+                changeset_file,
+                snapshot_dir,
+                history_dir,
+            )
+            if args.aggregate:
+                with metrics.stage("aggregate"):
+                    generate_leaderboards.run(full=args.full, aggregates=aggregates)
+            store.close()
+            remove_shards(shards_dir, count)
+            return
+
+        store = open_user_store(user_store_file, output_directory)
+
+        if args.command == "add":
+            username = input("Enter username: ")
+            usernames: list = [username]
+            workers: int = 1
+            schedule = None
+            journal = None
+        else:
+            usernames: list = load_users(users_file)
+            workers: int = args.workers
+            schedule = RefreshSchedule(schedule_file)
+            journal = RunJournal(store)
+
+        records: dict = {}
+        changeset: dict = {}
+        snapshot: dict = {}
+        process_users(
+            usernames,
+            base_api_url,
+            output_directory,
+            workers,
+            args.timeout,
+            args.rate,
+            retry_queue_file,
+            cache_file,
+            args.cache_size,
+            records,
+            changeset,
+            store,
+            snapshot,
+            schedule,
+            args.refresh_all,
+            journal,
+        )
+        with metrics.stage("save state"):
+            save_changeset(changeset_file, merge_changesets(load_changeset(changeset_file), changeset))
+            # Users added by hand are not a weekly run: the elo replay must not see them as one.
+            if journal is not None:
+                save_snapshot(snapshot_dir, snapshot, journal.run_id)
+                week = HistoryStore(history_dir).append(store.language_minutes(), journal.started_at)
+                print(f"Recorded week {week} of the user languages in {history_dir}")
+
+        if args.aggregate:
+            with metrics.stage("aggregate"):
+                generate_leaderboards.run(records, args.full, store)
+        if journal is not None:
+            journal.finish()
+        store.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+import os
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from batch_writer import read_json_file, write_json_file
+from time_codec import format_language_time
+from user_store import open_user_store
+
+
+# Every this many weeks, the complete state is stored instead of a delta, bounding the
+# number of segments read to rebuild any week.
+KEYFRAME_INTERVAL = 13
+
+
+class HistoryStore:
+    """
+    Append-only history of the language minutes of every user, one segment file per week.
+
+    A segment holds, for each user whose languages changed since the previous week, the new
+    minutes of the changed languages (null for a language the user no longer has). Every
+    `KEYFRAME_INTERVAL` weeks, a keyframe holds the complete state instead. Segments are never
+    rewritten, so the directory only grows by one small file per week.
+    """
+
+    def __init__(self, history_dir: str) -> None:
+        """
+        Args:
+            history_dir (str): Path to the directory of the segments, created on the first append.
+        """
+        self.history_dir = history_dir
+        self.segments: Dict[int, dict] = {}
+
+    def weeks(self) -> List[int]:
+        """
+        Returns:
+            List[int]: Numbers of the recorded weeks, in ascending order, starting at 1.
+        """
+        if not os.path.isdir(self.history_dir):
+            return []
+        return sorted(int(filename[:-len(".json")]) for filename in os.listdir(self.history_dir)
+                      if filename.endswith(".json"))
+
+    def segment(self, week: int) -> dict:
+        """
+        Args:
+            week (int): Number of a recorded week.
+
+        Returns:
+            dict: Segment of the week, loaded once.
+        """
+        if week not in self.segments:
+            self.segments[week] = read_json_file(os.path.join(self.history_dir, f"{week:06d}.json"))
+        return self.segments[week]
+
+    def resolve(self, week: int = None) -> int:
+        """
+        Args:
+            week (int): Number of a week, or a negative offset from the last one (default is the last one).
+
+        Returns:
+            int: Number of the recorded week.
+        """
+        weeks = self.weeks()
+        if not weeks:
+            raise ValueError(f"No week recorded in {self.history_dir}")
+        if week is None:
+            return weeks[-1]
+        if week <= 0:
+            week = weeks[-1] + week
+        if week not in weeks:
+            raise ValueError(f"Week {week} is not recorded in {self.history_dir} (weeks 1 to {weeks[-1]})")
+        return week
+
+    def state_as_of(self, week: int = None) -> Dict[str, Dict[str, int]]:
+        """
+        Rebuild the minutes of every user at the end of a week, from the keyframe before it.
+
+        Args:
+            week (int): Number of the week, or a negative offset from the last one (default is the last one).
+
+        Returns:
+            Dict[str, Dict[str, int]]: Minutes by language name, by username, for the users with languages.
+        """
+        week = self.resolve(week)
+        keyframe = week
+        while not self.segment(keyframe)["keyframe"]:
+            keyframe -= 1
+
+        state = {username: dict(languages) for username, languages in self.segment(keyframe)["users"].items()}
+        for delta_week in range(keyframe + 1, week + 1):
+            for username, changes in self.segment(delta_week)["users"].items():
+                languages = state.setdefault(username, {})
+                for language, minutes in changes.items():
+                    if minutes is None:
+                        languages.pop(language, None)
+                    else:
+                        languages[language] = minutes
+                if not languages:
+                    del state[username]
+        return state
+
+    def series(self, username: str) -> Dict[str, List[Optional[int]]]:
+        """
+        Minutes of a user in each of its languages, week by week.
+
+        Args:
+            username (str): Username of the user.
+
+        Returns:
+            Dict[str, List[Optional[int]]]: Minutes of each language at the end of every recorded
+                week (None while the user did not have the language), by language name.
+        """
+        weeks = self.weeks()
+        languages: Dict[str, int] = {}
+        series: Dict[str, List[Optional[int]]] = {}
+        for index, week in enumerate(weeks):
+            segment = self.segment(week)
+            if segment["keyframe"]:
+                languages = dict(segment["users"].get(username, {}))
+            else:
+                for language, minutes in segment["users"].get(username, {}).items():
+                    if minutes is None:
+                        languages.pop(language, None)
+                    else:
+                        languages[language] = minutes
+            for language, minutes in languages.items():
+                series.setdefault(language, [None] * len(weeks))[index] = minutes
+        return series
+
+    def growth(self, since: int, until: int = None, language: str = None) -> List[Tuple[str, int]]:
+        """
+        Minutes gained by every user between two weeks, the trend of the leaderboards.
+
+        Args:
+            since (int): Number of the first week, or a negative offset from the last one.
+            until (int): Number of the last week, or a negative offset from the last one (default is the last one).
+            language (str): Only count the minutes of this language (default is every language).
+
+        Returns:
+            List[Tuple[str, int]]: Username and minutes gained of each user who gained time,
+                the fastest growing first.
+        """
+        before = self.state_as_of(since)
+        after = self.state_as_of(until)
+
+        def minutes(languages: Dict[str, int]) -> int:
+            return languages.get(language, 0) if language else sum(languages.values())
+
+        gains = [(username, minutes(languages) - minutes(before.get(username, {})))
+                 for username, languages in after.items()]
+        return sorted((gain for gain in gains if gain[1] > 0), key=lambda gain: (-gain[1], gain[0]))
+
+    def append(self, state: Dict[str, Dict[str, int]], recorded_at: str = None) -> int:
+        """
+        Record a new week, as the changes since the last one or as a keyframe.
+
+        Args:
+            state (Dict[str, Dict[str, int]]): Minutes by language name, by username, at the end of the week.
+            recorded_at (str): Time of the run (default is the current UTC time); a run already
+                recorded at that time is not recorded again.
+
+        Returns:
+            int: Number of the recorded week.
+        """
+        weeks = self.weeks()
+        if weeks and recorded_at and self.segment(weeks[-1])["recorded_at"] == recorded_at:
+            return weeks[-1]
+        week = weeks[-1] + 1 if weeks else 1
+        keyframe = (week - 1) % KEYFRAME_INTERVAL == 0
+
+        if keyframe:
+            users = {username: dict(languages) for username, languages in sorted(state.items()) if languages}
+        else:
+            previous = self.state_as_of(weeks[-1])
+            users = {}
+            for username in sorted(previous.keys() | state.keys()):
+                old = previous.get(username, {})
+                new = state.get(username, {})
+                changes = {language: None for language in old if language not in new}
+                changes.update((language, minutes) for language, minutes in new.items() if old.get(language) != minutes)
+                if changes:
+                    users[username] = changes
+
+        segment = {
+            "week": week,
+            "recorded_at": recorded_at or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "keyframe": keyframe,
+            "users": users,
+        }
+        write_json_file(os.path.join(self.history_dir, f"{week:06d}.json"), segment, compact=True)
+        self.segments[week] = segment
+        return week
+
+
+def main() -> None:
+    """
+    Query the history of the user languages.
+    """
+    parser = argparse.ArgumentParser(description="Query the weekly history of the user languages.")
+    parser.add_argument("--record", action="store_true", help="record the current user languages as a new week")
+    parser.add_argument("--user", help="print the minutes of this user in each language, week by week")
+    parser.add_argument("--as-of", type=int, help="print the total minutes of every user at the end of this week")
+    parser.add_argument("--growth", type=int, metavar="WEEKS", help="print the fastest growing users over WEEKS weeks")
+    parser.add_argument("--language", help="with --growth, only count the minutes of this language")
+    parser.add_argument("--limit", type=int, default=20, help="number of users printed (default: 20)")
+    args = parser.parse_args()
+
+    history_dir: str = "state/history"
+    user_data_dir: str = "data/users"
+    user_store_file: str = "state/users.sqlite"
+
+    history = HistoryStore(history_dir)
+    if args.record:
+        store = open_user_store(user_store_file, user_data_dir)
+        week = history.append(store.language_minutes())
+        store.close()
+        print(f"Recorded week {week} in {history_dir}")
+
+    if args.user:
+        weeks = history.weeks()
+        print(f"{args.user}: weeks {weeks[0]} to {weeks[-1]}" if weeks else f"No week recorded in {history_dir}")
+        for language, minutes in sorted(history.series(args.user).items()):
+            print(f"  {language}: {' '.join('-' if value is None else str(value) for value in minutes)}")
+
+    if args.as_of is not None:
+        state = history.state_as_of(args.as_of)
+        totals = sorted(((sum(languages.values()), username) for username, languages in state.items()), reverse=True)
+        print(f"Week {history.resolve(args.as_of)}: {len(state)} user(s)")
+        for total, username in totals[:args.limit]:
+            print(f"  {username}: {format_language_time(total)}")
+
+    if args.growth is not None:
+        gains = history.growth(-args.growth, language=args.language)
+        print(f"Fastest growing over the last {args.growth} week(s){f' in {args.language}' if args.language else ''}:")
+        for username, gain in gains[:args.limit]:
+            print(f"  {username}: +{format_language_time(gain)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+import time
+import hashlib
+import threading
+import requests
+from typing import Dict, Optional
+from batch_writer import read_json_file, write_json_file
+
+
+class ResponseCache:
+    """
+    Validators and content hash of the last response fetched for each user.
+
+    They are used to send conditional requests, and to recognize a response whose
+    content is byte-identical to the one already merged into the user's file.
+    The least recently used entries are evicted when the cache is saved.
+    """
+
+    def __init__(self, file_path: Optional[str] = None, max_entries: int = 10000) -> None:
+        """
+        Args:
+            file_path (Optional[str]): JSON file the cache is loaded from and saved to (default is in memory only).
+            max_entries (int): Maximum number of users kept in the cache.
+        """
+        self.file_path = file_path
+        self.max_entries = max_entries
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if file_path and os.path.exists(file_path):
+            self.entries = read_json_file(file_path)
+
+    def conditional_headers(self, username: str) -> Dict[str, str]:
+        """
+        Args:
+            username (str): Username about to be fetched.
+
+        Returns:
+            Dict[str, str]: If-None-Match and If-Modified-Since headers for the cached response, if any.
+        """
+        with self.lock:
+            entry = self.entries.get(username)
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def is_unchanged(self, username: str, response: requests.Response) -> bool:
+        """
+        Tell whether a response repeats the cached one, counting cache hits and misses.
+
+        Args:
+            username (str): Username the response was fetched for.
+            response (requests.Response): Response to the (conditional) request.
+
+        Returns:
+            bool: True if the server answered 304 or sent the same content as last time.
+        """
+        with self.lock:
+            entry = self.entries.get(username)
+            unchanged = entry is not None and (
+                response.status_code == 304 or entry["hash"] == content_hash(response.content)
+            )
+            if unchanged:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return unchanged
+
+    def store(self, username: str, response: requests.Response) -> None:
+        """
+        Remember the validators and content hash of a response once it has been processed.
+
+        Args:
+            username (str): Username the response was fetched for.
+            response (requests.Response): Response to remember.
+        """
+        with self.lock:
+            entry = self.entries.get(username, {})
+            if response.status_code != 304:
+                entry = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "hash": content_hash(response.content),
+                }
+            entry["used"] = time.time()
+            self.entries[username] = entry
+
+    def save(self) -> None:
+        """
+        Evict the least recently used entries above the size cap and write the cache to its file.
+        """
+        with self.lock:
+            if len(self.entries) > self.max_entries:
+                recent = sorted(self.entries, key=lambda username: self.entries[username]["used"], reverse=True)
+                self.entries = {username: self.entries[username] for username in recent[:self.max_entries]}
+            entries = dict(sorted(self.entries.items()))
+
+        if self.file_path:
+            write_json_file(self.file_path, entries)
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: Human readable summary of the cache hits and misses.
+        """
+        lookups = self.hits + self.misses
+        rate = 100 * self.hits / lookups if lookups else 0.0
+        return f"Cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+
+def content_hash(content: bytes) -> str:
+    """
+    Args:
+        content (bytes): Response body.
+
+    Returns:
+        str: SHA-256 hex digest of the body.
+    """
+    return hashlib.sha256(content).hexdigest()
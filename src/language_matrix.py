@@ -0,0 +1,247 @@
+import os
+import argparse
+import numpy as np
+from typing import Dict, List, Tuple
+from batch_writer import BatchWriter, read_json_file
+from time_codec import minutes_to_time
+
+
+class LanguageMatrix:
+    """
+    Minutes of every user in every language, as a sparse user x language matrix in CSR form.
+
+    Row `i` is the user `usernames[i]`; its entries are `minutes[indptr[i]:indptr[i + 1]]`,
+    in the languages `languages[indices[indptr[i]:indptr[i + 1]]]`. Only the users with at
+    least one language have a row, so no row is empty.
+    """
+
+    def __init__(
+        self,
+        usernames: List[str],
+        languages: List[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        minutes: np.ndarray
+    ) -> None:
+        """
+        Args:
+            usernames (List[str]): Username of each row, sorted.
+            languages (List[str]): Language name of each column, sorted.
+            indptr (np.ndarray): Start of the entries of each row, and their end.
+            indices (np.ndarray): Column of each entry, ascending within a row.
+            minutes (np.ndarray): Minutes of each entry.
+        """
+        self.usernames = usernames
+        self.languages = languages
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.minutes = np.asarray(minutes, dtype=np.int64)
+
+    @classmethod
+    def from_language_data(cls, language_data: Dict[str, Dict[str, Tuple[int, str]]]) -> "LanguageMatrix":
+        """
+        Build the matrix from the language data the language leaderboards are built from.
+
+        Args:
+            language_data (Dict[str, Dict[str, Tuple[int, str]]]): A dictionary mapping languages
+                to the minutes and time string of each user, by username.
+
+        Returns:
+            LanguageMatrix: Matrix of the minutes.
+        """
+        languages = sorted(language_data)
+        entry_users: List[str] = []
+        columns: List[int] = []
+        minutes: List[int] = []
+        for column, language in enumerate(languages):
+            for username, (language_minutes, _) in language_data[language].items():
+                entry_users.append(username)
+                columns.append(column)
+                minutes.append(language_minutes)
+
+        usernames = sorted(set(entry_users))
+        row_of = {username: row for row, username in enumerate(usernames)}
+        rows = np.fromiter(map(row_of.__getitem__, entry_users), dtype=np.int64, count=len(entry_users))
+        columns_array = np.array(columns, dtype=np.int32)
+        order = np.lexsort((columns_array, rows))
+        indptr = np.zeros(len(usernames) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(usernames)), out=indptr[1:])
+        return cls(usernames, languages, indptr, columns_array[order], np.array(minutes, dtype=np.int64)[order])
+
+    def language_counts(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: Number of languages of each user.
+        """
+        return np.diff(self.indptr)
+
+    def totals(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: Minutes of each user over all of its languages.
+        """
+        return np.add.reduceat(self.minutes, self.indptr[:-1]) if self.usernames else np.zeros(0, dtype=np.int64)
+
+    def diversity(self) -> np.ndarray:
+        """
+        Effective number of languages of each user: the exponential of the Shannon entropy of
+        its minutes over its languages. It is the number of languages for a user spending the
+        same time in each, and close to 1 for a user spending nearly all of it in one.
+
+        Returns:
+            np.ndarray: Diversity of each user.
+        """
+        if not self.usernames:
+            return np.zeros(0)
+        row_ids = np.repeat(np.arange(len(self.usernames)), self.language_counts())
+        shares = self.minutes / self.totals()[row_ids]
+        entropy = np.add.reduceat(-shares * np.log(shares), self.indptr[:-1])
+        return np.exp(entropy)
+
+    def rollup(self, groups: Dict[str, List[str]]) -> np.ndarray:
+        """
+        Sum the minutes of every user in each group of languages, for all the groups at once.
+
+        Args:
+            groups (Dict[str, List[str]]): Languages of each group; a language may be in several groups.
+
+        Returns:
+            np.ndarray: Minutes of each user (rows) in each group (columns, in the order of `groups`).
+        """
+        columns = {language: column for column, language in enumerate(self.languages)}
+        membership = np.zeros((len(self.languages), len(groups)), dtype=np.int64)
+        for group, languages in enumerate(groups.values()):
+            membership[[columns[language] for language in languages if language in columns], group] = 1
+        if not self.usernames:
+            return np.zeros((0, len(groups)), dtype=np.int64)
+        return np.add.reduceat(self.minutes[:, None] * membership[self.indices], self.indptr[:-1], axis=0)
+
+    def to_json(self) -> dict:
+        """
+        Returns:
+            dict: Columns of the matrix, as lists.
+        """
+        return {
+            "usernames": self.usernames,
+            "languages": self.languages,
+            "indptr": self.indptr.tolist(),
+            "indices": self.indices.tolist(),
+            "minutes": self.minutes.tolist(),
+        }
+
+
+def load_language_matrix(file_path: str) -> LanguageMatrix:
+    """
+    Args:
+        file_path (str): Path to the JSON file of the matrix.
+
+    Returns:
+        LanguageMatrix: Matrix saved by the last leaderboard run.
+    """
+    columns = read_json_file(file_path)
+    return LanguageMatrix(
+        columns["usernames"], columns["languages"], columns["indptr"], columns["indices"], columns["minutes"]
+    )
+
+
+def load_language_groups(file_path: str) -> Dict[str, List[str]]:
+    """
+    Args:
+        file_path (str): Path to the JSON file mapping each group name to its languages.
+
+    Returns:
+        Dict[str, List[str]]: Languages of each group, empty if the file does not exist.
+    """
+    if not os.path.exists(file_path):
+        return {}
+    return read_json_file(file_path)
+
+
+def ranked_rows(order: np.ndarray, usernames: List[str], columns: Dict[str, list]) -> List[dict]:
+    """
+    Args:
+        order (np.ndarray): Rows of the matrix, in the order of the board.
+        usernames (List[str]): Username of each row.
+        columns (Dict[str, list]): Value of each row, by field name.
+
+    Returns:
+        List[dict]: Username and fields of each row, in the order of the board.
+    """
+    return [
+        dict({"username": usernames[row]}, **{name: values[row] for name, values in columns.items()})
+        for row in order.tolist()
+    ]
+
+
+def write_matrix_boards(
+    matrix: LanguageMatrix,
+    groups: Dict[str, List[str]],
+    rollup_dir: str,
+    polyglot_dir: str,
+    writer: BatchWriter = None
+) -> None:
+    """
+    Write a leaderboard for every group of languages, and the rankings of the users by
+    number of languages and by diversity, from a single pass over the matrix.
+
+    The group boards have the shape of the language boards (username and time, by
+    descending minutes); ties keep the order of the usernames.
+
+    Args:
+        matrix (LanguageMatrix): Minutes of the users in every language.
+        groups (Dict[str, List[str]]): Languages of each group.
+        rollup_dir (str): Path to the directory of the group leaderboards.
+        polyglot_dir (str): Path to the directory of the language count and diversity rankings.
+        writer (BatchWriter): Writer of the files (default is a new one).
+    """
+    writer = writer or BatchWriter()
+    rows = np.arange(len(matrix.usernames))
+
+    sums = matrix.rollup(groups)
+    for group, name in enumerate(groups):
+        group_minutes = sums[:, group]
+        order = np.lexsort((rows, -group_minutes))
+        order = order[group_minutes[order] > 0]
+        board = [{"username": matrix.usernames[row], "time": minutes_to_time(int(group_minutes[row]))} for row in order]
+        writer.write(os.path.join(rollup_dir, f"{name.replace(' ', '_').replace('/', '_')}.json"), board)
+
+    counts = matrix.language_counts()
+    diversity = np.round(matrix.diversity(), 3)
+    columns = {"languages": counts.tolist(), "diversity": diversity.tolist()}
+    by_count = np.lexsort((rows, -diversity, -counts))
+    by_diversity = np.lexsort((rows, -counts, -diversity))
+    writer.write(os.path.join(polyglot_dir, "languages.json"), ranked_rows(by_count, matrix.usernames, columns))
+    writer.write(os.path.join(polyglot_dir, "diversity.json"), ranked_rows(by_diversity, matrix.usernames, columns))
+    writer.flush()
+    print(f"{len(groups)} group leaderboard(s) written to {rollup_dir}, polyglot rankings to {polyglot_dir}")
+
+
+def main() -> None:
+    """
+    Query the user x language matrix saved by the last leaderboard run.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--rollup", metavar="LANGUAGES", help="comma-separated languages to sum the time of")
+    parser.add_argument("--polyglots", action="store_true", help="rank the users by number of languages")
+    parser.add_argument("--limit", type=int, default=20, help="rows to print (default: 20)")
+    args = parser.parse_args()
+
+    matrix_file: str = "state/language_matrix.json"
+
+    matrix = load_language_matrix(matrix_file)
+    print(f"{len(matrix.usernames)} users, {len(matrix.languages)} languages, {len(matrix.minutes)} entries")
+    rows = np.arange(len(matrix.usernames))
+    if args.rollup:
+        group_minutes = matrix.rollup({"query": args.rollup.split(",")})[:, 0]
+        for row in np.lexsort((rows, -group_minutes))[:args.limit].tolist():
+            if group_minutes[row]:
+                print(f"{matrix.usernames[row]:<40} {minutes_to_time(int(group_minutes[row]))}")
+    if args.polyglots:
+        counts = matrix.language_counts()
+        diversity = matrix.diversity()
+        for row in np.lexsort((rows, -diversity, -counts))[:args.limit].tolist():
+            print(f"{matrix.usernames[row]:<40} {counts[row]:>4} languages, diversity {diversity[row]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import numpy as np
+from typing import Dict, List, Tuple
+from batch_writer import BatchWriter
+
+
+# Log-scale bins of the Elo histogram, and width of the Gaussian kernel smoothing it, in bins.
+ELO_BINS = 32
+SMOOTHING_SIGMA = 1.2
+PERCENTILES = (50, 90, 99)
+
+
+def elo_distribution(elos: np.ndarray, bins: int = ELO_BINS, sigma: float = SMOOTHING_SIGMA) -> dict:
+    """
+    Histogram of the positive elos on a log scale, with a Gaussian-smoothed density.
+
+    The raw elos are extremely skewed (a long tail up to ~18k), so a linear histogram
+    collapses into a spike; binned on a log scale they give a readable bell.
+
+    Args:
+        elos (np.ndarray): Elo of every user.
+        bins (int): Number of bins.
+        sigma (float): Standard deviation of the smoothing kernel, in bins.
+
+    Returns:
+        dict: Center of each bin back in Elo space ("centers"), number of users in
+            each bin ("counts") and smoothed number of users ("smooth").
+    """
+    logs = np.log10(elos[elos > 0].astype(np.float64))
+    if logs.size == 0:
+        return {"centers": [], "counts": [], "smooth": []}
+
+    min_log = logs.min()
+    width = (logs.max() - min_log) / bins
+    if width > 0:
+        indexes = np.minimum(bins - 1, np.floor((logs - min_log) / width).astype(np.int64))
+    else:
+        indexes = np.zeros(logs.size, dtype=np.int64)
+    counts = np.bincount(indexes, minlength=bins)
+    centers = np.floor(10 ** (min_log + (np.arange(bins) + 0.5) * width) + 0.5).astype(np.int64)
+
+    # Kernel over the bin indices, normalized for each bin so the edges are not pulled down.
+    offsets = np.arange(bins)
+    weights = np.exp(-((offsets[:, None] - offsets[None, :]) ** 2) / (2 * sigma * sigma))
+    smooth = weights @ counts / weights.sum(axis=1)
+
+    return {"centers": centers.tolist(), "counts": counts.tolist(), "smooth": np.round(smooth, 3).tolist()}
+
+
+def grouped_percentiles(values: np.ndarray, groups: np.ndarray, group_count: int) -> Dict[int, np.ndarray]:
+    """
+    Percentiles of the values of every group at once, with linear interpolation like `np.percentile`.
+
+    Args:
+        values (np.ndarray): Values to summarize.
+        groups (np.ndarray): Group index of each value, each group having at least one value.
+        group_count (int): Number of groups.
+
+    Returns:
+        Dict[int, np.ndarray]: Value of each percentile in `PERCENTILES`, by group.
+    """
+    order = np.lexsort((values, groups))
+    sorted_values = values[order].astype(np.float64)
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.cumsum(counts) - counts
+
+    percentiles = {}
+    for percentile in PERCENTILES:
+        positions = (counts - 1) * (percentile / 100)
+        lower = np.floor(positions).astype(np.int64)
+        upper = np.minimum(lower + 1, counts - 1)
+        low_values = sorted_values[starts + lower]
+        high_values = sorted_values[starts + upper]
+        fractions = positions - lower
+        # Interpolated from the nearest end, the way `np.percentile` does.
+        percentiles[percentile] = np.where(
+            fractions >= 0.5,
+            high_values - (high_values - low_values) * (1 - fractions),
+            low_values + (high_values - low_values) * fractions,
+        )
+    return percentiles
+
+
+def language_summaries(language_data: Dict[str, Dict[str, Tuple[int, str]]]) -> Dict[str, dict]:
+    """
+    Number of users, total minutes and time percentiles of every language leaderboard.
+
+    Args:
+        language_data (Dict[str, Dict[str, Tuple[int, str]]]): A dictionary mapping languages
+            to the minutes and time string of each user, by username.
+
+    Returns:
+        Dict[str, dict]: Summary of each language, by sanitized language name.
+    """
+    languages = sorted(language for language, users in language_data.items() if users)
+    if not languages:
+        return {}
+
+    counts = np.fromiter((len(language_data[language]) for language in languages), dtype=np.int64)
+    groups = np.repeat(np.arange(len(languages)), counts)
+    minutes = np.fromiter(
+        (minutes for language in languages for minutes, _ in language_data[language].values()),
+        dtype=np.int64,
+        count=int(counts.sum()),
+    )
+    totals = np.bincount(groups, weights=minutes, minlength=len(languages))
+    percentiles = grouped_percentiles(minutes, groups, len(languages))
+
+    summaries = {}
+    for index, language in enumerate(languages):
+        summary = {"count": int(counts[index]), "total_minutes": int(totals[index])}
+        for percentile in PERCENTILES:
+            summary[f"p{percentile}"] = round(float(percentiles[percentile][index]))
+        summaries[language.replace(" ", "_").replace("/", "_")] = summary
+    return dict(sorted(summaries.items()))
+
+
+def elo_summary(users: List[Dict[str, str]]) -> dict:
+    """
+    Number of users, percentiles and distribution of the global leaderboard.
+
+    Args:
+        users (List[Dict[str, str]]): List of users with their elo.
+
+    Returns:
+        dict: Summary of the elos, with the histogram of `elo_distribution`.
+    """
+    elos = np.fromiter((user["elo"] for user in users), dtype=np.int64, count=len(users))
+    summary = {"count": int(elos.size)}
+    if elos.size:
+        for percentile in PERCENTILES:
+            summary[f"p{percentile}"] = round(float(np.percentile(elos, percentile)))
+    summary["distribution"] = elo_distribution(elos)
+    return summary
+
+
+def write_stats(
+    users: List[Dict[str, str]],
+    language_data: Dict[str, Dict[str, Tuple[int, str]]],
+    output_file: str,
+    language_output_file: str,
+    writer: BatchWriter = None
+) -> None:
+    """
+    Write the statistics of the leaderboards.
+
+    The Elo summary and distribution drawn by the site go to a small file of their own,
+    the summaries of every language to a second one.
+
+    Args:
+        users (List[Dict[str, str]]): List of users with their elo.
+        language_data (Dict[str, Dict[str, Tuple[int, str]]]): A dictionary mapping languages
+            to the minutes and time string of each user, by username.
+        output_file (str): Path to the JSON file of the Elo statistics.
+        language_output_file (str): Path to the JSON file of the language summaries.
+        writer (BatchWriter): Writer of the files (default is a new one).
+    """
+    writer = writer or BatchWriter()
+    writer.write(output_file, {"elo": elo_summary(users)}, compact=True)
+    writer.write(language_output_file, language_summaries(language_data), compact=True)
+    writer.flush()
+    print(f"Statistics written to {output_file} and {language_output_file}")
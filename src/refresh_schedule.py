@@ -0,0 +1,157 @@
+import os
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from batch_writer import read_json_file, write_json_file
+
+
+# Runs between two fetches of the users of each tier, one run per week.
+TIERS = {"weekly": 1, "monthly": 4, "quarterly": 13}
+# The activity score of a user halves every 4 runs without a change.
+ACTIVITY_DECAY = 0.5 ** (1 / 4)
+# Minimum activity scores of the weekly and monthly tiers: a change within the last 8 runs
+# keeps a user weekly, one within the last 24 runs keeps it monthly.
+WEEKLY_SCORE = 0.25
+MONTHLY_SCORE = 1 / 64
+# Users this high in the global leaderboard are fetched every week, whatever their activity.
+TOP_USERS = 100
+
+
+def refresh_phase(username: str, interval: int) -> int:
+    """
+    Args:
+        username (str): Username of the user.
+        interval (int): Runs between two fetches of the user.
+
+    Returns:
+        int: Stable offset of the user within the interval, spreading the fetches of a tier over its runs.
+    """
+    return zlib.crc32(username.encode()) % interval
+
+
+class RefreshSchedule:
+    """
+    Activity of each user, deciding which users are fetched at a run, persisted between runs.
+
+    The activity score of a user counts the runs that changed its languages, each one
+    weighing half as much every 4 runs. The score sorts the users into tiers fetched
+    every week, month or quarter; a user that is not fetched at a run is unchanged for
+    that run, and its elo decays accordingly from the one in the store (see `EloRules.decay_runs`).
+    """
+
+    def __init__(self, file_path: Optional[str] = None) -> None:
+        """
+        Args:
+            file_path (Optional[str]): JSON file the schedule is loaded from and saved to (default is in memory only).
+        """
+        self.file_path = file_path
+        self.run = 0
+        # Run and activity score of each user at its last fetch.
+        self.entries: Dict[str, list] = {}
+
+        if file_path and os.path.exists(file_path):
+            schedule = read_json_file(file_path)
+            self.run = schedule["run"]
+            # Schedules written before the elo and flag moved to the store hold them after the score.
+            self.entries = {username: entry[:2] for username, entry in schedule["users"].items()}
+
+    def start_run(self, run: int = None) -> int:
+        """
+        Args:
+            run (int): Number of the run, when resuming it (default is the run after the last one).
+
+        Returns:
+            int: Number of the run starting.
+        """
+        self.run = self.run + 1 if run is None else run
+        return self.run
+
+    def score(self, username: str) -> Optional[float]:
+        """
+        Args:
+            username (str): Username of the user.
+
+        Returns:
+            Optional[float]: Activity score of the user at the current run, None if it was never fetched.
+        """
+        entry = self.entries.get(username)
+        if entry is None:
+            return None
+        fetched_run, score = entry
+        return score * ACTIVITY_DECAY ** (self.run - fetched_run)
+
+    def tier(self, username: str, rank: Optional[int] = None) -> str:
+        """
+        Args:
+            username (str): Username of the user.
+            rank (Optional[int]): Position of the user in the global leaderboard, from 0.
+
+        Returns:
+            str: Refresh tier of the user; users never fetched and top users are weekly.
+        """
+        score = self.score(username)
+        if score is None or score >= WEEKLY_SCORE or (rank is not None and rank < TOP_USERS):
+            return "weekly"
+        if score >= MONTHLY_SCORE:
+            return "monthly"
+        return "quarterly"
+
+    def is_due(self, username: str, tier: str) -> bool:
+        """
+        Args:
+            username (str): Username of the user.
+            tier (str): Refresh tier of the user.
+
+        Returns:
+            bool: Whether the user is fetched at the current run: at its phase in the tier, or
+                when a full interval went by since its last fetch.
+        """
+        interval = TIERS[tier]
+        entry = self.entries.get(username)
+        if entry is None or self.run - entry[0] >= interval:
+            return True
+        return (self.run + refresh_phase(username, interval)) % interval == 0
+
+    def plan(self, usernames: Iterable[str], ranks: Dict[str, int]) -> Tuple[List[str], List[str], Dict[str, int]]:
+        """
+        Split the users into the ones fetched at the current run and the ones skipped.
+
+        Args:
+            usernames (Iterable[str]): Usernames to refresh.
+            ranks (Dict[str, int]): Position of the users in the global leaderboard, from 0.
+
+        Returns:
+            Tuple[List[str], List[str], Dict[str, int]]: Users to fetch and users skipped, in the
+                order of `usernames`, and number of users in each tier.
+        """
+        due, skipped = [], []
+        tiers = dict.fromkeys(TIERS, 0)
+        for username in usernames:
+            tier = self.tier(username, ranks.get(username))
+            tiers[tier] += 1
+            (due if self.is_due(username, tier) else skipped).append(username)
+        return due, skipped, tiers
+
+    def record(self, username: str, user_data: dict) -> None:
+        """
+        Record the fetch of a user at the current run; a user seen for the first time counts as
+        active, so that it stays weekly for 8 runs without change. A user already recorded at the
+        current run, before the run was resumed, is left as it is.
+
+        Args:
+            username (str): Username of the user.
+            user_data (dict): User data written for the user.
+        """
+        if self.entries.get(username, [None])[0] == self.run:
+            return
+        score = self.score(username)
+        score = (1.0 if score is None else score) + bool(user_data["updated"])
+        self.entries[username] = [self.run, round(score, 6)]
+
+    def save(self) -> None:
+        """
+        Write the schedule back to its file, if it has one.
+        """
+        if self.file_path:
+            write_json_file(
+                self.file_path, {"run": self.run, "users": dict(sorted(self.entries.items()))}, compact=True
+            )
@@ -1,28 +1,36 @@
-import os
-import json
+import argparse
+from batch_writer import BatchWriter
+from user_store import UserStore, open_user_store
 
 
-def reset_updated(directory):
+def reset_updated(store: UserStore, directory: str, export: bool = False) -> None:
     """
-    Resets the “updated” value to true for all JSON files in a given directory.
+    Resets the “updated” value to true for all users.
+
+    The flags are kept in a single bitset of the store, so the reset is one small write;
+    the JSON files of the users pick up the new value the next time they are exported.
 
     Args:
+        store (UserStore): Store of the user records.
         directory (str): Path to the directory containing the JSON files.
+        export (bool): Also export the JSON files of the users whose flag changed.
     """
-    for filename in os.listdir(directory):
-        if filename.endswith(".json"):
-            filepath = os.path.join(directory, filename)
-            with open(filepath, "r") as file:
-                data = json.load(file)
-
-            if "updated" in data:
-                data["updated"] = True
-
-            with open(filepath, "w") as file:
-                json.dump(data, file, indent=4)
-            print(f"Reset 'updated' to true in {filename}")
+    changed = store.set_updated(True)
+    store.commit()
+    print(f"Reset 'updated' to true for {len(changed)} user(s)")
+    if export:
+        writer = BatchWriter()
+        store.export_json(directory, changed, writer)
+        print(writer.report())
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reset the 'updated' flag of every user.")
+    parser.add_argument("--export", action="store_true", help="also rewrite the JSON files of the changed users")
+    args = parser.parse_args()
+
     users_directory = "data/users"
-    reset_updated(users_directory)
+    user_store_file = "state/users.sqlite"
+    store = open_user_store(user_store_file, users_directory)
+    reset_updated(store, users_directory, args.export)
+    store.close()
@@ -0,0 +1,155 @@
+import json
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from user_store import UserStore
+
+
+# A run in progress older than this was killed at an earlier weekly run: it is not resumed.
+RUN_MAX_AGE = 24 * 60 * 60
+
+JOURNAL_SCHEMA = """
+-- The run of generate_user_data.py in progress, if any.
+CREATE TABLE IF NOT EXISTS journal_runs (
+    id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    -- Number of the run in the refresh schedule.
+    sequence INTEGER
+);
+-- Users the run in progress is done with, appended in the transaction of their record.
+CREATE TABLE IF NOT EXISTS journal_users (
+    run TEXT NOT NULL REFERENCES journal_runs (id),
+    username TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (run, username)
+) WITHOUT ROWID;
+"""
+
+
+def result_hash(result: dict) -> str:
+    """
+    Args:
+        result (dict): Data written for a user by a run.
+
+    Returns:
+        str: SHA-1 of the canonical JSON of the data.
+    """
+    return hashlib.sha1(json.dumps(result, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class RunJournal:
+    """
+    Append-only journal of the users processed by a run of generate_user_data.py, kept in the user store.
+
+    A user is journaled in the same transaction as its record, so after a crash the store
+    holds the records of exactly the journaled users: the next run resumes the same run,
+    skipping them, and every user gets its elo update once per run. The journal is
+    cleared once the run is complete, or once the run is too old to be resumed.
+    """
+
+    def __init__(self, store: UserStore) -> None:
+        """
+        Args:
+            store (UserStore): Store the users are recorded in.
+        """
+        self.connection = store.connection
+        self.connection.executescript(JOURNAL_SCHEMA)
+        row = self.connection.execute("SELECT id, started_at, sequence FROM journal_runs").fetchone()
+        self.run_id: Optional[str] = None
+        self.started_at: Optional[str] = None
+        self.sequence: Optional[int] = None
+        if row:
+            self.run_id, self.started_at, self.sequence = row
+
+    def begin(self, sequence: Optional[int] = None) -> Dict[str, dict]:
+        """
+        Start a new run, or resume the one in progress.
+
+        Args:
+            sequence (Optional[int]): Number of the new run in the refresh schedule, ignored when resuming.
+
+        Returns:
+            Dict[str, dict]: Hash and result of the users the resumed run is done with, by username.
+        """
+        if self.run_id is None:
+            started_at = datetime.now(timezone.utc)
+            self.run_id = started_at.strftime("%Y-%m-%dT%H%M%S")
+            self.started_at = started_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+            self.sequence = sequence
+            self.connection.execute(
+                "INSERT INTO journal_runs (id, started_at, sequence) VALUES (?, ?, ?)",
+                (self.run_id, self.started_at, self.sequence),
+            )
+            self.connection.commit()
+            return {}
+
+        return self.finished_users()
+
+    def finished_users(self) -> Dict[str, dict]:
+        """
+        Returns:
+            Dict[str, dict]: Hash and result of the users the run in progress is done with, by username.
+        """
+        return {
+            username: dict(json.loads(result), hash=digest)
+            for username, digest, result in self.connection.execute(
+                "SELECT username, hash, result FROM journal_users WHERE run = ?", (self.run_id,)
+            )
+        }
+
+    def end_stale_run(self, max_age: float = RUN_MAX_AGE) -> Dict[str, dict]:
+        """
+        Finish the run in progress if it started more than `max_age` seconds ago, so that
+        `begin` starts a new run instead of resuming one of an earlier week.
+
+        Args:
+            max_age (float): Age in seconds past which the run in progress is not resumed.
+
+        Returns:
+            Dict[str, dict]: Hash and result of the users the stale run was done with, by
+                username; empty if there is no run in progress or if it is recent enough.
+        """
+        if self.run_id is None:
+            return {}
+        started_at = datetime.strptime(self.started_at, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        if (datetime.now(timezone.utc) - started_at).total_seconds() <= max_age:
+            return {}
+        finished = self.finished_users()
+        self.finish()
+        return finished
+
+    def record(self, username: str, written: dict, result: dict) -> None:
+        """
+        Journal a user the run is done with. It is saved by the next commit of the store.
+
+        Args:
+            username (str): Username of the user.
+            written (dict): Data written for the user, whose hash is journaled.
+            result (dict): What the run needs again to complete after a resume.
+        """
+        self.record_many([(username, written, result)])
+
+    def record_many(self, users: List[Tuple[str, dict, dict]]) -> None:
+        """
+        Journal several users the run is done with. They are saved by the next commit of the store.
+
+        Args:
+            users (List[Tuple[str, dict, dict]]): Username, data written and result of each user.
+        """
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO journal_users (run, username, hash, result) VALUES (?, ?, ?, ?)",
+            [
+                (self.run_id, username, result_hash(written), json.dumps(result, separators=(",", ":")))
+                for username, written, result in users
+            ],
+        )
+
+    def finish(self) -> None:
+        """
+        Clear the journal of the complete run.
+        """
+        self.connection.execute("DELETE FROM journal_users WHERE run = ?", (self.run_id,))
+        self.connection.execute("DELETE FROM journal_runs WHERE id = ?", (self.run_id,))
+        self.connection.commit()
+        self.run_id = self.started_at = self.sequence = None
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import bisect
+import cProfile
+import threading
+import contextlib
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List
+from batch_writer import READ_TOTALS, WRITE_TOTALS, write_json_file
+
+
+# Upper bounds, in seconds, of the buckets of the duration histograms.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PERCENTILES = (50, 90, 99)
+# Failures kept in the report, the others are only counted.
+MAX_FAILURES = 1000
+
+
+class RunMetrics:
+    """
+    Stage timings, duration histograms, counters and failures of one run of a script.
+
+    The functions of the pipeline record into the shared `metrics` instance, from any
+    thread; the script saves them as a JSON report at the end of the run.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget everything recorded so far, starting a new run.
+        """
+        self.started_at = datetime.now(timezone.utc)
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.write_start = dict(WRITE_TOTALS)
+        self.read_start = dict(READ_TOTALS)
+        self.stages: List[dict] = []
+        self.stage_path: List[str] = []
+        self.samples: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.failures: List[dict] = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measure the wall and CPU time of a stage; stages started within it are named after it.
+
+        Args:
+            name (str): Name of the stage.
+        """
+        self.stage_path.append(name)
+        path = "/".join(self.stage_path)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            self.stage_path.pop()
+            self.stages.append({
+                "name": path,
+                "wall_seconds": round(time.perf_counter() - wall_start, 6),
+                "cpu_seconds": round(time.process_time() - cpu_start, 6),
+            })
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Add a duration to a histogram.
+
+        Args:
+            name (str): Name of the histogram.
+            seconds (float): Measured duration.
+        """
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """
+        Args:
+            name (str): Name of the counter.
+            amount (int): Amount added to the counter.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def failure(self, username: str, error: Exception) -> None:
+        """
+        Record a user that could not be processed.
+
+        Args:
+            username (str): Username of the user.
+            error (Exception): Error the user failed with.
+        """
+        with self.lock:
+            self.counters["failures"] = self.counters.get("failures", 0) + 1
+            if len(self.failures) < MAX_FAILURES:
+                self.failures.append({"username": username, "error": f"{type(error).__name__}: {error}"})
+
+    def histogram(self, name: str) -> dict:
+        """
+        Args:
+            name (str): Name of the histogram.
+
+        Returns:
+            dict: Count, sum, extremes and percentiles of the durations, and the number of
+                durations up to each bucket bound.
+        """
+        samples = sorted(self.samples.get(name, []))
+        summary = {"count": len(samples), "sum_seconds": round(sum(samples), 6)}
+        if not samples:
+            return summary
+
+        summary["min_seconds"] = round(samples[0], 6)
+        summary["max_seconds"] = round(samples[-1], 6)
+        for percentile in PERCENTILES:
+            # Nearest rank: the smallest duration with at least `percentile` % of the durations up to it.
+            rank = max(1, -(-len(samples) * percentile // 100))
+            summary[f"p{percentile}_seconds"] = round(samples[rank - 1], 6)
+
+        buckets = {f"le_{bound:g}": bisect.bisect_right(samples, bound) for bound in BUCKETS}
+        buckets["le_inf"] = len(samples)
+        summary["buckets"] = buckets
+        return summary
+
+    def report(self) -> dict:
+        """
+        Returns:
+            dict: Report of the run so far.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            counters.update((name, total - self.write_start[name]) for name, total in WRITE_TOTALS.items())
+            counters.update((name, total - self.read_start[name]) for name, total in READ_TOTALS.items())
+            return {
+                "started_at": self.started_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "wall_seconds": round(time.perf_counter() - self.wall_start, 6),
+                "cpu_seconds": round(time.process_time() - self.cpu_start, 6),
+                "stages": list(self.stages),
+                "histograms": {name: self.histogram(name) for name in sorted(self.samples)},
+                "counters": dict(sorted(counters.items())),
+                "failures": list(self.failures),
+            }
+
+    def save(self, report_file: str, script: str, status: str = "ok") -> None:
+        """
+        Save the report of the run in the report file, next to the last report of the other scripts.
+
+        Args:
+            report_file (str): Path to the JSON report file.
+            script (str): Name of the script, under which the report is saved.
+            status (str): Outcome of the run.
+        """
+        reports = {}
+        if os.path.exists(report_file):
+            with open(report_file, "r") as existing_file:
+                reports = json.load(existing_file)
+        reports[script] = dict(self.report(), status=status)
+        write_json_file(report_file, dict(sorted(reports.items())))
+
+
+metrics = RunMetrics()
+
+
+@contextlib.contextmanager
+def instrumented_run(script: str, report_file: str, profile_file: str = None) -> Iterator[RunMetrics]:
+    """
+    Run the body of a script as its top stage, save its report even if it fails, and
+    optionally profile it.
+
+    Args:
+        script (str): Name of the script.
+        report_file (str): Path to the JSON report file.
+        profile_file (str): If given, path of the cProfile statistics of the main thread, for `pstats`.
+
+    Yields:
+        RunMetrics: Metrics of the run.
+    """
+    profiler = cProfile.Profile() if profile_file else None
+    status = "failed"
+    if profiler:
+        profiler.enable()
+    try:
+        with metrics.stage(script):
+            yield metrics
+        status = "ok"
+    finally:
+        if profiler:
+            profiler.disable()
+            os.makedirs(os.path.dirname(profile_file) or ".", exist_ok=True)
+            profiler.dump_stats(profile_file)
+            print(f"Profile written to {profile_file} (python -m pstats {profile_file})")
+        metrics.save(report_file, script, status)
+        print(f"Run report written to {report_file}")
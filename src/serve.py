@@ -0,0 +1,410 @@
+import os
+import json
+import math
+import argparse
+import threading
+import numpy as np
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from typing import Dict, List, Optional, Tuple
+from time_codec import times_to_minutes
+
+
+# Rows returned by a single top or range query, like a page of the site.
+MAX_ROWS = 1000
+
+
+class Board:
+    """
+    One leaderboard as compact arrays sorted by descending score: usernames, scores
+    (elo or minutes) and, for the language boards, the time strings shown by the site.
+    """
+
+    def __init__(self, rows: List[Dict[str, str]], score: str) -> None:
+        """
+        Args:
+            rows (List[Dict[str, str]]): Rows of the leaderboard file.
+            score (str): "elo" for the global leaderboard, "time" for a language leaderboard.
+        """
+        if score == "elo":
+            scores = np.fromiter((row["elo"] for row in rows), dtype=np.int64, count=len(rows))
+        else:
+            scores = np.frombuffer(times_to_minutes(row["time"] for row in rows), dtype=np.int64)
+        order = np.argsort(-scores, kind="stable")
+        self.scores = scores[order]
+        self.ascending = self.scores[::-1].copy()
+        self.usernames = [rows[index]["username"] for index in order.tolist()]
+        self.times = [rows[index]["time"] for index in order.tolist()] if score == "time" else None
+        self.positions = {username: position for position, username in enumerate(self.usernames)}
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+    def rank(self, score: int) -> int:
+        """
+        Args:
+            score (int): Score to rank.
+
+        Returns:
+            int: Competition rank of the score, one more than the number of higher scores.
+        """
+        return len(self.ascending) - int(np.searchsorted(self.ascending, score, side="right")) + 1
+
+    def rows(self, start: int, stop: int) -> List[dict]:
+        """
+        Args:
+            start (int): Position of the first row, from 0.
+            stop (int): Position after the last row.
+
+        Returns:
+            List[dict]: Rank, username and score of the rows.
+        """
+        rows = []
+        for position in range(max(0, start), min(stop, len(self.usernames))):
+            score = int(self.scores[position])
+            row = {"rank": self.rank(score), "username": self.usernames[position]}
+            if self.times is None:
+                row["elo"] = score
+            else:
+                row["time"] = self.times[position]
+                row["minutes"] = score
+            rows.append(row)
+        return rows
+
+    def user(self, username: str) -> Optional[dict]:
+        """
+        Args:
+            username (str): Username to look up.
+
+        Returns:
+            Optional[dict]: Row of the user, with the percentage of users whose score is at most
+                its own, or None if the user is not on the board.
+        """
+        position = self.positions.get(username)
+        if position is None:
+            return None
+        row = self.rows(position, position + 1)[0]
+        at_most = int(np.searchsorted(self.ascending, self.scores[position], side="right"))
+        row["percentile"] = round(100 * at_most / len(self.ascending), 2)
+        return row
+
+    def percentile(self, percentile: float) -> dict:
+        """
+        Args:
+            percentile (float): Percentage of users, between 0 and 100.
+
+        Returns:
+            dict: Smallest score with at least `percentile` % of the users at or below it, and its rank.
+        """
+        index = max(1, math.ceil(len(self.ascending) * percentile / 100)) - 1
+        score = int(self.ascending[index])
+        return {"percentile": percentile, "elo" if self.times is None else "minutes": score, "rank": self.rank(score)}
+
+
+class LeaderboardIndex:
+    """
+    Every leaderboard generated by the pipeline, loaded once and reloaded when its file changes.
+
+    A reload builds the boards whose file changed and swaps in a new dictionary of
+    boards, so that requests being answered keep a consistent view.
+    """
+
+    def __init__(self, global_file: str, language_dir: str) -> None:
+        """
+        Args:
+            global_file (str): Path to the global leaderboard JSON file.
+            language_dir (str): Path to the directory of the language leaderboard JSON files.
+        """
+        self.global_file = global_file
+        self.language_dir = language_dir
+        self.boards: Dict[str, Board] = {}
+        self.mtimes: Dict[str, int] = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def board_files(self) -> Dict[str, Tuple[str, int]]:
+        """
+        Returns:
+            Dict[str, Tuple[str, int]]: Path and modification time of the file of every board, by board name.
+        """
+        files = {}
+        if os.path.exists(self.global_file):
+            files["global"] = (self.global_file, os.stat(self.global_file).st_mtime_ns)
+        if os.path.isdir(self.language_dir):
+            for entry in os.scandir(self.language_dir):
+                if entry.name.endswith(".json"):
+                    files[f"languages/{entry.name[:-5]}"] = (entry.path, entry.stat().st_mtime_ns)
+        return files
+
+    def reload(self) -> int:
+        """
+        Load the boards whose file was added or changed since the last reload, and drop the removed ones.
+
+        Returns:
+            int: Number of boards loaded or dropped.
+        """
+        with self.lock:
+            files = self.board_files()
+            boards = {name: board for name, board in self.boards.items() if name in files}
+            changed = len(self.boards) - len(boards)
+            for name, (path, mtime) in files.items():
+                if self.mtimes.get(name) == mtime and name in boards:
+                    continue
+                try:
+                    with open(path, "r") as board_file:
+                        boards[name] = Board(json.load(board_file), "elo" if name == "global" else "time")
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Failed to load {path}: {e}")
+                    continue
+                self.mtimes[name] = mtime
+                changed += 1
+            if changed:
+                self.boards = boards
+                self.generation += 1
+            return changed
+
+
+class QueryCache:
+    """
+    Encoded responses of the latest queries, dropped when the boards are reloaded.
+    """
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        """
+        Args:
+            max_entries (int): Maximum number of responses kept, the least recently used are evicted first.
+        """
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[int, str], Tuple[int, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple[int, str]) -> Optional[Tuple[int, bytes]]:
+        """
+        Args:
+            key (Tuple[int, str]): Generation of the boards and request path.
+
+        Returns:
+            Optional[Tuple[int, bytes]]: Status and body of the cached response, if any.
+        """
+        with self.lock:
+            response = self.entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def put(self, key: Tuple[int, str], response: Tuple[int, bytes]) -> None:
+        """
+        Args:
+            key (Tuple[int, str]): Generation of the boards and request path.
+            response (Tuple[int, bytes]): Status and body of the response.
+        """
+        with self.lock:
+            if self.entries and next(iter(self.entries))[0] != key[0]:
+                self.entries.clear()
+            self.entries[key] = response
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class QueryError(Exception):
+    """
+    Raised when a query cannot be answered, with the HTTP status to answer it with.
+    """
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def int_param(query: Dict[str, List[str]], name: str, default: int = None) -> int:
+    """
+    Args:
+        query (Dict[str, List[str]]): Query parameters of the request.
+        name (str): Name of the parameter.
+        default (int): Value of the parameter when it is missing (default is to require it).
+
+    Returns:
+        int: Value of the parameter.
+
+    Raises:
+        QueryError: If the parameter is missing or not an integer.
+    """
+    values = query.get(name)
+    if not values:
+        if default is None:
+            raise QueryError(400, f"missing parameter: {name}")
+        return default
+    try:
+        return int(values[0])
+    except ValueError:
+        raise QueryError(400, f"parameter {name} is not an integer: {values[0]}")
+
+
+def answer(index: LeaderboardIndex, path: str, query: Dict[str, List[str]]) -> dict:
+    """
+    Answer a query on the leaderboards.
+
+    Args:
+        index (LeaderboardIndex): Loaded leaderboards.
+        path (str): Path of the request: /api/boards, or /api/<board>/top, rank, range or percentile.
+        query (Dict[str, List[str]]): Query parameters of the request.
+
+    Returns:
+        dict: Response to the query.
+
+    Raises:
+        QueryError: If the board, the user or the query does not exist, or a parameter is invalid.
+    """
+    boards = index.boards
+    if path == "/api/boards":
+        return {"generation": index.generation, "boards": {name: len(board) for name, board in sorted(boards.items())}}
+
+    board_name, _, kind = path[len("/api/"):].rpartition("/")
+    board = boards.get(board_name) if path.startswith("/api/") else None
+    if board is None:
+        raise QueryError(404, f"unknown board: {board_name}")
+
+    if kind == "top":
+        k = min(int_param(query, "k", 100), MAX_ROWS)
+        return {"board": board_name, "total": len(board), "rows": board.rows(0, k)}
+    if kind == "range":
+        start = max(1, int_param(query, "from"))
+        stop = min(int_param(query, "to"), start + MAX_ROWS - 1)
+        return {"board": board_name, "total": len(board), "rows": board.rows(start - 1, stop)}
+    if kind == "rank":
+        username = query.get("user", [""])[0]
+        row = board.user(username)
+        if row is None:
+            raise QueryError(404, f"user not on {board_name}: {username}")
+        return dict(row, board=board_name, total=len(board))
+    if kind == "percentile":
+        try:
+            percentile = float(query.get("p", ["50"])[0])
+        except ValueError:
+            raise QueryError(400, f"parameter p is not a number: {query['p'][0]}")
+        if not 0 <= percentile <= 100 or not len(board):
+            raise QueryError(400, f"percentile out of range: {percentile}")
+        return dict(board.percentile(percentile), board=board_name, total=len(board))
+    raise QueryError(404, f"unknown query: {kind}")
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Answer the queries of the local leaderboard API, from the cache when possible.
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in a single write: separate small writes wait for delayed ACKs.
+    wbufsize = 64 * 1024
+
+    def do_GET(self) -> None:
+        index = self.server.index
+        key = (index.generation, self.path)
+        response = self.server.cache.get(key)
+        if response is None:
+            url = urlparse(self.path)
+            try:
+                response = (200, json.dumps(answer(index, unquote(url.path), parse_qs(url.query))).encode())
+            except QueryError as e:
+                response = (e.status, json.dumps({"error": str(e)}).encode())
+            self.server.cache.put(key, response)
+
+        status, body = response
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class QueryServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server of the leaderboard API.
+    """
+    daemon_threads = True
+    # Clients connecting at once beyond the default backlog of 5 would wait for a SYN retry.
+    request_queue_size = 128
+
+
+def watch(index: LeaderboardIndex, interval: float, stop: threading.Event) -> None:
+    """
+    Reload the boards every `interval` seconds until `stop` is set.
+
+    Args:
+        index (LeaderboardIndex): Leaderboards to keep up to date.
+        interval (float): Seconds between two checks of the files.
+        stop (threading.Event): Event ending the watch.
+    """
+    while not stop.wait(interval):
+        changed = index.reload()
+        if changed:
+            print(f"Reloaded {changed} board(s), generation {index.generation}")
+
+
+def start_server(
+    index: LeaderboardIndex,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    cache_size: int = 10000,
+    reload_interval: float = 2.0
+) -> QueryServer:
+    """
+    Load the leaderboards and serve them in background threads.
+
+    Args:
+        index (LeaderboardIndex): Leaderboards to serve.
+        host (str): Address to listen on.
+        port (int): Port to listen on (0 for a free port).
+        cache_size (int): Maximum number of responses cached.
+        reload_interval (float): Seconds between two checks of the files for changes.
+
+    Returns:
+        QueryServer: Running server; `server.stop` ends the watch of the files.
+    """
+    index.reload()
+    server = QueryServer((host, port), QueryHandler)
+    server.index = index
+    server.cache = QueryCache(cache_size)
+    server.stop = threading.Event()
+    threading.Thread(target=watch, args=(index, reload_interval, server.stop), daemon=True).start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    """
+    Serve top-K, rank, range and percentile queries on the generated leaderboards over a local HTTP API.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument("--cache-size", type=int, default=10000, help="responses cached (default: 10000)")
+    parser.add_argument(
+        "--reload-interval", type=float, default=2.0, help="seconds between two checks for new files (default: 2)"
+    )
+    args = parser.parse_args()
+
+    global_file: str = "data/global_leaderboard.json"
+    language_dir: str = "data/languages"
+
+    index = LeaderboardIndex(global_file, language_dir)
+    server = start_server(index, args.host, args.port, args.cache_size, args.reload_interval)
+    host, port = server.server_address[:2]
+    print(f"Serving {len(index.boards)} boards on http://{host}:{port}/api/boards")
+    try:
+        server.stop.wait()
+    except KeyboardInterrupt:
+        server.stop.set()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import os
+import heapq
+import shutil
+import hashlib
+import argparse
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterable, List, Tuple
+from batch_writer import read_json_file, write_json_file
+from fetch_scheduler import RetryQueue
+from generate_leaderboards import aggregate_user_data
+from http_cache import ResponseCache
+from refresh_schedule import RefreshSchedule
+
+
+# Files of the working directory of a shard.
+STORE_FILE = "users.sqlite"
+RETRY_QUEUE_FILE = "retry_queue.json"
+CACHE_FILE = "http_cache.json"
+SCHEDULE_FILE = "refresh_schedule.json"
+# Written last: the shard is done once it exists.
+PARTIAL_FILE = "partial.json"
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Args:
+        spec (str): Shard as "I/N", the I-th of N shards, from 1.
+
+    Returns:
+        Tuple[int, int]: Index of the shard, from 1, and number of shards.
+
+    Raises:
+        argparse.ArgumentTypeError: If the shard is not of that form.
+    """
+    index, _, count = spec.partition("/")
+    if not (index.isdigit() and count.isdigit() and 1 <= int(index) <= int(count)):
+        raise argparse.ArgumentTypeError(f"shard must be I/N with 1 <= I <= N: {spec}")
+    return int(index), int(count)
+
+
+def shard_of(username: str, count: int) -> int:
+    """
+    The hash differs from the one of `refresh_phase`, so that each shard gets its part of every
+    refresh phase rather than all the users of one phase.
+
+    Args:
+        username (str): Username of the user.
+        count (int): Number of shards.
+
+    Returns:
+        int: Shard of the user, from 1, the same on every machine and every run.
+    """
+    return int.from_bytes(hashlib.md5(username.encode()).digest()[:8], "big") % count + 1
+
+
+def shard_dir(shards_dir: str, index: int, count: int) -> str:
+    """
+    Args:
+        shards_dir (str): Path to the directory of the shards.
+        index (int): Index of the shard, from 1.
+        count (int): Number of shards.
+
+    Returns:
+        str: Path to the working directory of the shard.
+    """
+    return os.path.join(shards_dir, f"{index}-of-{count}")
+
+
+def prepare_shard(
+    directory: str,
+    index: int,
+    count: int,
+    user_store_file: str,
+    retry_queue_file: str,
+    cache_file: str,
+    cache_size: int,
+    schedule_file: str
+) -> None:
+    """
+    Create the working directory of a shard: a copy of the user store, and the part of the
+    retry queue, response cache and refresh schedule of the users of the shard. The shared
+    files are only read, so the shards run at the same time, on one machine or several.
+
+    An existing directory is the one of an interrupted shard, which resumes from it as it is.
+
+    Args:
+        directory (str): Path to the working directory of the shard.
+        index (int): Index of the shard, from 1.
+        count (int): Number of shards.
+        user_store_file (str): Path to the SQLite database of the user store.
+        retry_queue_file (str): Path to the JSON file of the retry queue.
+        cache_file (str): Path to the JSON file of the response cache.
+        cache_size (int): Maximum number of users kept in the response cache.
+        schedule_file (str): Path to the JSON file of the refresh schedule.
+    """
+    if os.path.exists(os.path.join(directory, STORE_FILE)):
+        return
+    os.makedirs(directory, exist_ok=True)
+
+    retry_queue = RetryQueue(retry_queue_file)
+    retry_queue.entries = {username: entry for username, entry in retry_queue.entries.items()
+                           if shard_of(username, count) == index}
+    retry_queue.file_path = os.path.join(directory, RETRY_QUEUE_FILE)
+    retry_queue.save()
+
+    cache = ResponseCache(cache_file, cache_size)
+    cache.entries = {username: entry for username, entry in cache.entries.items() if shard_of(username, count) == index}
+    cache.file_path = os.path.join(directory, CACHE_FILE)
+    cache.save()
+
+    schedule = RefreshSchedule(schedule_file)
+    schedule.entries = {username: entry for username, entry in schedule.entries.items()
+                        if shard_of(username, count) == index}
+    schedule.file_path = os.path.join(directory, SCHEDULE_FILE)
+    schedule.save()
+
+    # Copied last, as the copy marks the directory as ready.
+    if os.path.exists(user_store_file):
+        store_copy = os.path.join(directory, STORE_FILE)
+        shutil.copyfile(user_store_file, store_copy + ".tmp")
+        os.replace(store_copy + ".tmp", store_copy)
+
+
+def write_partial(
+    directory: str,
+    run_id: str,
+    started_at: str,
+    records: Iterable[Tuple[str, dict]],
+    changeset: Dict[str, dict],
+    snapshot: Dict[str, list]
+) -> None:
+    """
+    Write what the merge needs from a shard that is done: the records of its users, its
+    changes and elo inputs, and its part of the language and global aggregates.
+
+    Args:
+        directory (str): Path to the working directory of the shard.
+        run_id (str): Name of the run of the shard.
+        started_at (str): Time the run of the shard started at.
+        records (Iterable[Tuple[str, dict]]): Username and user data of every user of the shard, ordered by username.
+        changeset (Dict[str, dict]): Changes of the run, by username.
+        snapshot (Dict[str, list]): Inputs of the elo rules of the run, by username.
+    """
+    records = dict(records)
+    language_data, users = aggregate_user_data(records.items())
+    write_json_file(os.path.join(directory, PARTIAL_FILE), {
+        "run_id": run_id,
+        "started_at": started_at,
+        "records": records,
+        "changeset": changeset,
+        "snapshot": snapshot,
+        "languages": {
+            language: [[username, minutes, time] for username, (minutes, time) in language_users.items()]
+            for language, language_users in sorted(language_data.items())
+        },
+        "users": [[user["username"], user["elo"]] for user in users],
+    }, compact=True)
+
+
+def load_partials(shards_dir: str, count: int) -> List[dict]:
+    """
+    Args:
+        shards_dir (str): Path to the directory of the shards.
+        count (int): Number of shards.
+
+    Returns:
+        List[dict]: Output of every shard, in the order of the shards.
+
+    Raises:
+        ValueError: If some shards are not done.
+    """
+    paths = [os.path.join(shard_dir(shards_dir, index, count), PARTIAL_FILE) for index in range(1, count + 1)]
+    missing = [str(index) for index, path in enumerate(paths, 1) if not os.path.exists(path)]
+    if missing:
+        raise ValueError(f"Shard(s) {', '.join(missing)} of {count} not done in {shards_dir}")
+
+    return [read_json_file(path) for path in paths]
+
+
+def merge_aggregates(
+    partials: List[dict]
+) -> Tuple[DefaultDict[str, Dict[str, Tuple[int, str]]], List[Dict[str, str]]]:
+    """
+    Merge the partial aggregates of the shards into the ones of all the users.
+
+    The entries of each shard are ordered by username, and the shards hold different users,
+    so a k-way merge of every language and of the users gives the aggregates in the order
+    `aggregate_user_data` builds them in over all the users, which the ties of the
+    leaderboards keep.
+
+    Args:
+        partials (List[dict]): Output of every shard.
+
+    Returns:
+        Tuple[DefaultDict[str, Dict[str, Tuple[int, str]]], List[Dict[str, str]]]:
+            Minutes and time string of the users by language, and the list of users with their elo.
+    """
+    language_data: DefaultDict[str, Dict[str, Tuple[int, str]]] = defaultdict(dict)
+    for language in sorted({language for partial in partials for language in partial["languages"]}):
+        entries = heapq.merge(*(partial["languages"].get(language, []) for partial in partials))
+        language_data[language] = {username: (minutes, time) for username, minutes, time in entries}
+
+    users = [
+        {"username": username, "elo": elo} for username, elo in heapq.merge(*(partial["users"] for partial in partials))
+    ]
+    return language_data, users
+
+
+def merge_shard_state(
+    directories: List[str],
+    retry_queue_file: str,
+    cache_file: str,
+    cache_size: int,
+    schedule_file: str
+) -> None:
+    """
+    Replace the retry queue, response cache and refresh schedule by the union of the parts of the shards.
+
+    Args:
+        directories (List[str]): Paths to the working directories of every shard.
+        retry_queue_file (str): Path to the JSON file of the retry queue.
+        cache_file (str): Path to the JSON file of the response cache.
+        cache_size (int): Maximum number of users kept in the response cache.
+        schedule_file (str): Path to the JSON file of the refresh schedule.
+    """
+    retry_queue = RetryQueue(retry_queue_file)
+    cache = ResponseCache(cache_file, cache_size)
+    schedule = RefreshSchedule(schedule_file)
+    retry_queue.entries, cache.entries, schedule.entries = {}, {}, {}
+
+    for directory in directories:
+        retry_queue.entries.update(RetryQueue(os.path.join(directory, RETRY_QUEUE_FILE)).entries)
+        cache.entries.update(ResponseCache(os.path.join(directory, CACHE_FILE)).entries)
+        shard_schedule = RefreshSchedule(os.path.join(directory, SCHEDULE_FILE))
+        schedule.entries.update(shard_schedule.entries)
+        schedule.run = max(schedule.run, shard_schedule.run)
+
+    retry_queue.save()
+    cache.save()
+    schedule.save()
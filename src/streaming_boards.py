@@ -0,0 +1,287 @@
+import os
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from batch_writer import BatchWriter, iter_json_array, read_json_array
+from board_pages import BoardPageWriter, write_streamed_manifest
+from generate_global_leaderboard import add_user_elo
+from generate_language_data import add_user_languages, create_directory, write_language_list
+from run_metrics import metrics
+from streaming_sort import RUN_SIZE, ExternalSorter, TopK
+from time_codec import time_to_minutes
+
+
+def write_streamed_board(
+    name: str,
+    rows: Iterable[dict],
+    output_file: str,
+    pages_dir: Optional[str],
+    writer: BatchWriter
+) -> Optional[dict]:
+    """
+    Write a leaderboard file and its pages from its rows in rank order, in a single pass.
+
+    Args:
+        name (str): Name of the board in the pages (e.g. "global" or "languages/Python").
+        rows (Iterable[dict]): Rows of the leaderboard, in rank order.
+        output_file (str): Path to the JSON file of the board.
+        pages_dir (Optional[str]): Path to the directory of the pages, if the board is paginated.
+        writer (BatchWriter): Writer of the files.
+
+    Returns:
+        Optional[dict]: Manifest entry of the board, if it is paginated.
+    """
+    if pages_dir is None:
+        writer.write_stream(output_file, iter_json_array(rows))
+        return None
+    pages = BoardPageWriter(name, pages_dir, writer)
+
+    def paged_rows() -> Iterator[dict]:
+        for row in rows:
+            pages.add(row)
+            yield row
+
+    writer.write_stream(output_file, iter_json_array(paged_rows()))
+    return pages.close()
+
+
+def read_users(
+    records: Iterable[Tuple[str, dict]],
+    entries: ExternalSorter,
+    add_ranked: Callable[[tuple], None]
+) -> Set[str]:
+    """
+    Add the language entries of every user to a sort by language and username, and its elo
+    to the global leaderboard.
+
+    Args:
+        records (Iterable[Tuple[str, dict]]): Username and user data of every user, in any order.
+        entries (ExternalSorter): Sort the language entries are added to.
+        add_ranked (Callable[[tuple], None]): Adds an entry to the ranked boards, see `ranked_language_entries`.
+
+    Returns:
+        Set[str]: Languages of the users.
+    """
+    languages = set()
+    users = 0
+    for username, user_data in records:
+        user_languages: Dict[str, Dict[str, Tuple[int, str]]] = defaultdict(dict)
+        add_user_languages(user_languages, username, user_data)
+        user_elo: list = []
+        add_user_elo(user_elo, username, user_data)
+        users += 1
+
+        # Entry of the store: language, username, then 1 to come after the entry of the file.
+        for language, language_users in user_languages.items():
+            minutes, time = language_users[username]
+            entries.add((language, username, 1, minutes, time))
+            languages.add(language)
+        # The global leaderboard is not merged with its file: ties are ordered by username.
+        add_ranked((1, "", -user_elo[0]["elo"], 0, username, None))
+    print(f"{users} user(s) streamed")
+    return languages
+
+
+def ranked_language_entries(
+    entries: ExternalSorter,
+    languages: Set[str],
+    language_data_dir: str
+) -> Iterator[tuple]:
+    """
+    Merge the language entries of the users with the existing language files, the way
+    `merge_and_sort_users` does: a user keeps its position in the file, with its new time
+    if it still has the language, and the users new to a language come after the others.
+
+    The existing file of every language goes into the sort of the entries, as one more run
+    of entries, so that the entries of each user and language come out next to each other.
+
+    Args:
+        entries (ExternalSorter): Sort of the language entries of the users, from `read_users`.
+        languages (Set[str]): Languages of the entries.
+        language_data_dir (str): Path to the directory of the language JSON files.
+
+    Yields:
+        tuple: Entry of a user in a ranked board: 0 and the language (1 and "" for the global
+            leaderboard), minutes (or elo) negated, position in the previous board, username
+            and time; the boards rank their users in the order of their entries.
+    """
+    sizes = {}
+    for language in sorted(languages):
+        sanitized_language = language.replace(" ", "_").replace("/", "_")
+        output_path = os.path.join(language_data_dir, f"{sanitized_language}.json")
+        sizes[language] = 0
+        if os.path.exists(output_path):
+            # Entry of the file: language, username, then 0, position and time in the file.
+            for position, user in enumerate(read_json_array(output_path)):
+                entries.add((language, user["username"], 0, position, user["time"]))
+                sizes[language] = position + 1
+
+    for (language, username), user_entries in groupby(entries, key=itemgetter(0, 1)):
+        file_entry = store_entry = None
+        for entry in user_entries:
+            if entry[2] == 0:
+                file_entry = entry
+            else:
+                store_entry = entry
+        position = sizes[language] if file_entry is None else file_entry[3]
+        if store_entry is None:
+            yield 0, language, -time_to_minutes(file_entry[4]), position, username, file_entry[4]
+        else:
+            yield 0, language, -store_entry[3], position, username, store_entry[4]
+
+
+def write_ranked_boards(
+    boards: Iterable[Tuple[Tuple[int, str], Iterable[tuple]]],
+    language_data_dir: str,
+    language_data_list: str,
+    global_leaderboard_file: str,
+    pages_dir: Optional[str],
+    writer: BatchWriter
+) -> Dict[str, dict]:
+    """
+    Write the language leaderboards, the language list and the global leaderboard from their ranked entries.
+
+    Args:
+        boards (Iterable[Tuple[Tuple[int, str], Iterable[tuple]]]): Kind and language of every board,
+            with its entries in rank order, ordered by kind and language.
+        language_data_dir (str): Path to the directory of the language JSON files.
+        language_data_list (str): Path to the JSON file listing the languages.
+        global_leaderboard_file (str): Path to the global leaderboard JSON file.
+        pages_dir (Optional[str]): Path to the directory of the paginated leaderboards, if they are paginated.
+        writer (BatchWriter): Writer of the files.
+
+    Returns:
+        Dict[str, dict]: Manifest entries of the boards written, by board name, if they are paginated.
+    """
+    create_directory(language_data_dir)
+    manifest_entries = {}
+    language_list: List[str] = []
+    for (kind, language), board_entries in boards:
+        if kind == 0:
+            sanitized_language = language.replace(" ", "_").replace("/", "_")
+            language_list.append(language)
+            manifest_entries[f"languages/{sanitized_language}"] = write_streamed_board(
+                f"languages/{sanitized_language}",
+                ({"username": username, "time": time} for _, _, _, _, username, time in board_entries),
+                os.path.join(language_data_dir, f"{sanitized_language}.json"),
+                pages_dir,
+                writer,
+            )
+        else:
+            manifest_entries["global"] = write_streamed_board(
+                "global",
+                ({"username": username, "elo": -elo} for _, _, elo, _, username, _ in board_entries),
+                global_leaderboard_file,
+                pages_dir,
+                writer,
+            )
+    if "global" not in manifest_entries:
+        manifest_entries["global"] = write_streamed_board("global", [], global_leaderboard_file, pages_dir, writer)
+    print(f"Data for {len(language_list)} language(s) written to {language_data_dir}")
+    print(f"Global leaderboard written to {global_leaderboard_file}")
+    write_language_list(dict.fromkeys(language_list), language_data_list, writer)
+    return manifest_entries
+
+
+def stream_leaderboards(
+    records: Iterable[Tuple[str, dict]],
+    language_data_dir: str,
+    language_data_list: str,
+    global_leaderboard_file: str,
+    pages_dir: str,
+    run_size: int = RUN_SIZE,
+    spill_dir: Optional[str] = None
+) -> None:
+    """
+    Rebuild the language leaderboards, the language list, the global leaderboard and their
+    pages in a single pass over the users, in memory that does not grow with the number of users.
+
+    The language entries of the users are merged with the existing language files by an
+    external sort (see `ranked_language_entries`), then ranked by a second one along with
+    the elo of the users, and the ranked boards are streamed to their files and pages. The
+    files are the ones `generate_leaderboards` writes without a changeset.
+
+    Args:
+        records (Iterable[Tuple[str, dict]]): Username and user data of every user, in any order.
+        language_data_dir (str): Path to the directory of the language JSON files.
+        language_data_list (str): Path to the JSON file listing the languages.
+        global_leaderboard_file (str): Path to the global leaderboard JSON file.
+        pages_dir (str): Path to the directory of the paginated leaderboards.
+        run_size (int): Entries held in memory by each sort before they are spilled to disk.
+        spill_dir (Optional[str]): Directory of the spilled runs (default is the system temporary directory).
+    """
+    writer = BatchWriter(batch_size=100)
+    with ExternalSorter(run_size, spill_dir) as entries, ExternalSorter(run_size, spill_dir) as ranks:
+        with metrics.stage("read users"):
+            languages = read_users(records, entries, ranks.add)
+        with metrics.stage("merge languages"):
+            for entry in ranked_language_entries(entries, languages, language_data_dir):
+                ranks.add(entry)
+            spilled_runs = len(entries.runs) + len(ranks.runs)
+            metrics.count("spilled_runs", spilled_runs)
+            print(f"{spilled_runs} sorted run(s) spilled to disk")
+
+        with metrics.stage("leaderboards"):
+            manifest_entries = write_ranked_boards(
+                groupby(ranks, key=itemgetter(0, 1)),
+                language_data_dir,
+                language_data_list,
+                global_leaderboard_file,
+                pages_dir,
+                writer,
+            )
+
+    with metrics.stage("pages"):
+        write_streamed_manifest(manifest_entries, pages_dir, writer)
+    print(writer.report())
+
+
+def stream_top_boards(
+    records: Iterable[Tuple[str, dict]],
+    language_data_dir: str,
+    top: int,
+    top_dir: str,
+    run_size: int = RUN_SIZE,
+    spill_dir: Optional[str] = None
+) -> None:
+    """
+    Write the first `top` rows of every leaderboard of `stream_leaderboards` to a directory
+    of their own, with a heap per board instead of the second external sort.
+
+    The complete boards, their pages and the manifest are not touched: `top_dir` gets its own
+    "languages" directory, "languages.json" and "global_leaderboard.json".
+
+    Args:
+        records (Iterable[Tuple[str, dict]]): Username and user data of every user, in any order.
+        language_data_dir (str): Path to the directory of the complete language JSON files.
+        top (int): Number of rows kept in every board.
+        top_dir (str): Path to the directory the top rows are written to.
+        run_size (int): Entries held in memory before they are spilled to disk.
+        spill_dir (Optional[str]): Directory of the spilled runs (default is the system temporary directory).
+    """
+    boards: Dict[Tuple[int, str], TopK] = defaultdict(lambda: TopK(top))
+
+    def add_ranked(entry: tuple) -> None:
+        boards[entry[:2]].add(entry)
+
+    writer = BatchWriter(batch_size=100)
+    with ExternalSorter(run_size, spill_dir) as entries:
+        with metrics.stage("read users"):
+            languages = read_users(records, entries, add_ranked)
+        with metrics.stage("merge languages"):
+            for entry in ranked_language_entries(entries, languages, language_data_dir):
+                add_ranked(entry)
+            metrics.count("spilled_runs", len(entries.runs))
+            print(f"{len(entries.runs)} sorted run(s) spilled to disk, top {top} kept in every board")
+
+    with metrics.stage("leaderboards"):
+        write_ranked_boards(
+            sorted(boards.items()),
+            os.path.join(top_dir, "languages"),
+            os.path.join(top_dir, "languages.json"),
+            os.path.join(top_dir, "global_leaderboard.json"),
+            None,
+            writer,
+        )
+    print(writer.report())
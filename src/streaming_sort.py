@@ -0,0 +1,173 @@
+import os
+import heapq
+import pickle
+import shutil
+import tempfile
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional
+from batch_writer import READ_TOTALS
+
+
+# Items held in memory before a sorted run is spilled to disk.
+RUN_SIZE = 200000
+# Runs merged at once; more runs than this are first merged into longer runs.
+MERGE_FAN_IN = 64
+# Items per pickled block of a run file, the unit the merge reads back.
+BLOCK_SIZE = 1024
+
+
+class ExternalSorter:
+    """
+    Sort of more items than fit in memory.
+
+    Items are added one at a time; every `run_size` items, the ones held in memory are
+    sorted and spilled to a run file. Iterating merges the runs with a k-way merge, which
+    only holds one block of each run in memory, so the memory used does not depend on the
+    number of items. Items are tuples, compared as such.
+    """
+
+    def __init__(self, run_size: int = RUN_SIZE, spill_dir: Optional[str] = None) -> None:
+        """
+        Args:
+            run_size (int): Items held in memory before they are spilled to a run file.
+            spill_dir (Optional[str]): Directory of the run files (default is the system temporary directory).
+        """
+        self.run_size = run_size
+        self.spill_dir = spill_dir
+        self.buffer: List[tuple] = []
+        self.runs: List[str] = []
+        self.directory: Optional[str] = None
+        self.items = 0
+
+    def add(self, item: tuple) -> None:
+        """
+        Args:
+            item (tuple): Item to sort.
+        """
+        self.buffer.append(item)
+        self.items += 1
+        if len(self.buffer) >= self.run_size:
+            self.buffer.sort()
+            self.runs.append(self.write_run(self.buffer))
+            self.buffer = []
+
+    def write_run(self, items: Iterable[tuple]) -> str:
+        """
+        Args:
+            items (Iterable[tuple]): Sorted items.
+
+        Returns:
+            str: Path to the run file holding the items, in blocks of `BLOCK_SIZE`.
+        """
+        if self.directory is None:
+            os.makedirs(self.spill_dir or tempfile.gettempdir(), exist_ok=True)
+            self.directory = tempfile.mkdtemp(prefix="external_sort_", dir=self.spill_dir)
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix=".run")
+        items = iter(items)
+        with os.fdopen(fd, "wb") as run_file:
+            while True:
+                block = list(islice(items, BLOCK_SIZE))
+                if not block:
+                    break
+                pickle.dump(block, run_file, pickle.HIGHEST_PROTOCOL)
+        return path
+
+    @staticmethod
+    def read_run(path: str) -> Iterator[tuple]:
+        """
+        Args:
+            path (str): Path to a run file.
+
+        Yields:
+            tuple: Items of the run, in order, one block in memory at a time.
+        """
+        READ_TOTALS["files_read"] += 1
+        with open(path, "rb") as run_file:
+            while True:
+                position = run_file.tell()
+                try:
+                    block = pickle.load(run_file)
+                except EOFError:
+                    return
+                READ_TOTALS["bytes_read"] += run_file.tell() - position
+                yield from block
+
+    def __iter__(self) -> Iterator[tuple]:
+        """
+        Yields:
+            tuple: Every item added, in ascending order.
+        """
+        self.buffer.sort()
+        if not self.runs:
+            yield from self.buffer
+            return
+
+        while len(self.runs) > MERGE_FAN_IN:
+            merged = self.runs[:MERGE_FAN_IN]
+            self.runs = self.runs[MERGE_FAN_IN:] + [self.write_run(heapq.merge(*map(self.read_run, merged)))]
+            for path in merged:
+                os.remove(path)
+        yield from heapq.merge(*map(self.read_run, self.runs), self.buffer)
+
+    def close(self) -> None:
+        """
+        Remove the run files.
+        """
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory = None
+        self.runs = []
+        self.buffer = []
+
+    def __enter__(self) -> "ExternalSorter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ReversedItem:
+    """
+    Item compared the other way around, so that the smallest items of a heap are its largest ones.
+    """
+
+    __slots__ = ("item",)
+
+    def __init__(self, item: Any) -> None:
+        self.item = item
+
+    def __lt__(self, other: "ReversedItem") -> bool:
+        return other.item < self.item
+
+
+class TopK:
+    """
+    The `k` smallest items of a stream, in a heap of `k` items whose root is the largest of them.
+    """
+
+    def __init__(self, k: int) -> None:
+        """
+        Args:
+            k (int): Number of items kept.
+        """
+        self.k = k
+        self.heap: List[ReversedItem] = []
+        self.items = 0
+
+    def add(self, item: tuple) -> None:
+        """
+        Args:
+            item (tuple): Item of the stream, kept if it is among the `k` smallest so far.
+        """
+        self.items += 1
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, ReversedItem(item))
+        elif item < self.heap[0].item:
+            heapq.heapreplace(self.heap, ReversedItem(item))
+
+    def __iter__(self) -> Iterator[tuple]:
+        """
+        Yields:
+            tuple: The `k` smallest items, in ascending order.
+        """
+        return iter(sorted(entry.item for entry in self.heap))
@@ -0,0 +1,225 @@
+import time
+from html.parser import HTMLParser
+from xml.parsers import expat
+from typing import Dict, Iterator, List, Optional, Union
+from run_metrics import metrics
+
+
+class LanguageNameScanner:
+    """
+    Event handler picking the `lang-name` texts out of a compact WakaTime card.
+
+    It gives the same result as `soup.find_all("g", {"transform": True})` followed by
+    `g.find("text", {"data-testid": "lang-name"}).get_text(strip=True)`, without
+    building a tree: every open `<g transform>` still waiting for its first language
+    name is remembered, and the texts are released in the order the groups start.
+    """
+
+    def __init__(self) -> None:
+        # Open elements, as (tag, slot of the group or None) pairs.
+        self.open_tags: List[tuple] = []
+        # Text of each `<g transform>` in start order: None while pending, False without one.
+        self.slots: List[Union[None, bool, str]] = []
+        self.waiting: List[int] = []
+        self.released = 0
+        # Strings of the `lang-name` text being read, and the groups it belongs to.
+        self.capture: Optional[List[str]] = None
+        self.capture_depth = 0
+        self.capture_slots: List[int] = []
+        self.buffer: List[str] = []
+
+    def start(self, tag: str, attrs: Dict[str, str]) -> None:
+        """
+        Args:
+            tag (str): Lowercase tag name.
+            attrs (Dict[str, str]): Attributes of the element.
+        """
+        self.flush()
+        slot = None
+        if tag == "g" and "transform" in attrs:
+            slot = len(self.slots)
+            self.slots.append(None)
+            self.waiting.append(slot)
+        elif tag == "text" and self.capture is None and self.waiting and attrs.get("data-testid") == "lang-name":
+            self.capture = []
+            self.capture_depth = len(self.open_tags)
+            self.capture_slots = self.waiting
+            self.waiting = []
+        self.open_tags.append((tag, slot))
+
+    def end(self, tag: str) -> None:
+        """
+        Close the most recent open element named `tag` and every element opened after it.
+
+        Args:
+            tag (str): Lowercase tag name.
+        """
+        self.flush()
+        for depth in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[depth][0] == tag:
+                break
+        else:
+            return
+
+        while len(self.open_tags) > depth:
+            _, slot = self.open_tags.pop()
+            if self.capture is not None and len(self.open_tags) == self.capture_depth:
+                text = "".join(self.capture)
+                for captured in self.capture_slots:
+                    self.slots[captured] = text
+                self.capture = None
+            if slot is not None and self.slots[slot] is None:
+                self.slots[slot] = False
+                self.waiting.remove(slot)
+
+    def data(self, text: str) -> None:
+        """
+        Args:
+            text (str): Character data.
+        """
+        if self.capture is not None:
+            self.buffer.append(text)
+
+    def flush(self) -> None:
+        """
+        End the current string, the way a tag or a comment separates two strings in the tree.
+        """
+        if self.buffer:
+            text = "".join(self.buffer).strip()
+            if text:
+                self.capture.append(text)
+            self.buffer = []
+
+    def close(self) -> None:
+        """
+        Close every element left open at the end of the document.
+        """
+        if self.open_tags:
+            self.end(self.open_tags[0][0])
+
+    def release(self) -> Iterator[Dict[str, str]]:
+        """
+        Yield the records of the groups whose outcome is known, in start order.
+
+        Yields:
+            Dict[str, str]: Record with the "language" and "time" keys.
+        """
+        while self.released < len(self.slots) and self.slots[self.released] is not None:
+            text = self.slots[self.released]
+            self.released += 1
+            if text is not False:
+                lang_name, time = text.split(" - ")
+                yield {"language": lang_name, "time": time}
+
+
+class LanguageNameHTMLParser(HTMLParser):
+    """
+    Lenient tokenizer feeding a `LanguageNameScanner`, used for cards that are not well-formed XML.
+    """
+
+    def __init__(self, scanner: LanguageNameScanner) -> None:
+        super().__init__(convert_charrefs=True)
+        self.scanner = scanner
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        self.scanner.start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        self.handle_starttag(tag, attrs)
+        self.scanner.end(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        self.scanner.end(tag)
+
+    def handle_data(self, data: str) -> None:
+        self.scanner.data(data)
+
+    def handle_comment(self, data: str) -> None:
+        self.scanner.flush()
+
+    def unknown_decl(self, data: str) -> None:
+        if data.upper().startswith("CDATA["):
+            self.scanner.flush()
+            self.scanner.data(data[len("CDATA["):])
+            self.scanner.flush()
+
+
+def iter_language_data_xml(svg_content: Union[str, bytes], chunk_size: int = 16384) -> Iterator[Dict[str, str]]:
+    """
+    Stream the language records of a card with expat, yielding them while scanning.
+
+    Args:
+        svg_content (Union[str, bytes]): SVG content to parse.
+        chunk_size (int): Number of characters fed to the parser at once.
+
+    Yields:
+        Dict[str, str]: Record with the "language" and "time" keys.
+
+    Raises:
+        expat.ExpatError: If the content is not well-formed XML.
+    """
+    scanner = LanguageNameScanner()
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+
+    def start(name: str, attrs: Dict[str, str]) -> None:
+        tag = name.lower()
+        if tag == "g" or tag == "text":
+            attrs = {key.lower(): value for key, value in attrs.items()}
+        scanner.start(tag, attrs)
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = lambda name: scanner.end(name.lower())
+    parser.CharacterDataHandler = scanner.data
+    parser.CommentHandler = lambda data: scanner.flush()
+    parser.StartCdataSectionHandler = scanner.flush
+    parser.EndCdataSectionHandler = scanner.flush
+
+    for offset in range(0, len(svg_content), chunk_size):
+        parser.Parse(svg_content[offset:offset + chunk_size], False)
+        yield from scanner.release()
+    parser.Parse(svg_content[:0], True)
+    yield from scanner.release()
+
+
+def iter_language_data_html(svg_content: Union[str, bytes]) -> Iterator[Dict[str, str]]:
+    """
+    Stream the language records of a card with the lenient HTML tokenizer.
+
+    Args:
+        svg_content (Union[str, bytes]): SVG content to parse.
+
+    Yields:
+        Dict[str, str]: Record with the "language" and "time" keys.
+    """
+    if isinstance(svg_content, bytes):
+        svg_content = svg_content.decode("utf-8", errors="replace")
+
+    scanner = LanguageNameScanner()
+    parser = LanguageNameHTMLParser(scanner)
+    parser.feed(svg_content)
+    parser.close()
+    scanner.close()
+    yield from scanner.release()
+
+
+def parse_language_data(svg_content: Union[str, bytes]) -> List[Dict[str, str]]:
+    """
+    Extract the languages of a card, falling back to the HTML tokenizer on malformed XML.
+
+    The parse time of every card is added to the "parse_seconds" histogram of the run.
+
+    Args:
+        svg_content (Union[str, bytes]): SVG content to parse.
+
+    Returns:
+        List[Dict[str, str]]: List of languages and time spent.
+    """
+    start = time.perf_counter()
+    try:
+        return list(iter_language_data_xml(svg_content))
+    except expat.ExpatError:
+        metrics.count("html_fallbacks")
+        return list(iter_language_data_html(svg_content))
+    finally:
+        metrics.observe("parse_seconds", time.perf_counter() - start)
@@ -0,0 +1,92 @@
+import re
+from array import array
+from functools import lru_cache
+from typing import Iterable
+
+
+# The shapes of the WakaTime and "total_time" strings: "2,358 hrs 16 mins", "3 hrs", "1 min"...
+TIME_PATTERN = re.compile(r"([\d,]+) hrs?(?: ([\d,]+) mins?)?|([\d,]+) mins?")
+
+# Distinct time strings are few (hours x 60 at most), so every one of them fits in the cache.
+CACHE_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def time_to_minutes(time_str: str) -> int:
+    """
+    Convert a time string (e.g., '2 hrs 30 mins') to total minutes.
+
+    Args:
+        time_str (str): Time string to convert.
+
+    Returns:
+        int: Total time in minutes.
+    """
+    match = TIME_PATTERN.fullmatch(time_str)
+    if match:
+        hours, mins, only_mins = match.groups()
+        mins = mins or only_mins
+        total_minutes = int(hours.replace(",", "")) * 60 if hours else 0
+        return total_minutes + (int(mins.replace(",", "")) if mins else 0)
+
+    # Anything else goes through the generic "<value> <unit>" pairs parser.
+    parts = time_str.split()
+    total_minutes = 0
+    for i in range(0, len(parts), 2):
+        value = int(parts[i].replace(",", ""))
+        unit = parts[i + 1]
+        if "hr" in unit:
+            total_minutes += value * 60
+        elif "min" in unit:
+            total_minutes += value
+    return total_minutes
+
+
+def times_to_minutes(time_strs: Iterable[str]) -> array:
+    """
+    Convert a batch of time strings to minutes in one call.
+
+    Args:
+        time_strs (Iterable[str]): Time strings to convert.
+
+    Returns:
+        array: Total time in minutes of each string, as a signed 64-bit integer array.
+    """
+    return array("q", list(map(time_to_minutes, time_strs)))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def minutes_to_time(minutes: int) -> str:
+    """
+    Convert total minutes into a formatted time string.
+
+    Args:
+        minutes (int): Total time in minutes.
+
+    Returns:
+        str: Formatted time string (e.g., '2 hrs 30 mins').
+    """
+    hours, mins = divmod(minutes, 60)
+    if hours > 0 and mins > 0:
+        return f"{hours:,} hrs {mins} mins"
+    elif hours > 0:
+        return f"{hours:,} hrs"
+    else:
+        return f"{mins} mins"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_language_time(minutes: int) -> str:
+    """
+    Format a language time the way the WakaTime card writes it (e.g., '2 hrs 1 min').
+
+    Args:
+        minutes (int): Time in minutes.
+
+    Returns:
+        str: Formatted time string.
+    """
+    hours, mins = divmod(minutes, 60)
+    if mins == 0:
+        return f"{hours:,} hrs"
+    return f"{hours:,} hrs {mins} {'min' if mins == 1 else 'mins'}"
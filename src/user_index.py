@@ -0,0 +1,114 @@
+import os
+import re
+import bisect
+from collections import defaultdict
+from typing import DefaultDict, Dict, List, Tuple
+from batch_writer import BatchWriter
+from time_codec import times_to_minutes
+
+
+# Lowercase characters of the username naming its shard, other characters counting as "_".
+PREFIX_LENGTH = 2
+
+
+def shard_name(username: str) -> str:
+    """
+    Args:
+        username (str): Username to look up.
+
+    Returns:
+        str: Name of the shard holding the user, from the start of the lowercase username.
+    """
+    prefix = re.sub(r"[^a-z0-9]", "_", username[:PREFIX_LENGTH].lower())
+    return prefix.ljust(PREFIX_LENGTH, "_")
+
+
+def competition_rank(ascending_scores: List[int], score: int) -> int:
+    """
+    Args:
+        ascending_scores (List[int]): Scores of a leaderboard, in ascending order.
+        score (int): Score to rank.
+
+    Returns:
+        int: Rank of the score, one more than the number of higher scores.
+    """
+    return len(ascending_scores) - bisect.bisect_right(ascending_scores, score) + 1
+
+
+def build_user_index(
+    language_data: Dict[str, Dict[str, Tuple[int, str]]],
+    users: List[Dict[str, str]],
+    boards: Dict[str, List[Dict[str, str]]] = None
+) -> DefaultDict[str, Dict[str, dict]]:
+    """
+    Build the inverted index from each user to its rank in the global leaderboard and in every language.
+
+    The languages and minutes of the users come from the user data. Their ranks are taken
+    on the language leaderboards when given, which also keep the users who have since left
+    the language, so that the index agrees with the rows shown by the site.
+
+    Args:
+        language_data (Dict[str, Dict[str, Tuple[int, str]]]): A dictionary mapping languages
+            to the minutes and time string of each user, by username, as read by `load_user_data`.
+        users (List[Dict[str, str]]): List of users with their elo.
+        boards (Dict[str, List[Dict[str, str]]]): Rows of the language leaderboards, by sanitized
+            language name (default is to rank the users among the user data only).
+
+    Returns:
+        DefaultDict[str, Dict[str, dict]]: Entries by shard name, then by username: the
+            [rank, elo] of the user and the [rank, minutes] of each of its languages,
+            by sanitized language name.
+    """
+    boards = boards or {}
+    entries: Dict[str, dict] = {}
+
+    elos = sorted(user["elo"] for user in users)
+    for user in users:
+        entries[user["username"]] = {"elo": [competition_rank(elos, user["elo"]), user["elo"]], "languages": {}}
+
+    for language, language_users in sorted(language_data.items()):
+        sanitized_language = language.replace(" ", "_").replace("/", "_")
+        if sanitized_language in boards:
+            scores = sorted(times_to_minutes(user["time"] for user in boards[sanitized_language]))
+        else:
+            scores = sorted(minutes for minutes, _ in language_users.values())
+        for username, (minutes, _) in language_users.items():
+            entry = entries.setdefault(username, {"elo": None, "languages": {}})
+            entry["languages"][sanitized_language] = [competition_rank(scores, minutes), minutes]
+
+    shards: DefaultDict[str, Dict[str, dict]] = defaultdict(dict)
+    for username in sorted(entries):
+        shards[shard_name(username)][username] = entries[username]
+    return shards
+
+
+def write_user_index(
+    language_data: Dict[str, Dict[str, Tuple[int, str]]],
+    users: List[Dict[str, str]],
+    output_dir: str,
+    boards: Dict[str, List[Dict[str, str]]] = None,
+    writer: BatchWriter = None
+) -> None:
+    """
+    Write the username search index, one minified JSON file per username prefix.
+
+    Args:
+        language_data (Dict[str, Dict[str, Tuple[int, str]]]): A dictionary mapping languages
+            to the minutes and time string of each user, by username.
+        users (List[Dict[str, str]]): List of users with their elo.
+        output_dir (str): Path to the directory of the index shards.
+        boards (Dict[str, List[Dict[str, str]]]): Rows of the language leaderboards, by sanitized language name.
+        writer (BatchWriter): Writer of the files (default is a new one).
+    """
+    writer = writer or BatchWriter()
+    shards = build_user_index(language_data, users, boards)
+
+    for name, shard in shards.items():
+        writer.write(os.path.join(output_dir, f"{name}.json"), shard, compact=True)
+    writer.flush()
+
+    # Shards whose users are all gone.
+    for filename in os.listdir(output_dir) if os.path.isdir(output_dir) else []:
+        if filename.endswith(".json") and filename[:-len(".json")] not in shards:
+            os.remove(os.path.join(output_dir, filename))
+    print(f"Search index of {sum(map(len, shards.values()))} users written to {output_dir} ({len(shards)} shards)")
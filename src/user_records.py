@@ -0,0 +1,22 @@
+from typing import Dict, Iterator, Tuple
+from user_store import UserStore
+
+
+def iter_user_records(store: UserStore, records: Dict[str, dict] = None) -> Iterator[Tuple[str, dict]]:
+    """
+    Iterate over the data of every user.
+
+    Users present in `records`, e.g. the ones just written by `generate_user_data`,
+    are taken from memory instead of the store.
+
+    Args:
+        store (UserStore): Store of the user records.
+        records (Dict[str, dict]): User data already in memory, by username.
+
+    Yields:
+        Tuple[str, dict]: Username and user data, ordered by username.
+    """
+    records = records or {}
+
+    for username, user_data in store.iter_records():
+        yield username, records.get(username, user_data)
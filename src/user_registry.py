@@ -0,0 +1,107 @@
+import os
+import bisect
+import heapq
+from typing import Iterable, List, Optional, Set
+from batch_writer import read_json_file, write_json_file
+
+
+class UserRegistry:
+    """
+    Sorted, duplicate-free usernames tracked by the pipeline, as listed in data/users.json.
+
+    Lookups bisect the sorted list. New usernames are collected aside and merged into the
+    list in a single linear pass, instead of sorting the whole registry again for every
+    page of new users.
+    """
+
+    def __init__(self, usernames: Iterable[str] = ()) -> None:
+        """
+        Args:
+            usernames (Iterable[str]): Initial usernames, empty ones are ignored.
+        """
+        usernames = [username for username in usernames if username]
+        if any(previous >= username for previous, username in zip(usernames, usernames[1:])):
+            usernames = sorted(set(usernames))
+        self.sorted_usernames: List[str] = usernames
+        self.pending: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.sorted_usernames) + len(self.pending)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self.pending or self.index(username) is not None
+
+    def index(self, username: str) -> Optional[int]:
+        """
+        Args:
+            username (str): Username to look up among the merged usernames.
+
+        Returns:
+            Optional[int]: Position of the username in the sorted registry, or None if it is not merged in.
+        """
+        position = bisect.bisect_left(self.sorted_usernames, username)
+        if position < len(self.sorted_usernames) and self.sorted_usernames[position] == username:
+            return position
+        return None
+
+    def add(self, username: str) -> bool:
+        """
+        Add a username, merged into the sorted usernames by the next `merge`.
+
+        Args:
+            username (str): Username to track, ignored if empty.
+
+        Returns:
+            bool: True if the username was not tracked yet.
+        """
+        if not username or username in self:
+            return False
+        self.pending.add(username)
+        return True
+
+    def merge(self) -> int:
+        """
+        Merge the added usernames into the sorted usernames.
+
+        Returns:
+            int: Number of usernames merged.
+        """
+        count = len(self.pending)
+        if count:
+            self.sorted_usernames = list(heapq.merge(self.sorted_usernames, sorted(self.pending)))
+            self.pending.clear()
+        return count
+
+    def usernames(self) -> List[str]:
+        """
+        Returns:
+            List[str]: Every tracked username, sorted.
+        """
+        self.merge()
+        return self.sorted_usernames
+
+
+def load_registry(file_path: str) -> UserRegistry:
+    """
+    Load the tracked usernames.
+
+    Args:
+        file_path (str): Path to the JSON list of usernames.
+
+    Returns:
+        UserRegistry: Registry of the usernames, empty if the file does not exist.
+    """
+    if not os.path.exists(file_path):
+        return UserRegistry()
+    return UserRegistry(read_json_file(file_path))
+
+
+def save_registry(file_path: str, registry: UserRegistry) -> None:
+    """
+    Save the tracked usernames as a sorted JSON list.
+
+    Args:
+        file_path (str): Path to the JSON list of usernames.
+        registry (UserRegistry): Registry of the usernames.
+    """
+    write_json_file(file_path, registry.usernames())
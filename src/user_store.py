@@ -0,0 +1,425 @@
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from batch_writer import BatchWriter, read_json_file
+from time_codec import format_language_time, minutes_to_time, time_to_minutes
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS languages (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    total_minutes INTEGER NOT NULL,
+    -- Only set when minutes_to_time(total_minutes) does not give the original string back.
+    total_time TEXT,
+    elo INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_languages (
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    position INTEGER NOT NULL,
+    language_id INTEGER NOT NULL REFERENCES languages (id),
+    minutes INTEGER NOT NULL,
+    -- Only set when format_language_time(minutes) does not give the original string back.
+    time TEXT,
+    PRIMARY KEY (user_id, position)
+) WITHOUT ROWID;
+-- One bit per user ID: flags flipped for every user at once are rewritten as a single value.
+CREATE TABLE IF NOT EXISTS flags (
+    name TEXT PRIMARY KEY,
+    bits BLOB NOT NULL
+);
+"""
+
+
+class FlagBits:
+    """
+    Boolean flag of every user, packed in a bitset indexed by user ID.
+    """
+
+    def __init__(self, bits: bytes = b"") -> None:
+        """
+        Args:
+            bits (bytes): Packed flags, bit `i % 8` of byte `i // 8` holding the flag of user ID `i`.
+        """
+        self.bits = bytearray(bits)
+        self.dirty = False
+
+    def __getitem__(self, user_id: int) -> bool:
+        """
+        Args:
+            user_id (int): ID of the user.
+
+        Returns:
+            bool: Flag of the user, False if it was never set.
+        """
+        byte = user_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] >> (user_id & 7) & 1)
+
+    def __setitem__(self, user_id: int, value: bool) -> None:
+        """
+        Args:
+            user_id (int): ID of the user.
+            value (bool): New flag of the user.
+        """
+        byte = user_id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        if value:
+            self.bits[byte] |= 1 << (user_id & 7)
+        else:
+            self.bits[byte] &= ~(1 << (user_id & 7)) & 0xFF
+        self.dirty = True
+
+    def fill(self, user_ids: List[int], value: bool) -> List[int]:
+        """
+        Set the flag of every given user at once.
+
+        Args:
+            user_ids (List[int]): IDs of the users.
+            value (bool): New flag of the users.
+
+        Returns:
+            List[int]: IDs of the users whose flag changed.
+        """
+        changed = [user_id for user_id in user_ids if self[user_id] != value]
+        if changed:
+            # Every ID is set or cleared, so whole bytes are written rather than single bits.
+            size = (max(user_ids) >> 3) + 1
+            self.bits = bytearray((b"\xff" if value else b"\x00") * size)
+            self.dirty = True
+        return changed
+
+
+class UserStore:
+    """
+    SQLite storage of the user records, with integer minutes and interned language names.
+
+    Records are read and written in the same shape as the files of data/users, which
+    are exported from the store with `export_json`.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        """
+        Args:
+            db_path (str): Path to the SQLite database, created if needed (":memory:" for a temporary store).
+        """
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(SCHEMA)
+        self.language_ids: Dict[str, int] = {
+            name: language_id for language_id, name in self.connection.execute("SELECT id, name FROM languages")
+        }
+        self.updated = self.load_flags("updated")
+
+    def load_flags(self, name: str) -> FlagBits:
+        """
+        Load a bitset of user flags, moving it out of the users table of older stores.
+
+        Args:
+            name (str): Name of the flag.
+
+        Returns:
+            FlagBits: Flag of every user.
+        """
+        row = self.connection.execute("SELECT bits FROM flags WHERE name = ?", (name,)).fetchone()
+        flags = FlagBits(row[0] if row else b"")
+        columns = [column for _, column, *_ in self.connection.execute("PRAGMA table_info(users)")]
+        if name in columns:
+            for user_id, value in self.connection.execute(f"SELECT id, {name} FROM users"):
+                flags[user_id] = bool(value)
+            self.save_flags(name, flags)
+            self.connection.execute(f"ALTER TABLE users DROP COLUMN {name}")
+            self.connection.commit()
+        return flags
+
+    def save_flags(self, name: str, flags: FlagBits) -> None:
+        """
+        Write a bitset of user flags, as a single value, if it changed since it was loaded.
+
+        Args:
+            name (str): Name of the flag.
+            flags (FlagBits): Flag of every user.
+        """
+        if flags.dirty:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO flags (name, bits) VALUES (?, ?)", (name, bytes(flags.bits))
+            )
+            flags.dirty = False
+
+    def language_id(self, language: str) -> int:
+        """
+        Args:
+            language (str): Language name.
+
+        Returns:
+            int: Interned ID of the language, allocated on first use.
+        """
+        if language not in self.language_ids:
+            cursor = self.connection.execute("INSERT INTO languages (name) VALUES (?)", (language,))
+            self.language_ids[language] = cursor.lastrowid
+        return self.language_ids[language]
+
+    def usernames(self) -> Set[str]:
+        """
+        Returns:
+            Set[str]: Usernames of every stored user.
+        """
+        return {username for username, in self.connection.execute("SELECT username FROM users")}
+
+    def get(self, username: str) -> Optional[dict]:
+        """
+        Args:
+            username (str): Username to look up.
+
+        Returns:
+            Optional[dict]: User data, or None if the user is not stored.
+        """
+        row = self.connection.execute(
+            "SELECT id, total_minutes, total_time, elo FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        user_id, total_minutes, total_time, elo = row
+        languages = self.connection.execute(
+            "SELECT name, minutes, time FROM user_languages JOIN languages ON languages.id = language_id "
+            "WHERE user_id = ? ORDER BY position",
+            (user_id,),
+        )
+        return {
+            "total_time": total_time or minutes_to_time(total_minutes),
+            "updated": self.updated[user_id],
+            "elo": elo,
+            "languages": [
+                {"language": name, "time": time or format_language_time(minutes)} for name, minutes, time in languages
+            ],
+        }
+
+    def put(self, username: str, user_data: dict) -> None:
+        """
+        Insert or replace the record of a user. Changes are saved by `commit`.
+
+        Args:
+            username (str): Username of the user.
+            user_data (dict): User data, in the shape of the user JSON files.
+        """
+        total_minutes = time_to_minutes(user_data["total_time"])
+        total_time = user_data["total_time"]
+        row = self.connection.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+        values = (
+            total_minutes,
+            None if minutes_to_time(total_minutes) == total_time else total_time,
+            user_data.get("elo", 0),
+        )
+
+        if row is None:
+            user_id = self.connection.execute(
+                "INSERT INTO users (username, total_minutes, total_time, elo) VALUES (?, ?, ?, ?)",
+                (username,) + values,
+            ).lastrowid
+        else:
+            user_id = row[0]
+            self.connection.execute(
+                "UPDATE users SET total_minutes = ?, total_time = ?, elo = ? WHERE id = ?", values + (user_id,)
+            )
+            self.connection.execute("DELETE FROM user_languages WHERE user_id = ?", (user_id,))
+        self.updated[user_id] = bool(user_data.get("updated", True))
+
+        rows = []
+        for position, entry in enumerate(user_data.get("languages", [])):
+            minutes = time_to_minutes(entry["time"])
+            time = None if format_language_time(minutes) == entry["time"] else entry["time"]
+            rows.append((user_id, position, self.language_id(entry["language"]), minutes, time))
+        self.connection.executemany(
+            "INSERT INTO user_languages (user_id, position, language_id, minutes, time) VALUES (?, ?, ?, ?, ?)", rows
+        )
+
+    def iter_records(self) -> Iterator[Tuple[str, dict]]:
+        """
+        Load every user with two sequential scans.
+
+        Yields:
+            Tuple[str, dict]: Username and user data, ordered by username.
+        """
+        names = {language_id: name for name, language_id in self.language_ids.items()}
+        languages: Dict[int, List[Dict[str, str]]] = {}
+        for user_id, language_id, minutes, time in self.connection.execute(
+            "SELECT user_id, language_id, minutes, time FROM user_languages ORDER BY user_id, position"
+        ):
+            languages.setdefault(user_id, []).append(
+                {"language": names[language_id], "time": time or format_language_time(minutes)}
+            )
+
+        for user_id, username, total_minutes, total_time, elo in self.connection.execute(
+            "SELECT id, username, total_minutes, total_time, elo FROM users ORDER BY username"
+        ):
+            yield username, {
+                "total_time": total_time or minutes_to_time(total_minutes),
+                "updated": self.updated[user_id],
+                "elo": elo,
+                "languages": languages.get(user_id, []),
+            }
+
+    def stream_records(self) -> Iterator[Tuple[str, dict]]:
+        """
+        Load the users one at a time, with a single join, so that memory does not grow with
+        the number of users; slower than `iter_records`.
+
+        Yields:
+            Tuple[str, dict]: Username and user data, in the order the users were first stored.
+        """
+        names = {language_id: name for name, language_id in self.language_ids.items()}
+        rows = self.connection.execute(
+            "SELECT id, username, total_minutes, total_time, elo, language_id, minutes, time "
+            "FROM users LEFT JOIN user_languages ON user_id = id ORDER BY id, position"
+        )
+        user = None
+        for user_id, username, total_minutes, total_time, elo, language_id, minutes, time in rows:
+            if user is None or user[0] != user_id:
+                if user is not None:
+                    yield user[1], user[2]
+                user = (user_id, username, {
+                    "total_time": total_time or minutes_to_time(total_minutes),
+                    "updated": self.updated[user_id],
+                    "elo": elo,
+                    "languages": [],
+                })
+            if language_id is not None:
+                user[2]["languages"].append(
+                    {"language": names[language_id], "time": time or format_language_time(minutes)}
+                )
+        if user is not None:
+            yield user[1], user[2]
+
+    def language_minutes(self) -> Dict[str, Dict[str, int]]:
+        """
+        Load the minutes of every user language with a single scan.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Minutes by language name, by username, for the users with languages.
+        """
+        names = {language_id: name for name, language_id in self.language_ids.items()}
+        minutes: Dict[str, Dict[str, int]] = {}
+        for username, language_id, language_minutes in self.connection.execute(
+            "SELECT username, language_id, minutes FROM user_languages JOIN users ON users.id = user_id "
+            "ORDER BY username, position"
+        ):
+            minutes.setdefault(username, {})[names[language_id]] = language_minutes
+        return minutes
+
+    def elo_states(self) -> Dict[str, Tuple[int, int, bool]]:
+        """
+        Load the inputs of the elo rules of every user with a single scan.
+
+        Returns:
+            Dict[str, Tuple[int, int, bool]]: Elo, total minutes and "updated" flag, by username.
+        """
+        return {
+            username: (elo, total_minutes, self.updated[user_id])
+            for user_id, username, total_minutes, elo in self.connection.execute(
+                "SELECT id, username, total_minutes, elo FROM users"
+            )
+        }
+
+    def set_unchanged(self, elos: Dict[str, int]) -> None:
+        """
+        Set the elo of users left unchanged by a run and clear their "updated" flag, without
+        rewriting their languages. Changes are saved by `commit`.
+
+        Args:
+            elos (Dict[str, int]): New elo, by username.
+        """
+        user_ids = dict(self.connection.execute("SELECT username, id FROM users"))
+        self.connection.executemany(
+            "UPDATE users SET elo = ? WHERE id = ?", [(elo, user_ids[username]) for username, elo in elos.items()]
+        )
+        for username in elos:
+            self.updated[user_ids[username]] = False
+
+    def set_updated(self, updated: bool) -> List[str]:
+        """
+        Set the "updated" flag of every user, rewriting the bitset of the flags rather than the users.
+
+        Args:
+            updated (bool): New value of the flag.
+
+        Returns:
+            List[str]: Usernames whose flag changed, ordered by username.
+        """
+        users = dict(self.connection.execute("SELECT id, username FROM users"))
+        return sorted(users[user_id] for user_id in self.updated.fill(list(users), updated))
+
+    def import_json(self, user_data_dir: str) -> int:
+        """
+        Load the user JSON files of a directory into the store.
+
+        Args:
+            user_data_dir (str): Path to the directory containing user JSON files.
+
+        Returns:
+            int: Number of users imported.
+        """
+        count = 0
+        for filename in sorted(os.listdir(user_data_dir)):
+            if filename.endswith(".json"):
+                self.put(filename.replace(".json", ""), read_json_file(os.path.join(user_data_dir, filename)))
+                count += 1
+        self.commit()
+        return count
+
+    def export_json(self, user_data_dir: str, usernames: Iterable[str] = None, writer: BatchWriter = None) -> None:
+        """
+        Write users to the JSON files read by the site.
+
+        Args:
+            user_data_dir (str): Path to the directory of the user JSON files.
+            usernames (Iterable[str]): Users to export (default is every user).
+            writer (BatchWriter): Writer of the files (default is a new one).
+        """
+        writer = writer or BatchWriter()
+        if usernames is None:
+            records = self.iter_records()
+        else:
+            records = ((username, self.get(username)) for username in usernames)
+
+        for username, user_data in records:
+            writer.write(os.path.join(user_data_dir, f"{username}.json"), user_data)
+        writer.flush()
+
+    def commit(self) -> None:
+        """
+        Save the pending changes to the database.
+        """
+        self.save_flags("updated", self.updated)
+        self.connection.commit()
+
+    def close(self) -> None:
+        """
+        Save the pending changes and close the database.
+        """
+        self.commit()
+        self.connection.close()
+
+
+def open_user_store(db_path: str, user_data_dir: str) -> UserStore:
+    """
+    Open the user store, importing the user JSON files the first time it is created.
+
+    Args:
+        db_path (str): Path to the SQLite database (":memory:" for a temporary store).
+        user_data_dir (str): Path to the directory containing user JSON files.
+
+    Returns:
+        UserStore: Opened store.
+    """
+    store = UserStore(db_path)
+    empty = store.connection.execute("SELECT NOT EXISTS (SELECT 1 FROM users)").fetchone()[0]
+    if empty and os.path.isdir(user_data_dir):
+        count = store.import_json(user_data_dir)
+        print(f"Imported {count} users from {user_data_dir} into {db_path}")
+    return store
@@ -1,88 +1,200 @@
+import os
+import time
+import argparse
 import requests
-import json
-from typing import Optional, List
-
-
-def fetch_leaderboard_data(url: str) -> Optional[List[str]]:
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+from batch_writer import read_json_file, write_json_file
+from fetch_scheduler import FetchScheduler, TokenBucket, create_session
+from run_metrics import instrumented_run, metrics
+from user_registry import UserRegistry, load_registry, save_registry
+
+
+# A cursor older than this belongs to a previous run, whose pages have moved on since.
+CURSOR_MAX_AGE = 24 * 60 * 60
+# Fetched pages between two saves of the registry and the cursor.
+CHECKPOINT_PAGES = 50
+
+
+def fetch_leaderboard_page(
+    url: str,
+    page: int,
+    session: requests.Session = None,
+    timeout: float = 30.0
+) -> Tuple[List[str], int]:
     """
-    Fetch leaderboard data from the given URL and extract usernames.
+    Fetch one page of the leaderboard and extract its usernames.
 
     Args:
         url (str): The API endpoint to fetch data from.
+        page (int): Number of the page, starting at 1.
+        session (requests.Session): Session to reuse connections from (default is a one-off request).
+        timeout (float): Connect and read timeout in seconds.
 
     Returns:
-        Optional[List[str]]: A list of usernames if the request is successful, otherwise None.
-    """
-    response = requests.get(url, headers={"Accept": "application/json"})
-    if response.status_code == 200:
-        data = response.json()
-        return [user["user"]["username"] for user in data["data"] if "user" in user and "username" in user["user"]]
-    else:
-        print(f"Failed to retrieve data: {response.status_code}")
-        return None
-
+        Tuple[List[str], int]: Usernames of the page and total number of pages.
 
-def load_existing_usernames(file_path: str) -> List[str]:
+    Raises:
+        requests.HTTPError: If the API answered with an error status.
     """
-    Load existing usernames from a JSON file.
+    start = time.perf_counter()
+    try:
+        response = (session or requests).get(
+            url, params={"page": page}, headers={"Accept": "application/json"}, timeout=timeout
+        )
+    finally:
+        metrics.observe("fetch_seconds", time.perf_counter() - start)
+    metrics.count("response_bytes", len(response.content))
+    response.raise_for_status()
+    data = response.json()
+    usernames = [user["user"]["username"] for user in data["data"] if "user" in user and "username" in user["user"]]
+    return usernames, data.get("total_pages", 1)
+
+
+def load_cursor(file_path: str, url: str) -> Optional[dict]:
+    """
+    Load the progress of an interrupted discovery.
 
     Args:
-        file_path (str): The path to the JSON file.
+        file_path (str): Path to the cursor JSON file.
+        url (str): The API endpoint being discovered.
 
     Returns:
-        List[str]: The existing usernames if the file exists, otherwise an empty list.
+        Optional[dict]: Total number of pages ("total_pages") and pages left to fetch ("pending"),
+            or None if there is no recent cursor for this endpoint.
     """
-    try:
-        with open(file_path, "r") as json_file:
-            return json.load(json_file)
-    except FileNotFoundError:
-        return []
+    if not file_path or not os.path.exists(file_path):
+        return None
+    cursor = read_json_file(file_path)
+    if cursor["url"] != url or time.time() - cursor["updated_at"] > CURSOR_MAX_AGE:
+        return None
+    return cursor
 
 
-def save_usernames(file_path: str, usernames: List[str]) -> None:
+def save_cursor(file_path: str, url: str, total_pages: int, pending: List[int]) -> None:
     """
-    Save usernames to a JSON file.
+    Save the pages left to fetch, or remove the cursor once there are none left.
 
     Args:
-        file_path (str): The path to the JSON file.
-        usernames (List[str]): The usernames to save.
+        file_path (str): Path to the cursor JSON file.
+        url (str): The API endpoint being discovered.
+        total_pages (int): Total number of pages of the leaderboard.
+        pending (List[int]): Pages left to fetch.
     """
-    with open(file_path, "w") as json_file:
-        json.dump(usernames, json_file, indent=4)
-
-
-def merge_usernames(existing_usernames: List[str], new_usernames: List[str]) -> List[str]:
+    if not file_path:
+        return
+    if not pending:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return
+    write_json_file(
+        file_path, {"url": url, "total_pages": total_pages, "pending": sorted(pending), "updated_at": int(time.time())}
+    )
+
+
+def discover_leaders(
+    url: str,
+    registry: UserRegistry,
+    registry_file: str = None,
+    cursor_file: str = None,
+    workers: int = 8,
+    rate: float = 10.0,
+    timeout: float = 30.0
+) -> int:
     """
-    Merge existing usernames with new usernames, avoiding duplicates and filtering out None values.
+    Add the users of every page of the leaderboard to the registry.
+
+    The first page gives the number of pages, the others are fetched concurrently over a
+    pooled session, rate limited and retried like the user cards. The usernames of each
+    page go into the registry as soon as it arrives. Every `CHECKPOINT_PAGES` pages, the
+    registry and the pages still to fetch are saved, so an interrupted run resumes where
+    it stopped; pages that failed are left in the cursor for the next run.
 
     Args:
-        existing_usernames (List[str]): List of existing usernames.
-        new_usernames (List[str]): List of new usernames.
+        url (str): The API endpoint to fetch data from.
+        registry (UserRegistry): Registry the usernames are added to.
+        registry_file (str): Path to the JSON file the registry is saved to (default is not to save it).
+        cursor_file (str): Path to the cursor JSON file (default is not to resume nor save the progress).
+        workers (int): Maximum number of concurrent requests.
+        rate (float): Maximum number of requests per second.
+        timeout (float): Connect and read timeout in seconds for each request.
 
     Returns:
-        List[str]: Merged list of usernames.
+        int: Number of usernames added to the registry.
     """
-    filtered_existing = [username for username in existing_usernames if username]
-    filtered_new = [username for username in new_usernames if username]
-    return sorted(set(filtered_existing + filtered_new))
+    added = 0
+
+    def checkpoint(total_pages: int, pending: List[int]) -> None:
+        if registry_file:
+            save_registry(registry_file, registry)
+        save_cursor(cursor_file, url, total_pages, pending)
+
+    with create_session(workers) as session:
+        scheduler = FetchScheduler(
+            lambda page: fetch_leaderboard_page(url, page, session, timeout), TokenBucket(rate, workers)
+        )
+
+        def fetch(page: int) -> tuple:
+            try:
+                return scheduler.fetch(page), None
+            except Exception as e:
+                return None, e
+
+        cursor = load_cursor(cursor_file, url)
+        if cursor is None:
+            page, error = fetch(1)
+            if error is not None:
+                print(f"Failed to retrieve data: {error}")
+                return 0
+            usernames, total_pages = page
+            added += sum(registry.add(username) for username in usernames)
+            pending = list(range(2, total_pages + 1))
+        else:
+            total_pages, pending = cursor["total_pages"], cursor["pending"]
+            print(f"Resuming the discovery of {url}: {len(pending)} of {total_pages} page(s) left")
+
+        remaining = set(pending)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(fetch, page): page for page in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                page, error = future.result()
+                if error is not None:
+                    metrics.count("failed_pages")
+                    print(f"Failed to retrieve page {futures[future]}: {error}")
+                    continue
+                usernames, _ = page
+                added += sum(registry.add(username) for username in usernames)
+                remaining.discard(futures[future])
+                if done % CHECKPOINT_PAGES == 0:
+                    checkpoint(total_pages, list(remaining))
+
+    checkpoint(total_pages, list(remaining))
+    print(scheduler.report())
+    return added
 
 
 def main() -> None:
     """
-    Main function to fetch, merge, and save leaderboard usernames.
+    Main function to discover the users of every leaderboard page and add them to users.json.
     """
+    parser = argparse.ArgumentParser(description="Add the users of the WakaTime leaderboard to users.json.")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent requests (default: 8)")
+    parser.add_argument("--rate", type=float, default=10.0, help="maximum requests per second (default: 10)")
+    parser.add_argument("--profile", metavar="FILE", help="save cProfile statistics of the run to FILE")
+    args = parser.parse_args()
+
     url: str = "https://wakatime.com/api/v1/leaders"
     file_path: str = "data/users.json"
+    cursor_file: str = "state/leaders_cursor.json"
+    report_file: str = "state/run_report.json"
 
-    new_usernames: Optional[List[str]] = fetch_leaderboard_data(url)
-    if not new_usernames:
-        return
-
-    existing_usernames: List[str] = load_existing_usernames(file_path)
-    merged_usernames: List[str] = merge_usernames(existing_usernames, new_usernames)
-    save_usernames(file_path, merged_usernames)
+    with instrumented_run("wakalead", report_file, args.profile):
+        registry = load_registry(file_path)
+        with metrics.stage("fetch"):
+            added = discover_leaders(url, registry, file_path, cursor_file, args.workers, args.rate)
+        metrics.count("new_usernames", added)
 
-    print("Usernames updated in users.json")
+        print(f"{added} new username(s) added to users.json ({len(registry)} tracked)")
 
 
 if __name__ == "__main__":